@@ -6,7 +6,7 @@
 
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -19,7 +19,37 @@ class DatabaseSettings(BaseSettings):
     username: str = Field(default="postgres", description="数据库用户名")
     password: str = Field(default="postgres123", description="数据库密码")
     enabled: bool = Field(default=False, description="是否启用数据库")
-    
+    # 连接池配置(pooled=False 时退回 NullPool,每次会话新建连接)
+    pooled: bool = Field(default=True, description="是否启用连接池")
+    pool_size: int = Field(default=10, description="连接池常驻连接数")
+    max_overflow: int = Field(default=20, description="连接池允许的溢出连接数")
+    pool_timeout: float = Field(default=30.0, description="等待空闲连接的超时时间(秒)")
+    pool_recycle: int = Field(default=1800, description="连接最大存活时间(秒),超过后回收重建")
+    pool_pre_ping: bool = Field(default=True, description="借出连接前是否探活")
+    statement_cache_size: int = Field(default=100, description="asyncpg预处理语句缓存大小(0为禁用,经pgbouncer事务模式时需设为0)")
+    # 进程级共享 asyncpg 连接池(供 $n 参数化原生 SQL 使用)
+    raw_pool_min_size: int = Field(default=1, description="共享asyncpg连接池最小连接数")
+    raw_pool_max_size: int = Field(default=10, description="共享asyncpg连接池最大连接数")
+    # 向量检索(ANN)参数,可按请求覆盖
+    hnsw_ef_search: int = Field(default=40, description="HNSW 检索候选列表大小(hnsw.ef_search),不小于候选数")
+    ivfflat_probes: int = Field(default=10, description="IVFFlat 检索探查的列表数(ivfflat.probes)")
+    vector_overfetch: float = Field(default=4.0, description="ANN 内层候选数 = limit × 该倍数,相似度阈值在外层过滤")
+    vector_fetch_max: int = Field(default=1000, description="ANN 内层候选数上限")
+    paragraph_book_index_min_rows: int = Field(default=5000, description="段落数不少于该值的书单独建 book_id 部分 HNSW 索引,0 关闭")
+    # 向量索引构建/维护(/api/db/maintenance/reindex)
+    vector_dimension: int = Field(default=1536, description="嵌入向量维度")
+    hnsw_m: int = Field(default=16, description="HNSW 每层最大连接数 m")
+    hnsw_ef_construction: int = Field(default=64, description="HNSW 构建候选列表大小 ef_construction")
+    index_maintenance_work_mem: str = Field(default="1GB", description="索引构建会话的 maintenance_work_mem")
+    index_build_parallel_workers: int = Field(default=2, description="索引构建的 max_parallel_maintenance_workers")
+    # 向量存储模式(按表): vector | halfvec,可加 "+bit" 启用二值量化汉明预筛 + 全精度重排
+    # 修改后需执行 migrations/migrate_vector_storage.py 转换列类型与索引
+    vector_storage: Dict[str, str] = Field(default_factory=dict, description="按表的向量存储模式,如 {\"paragraphs\": \"halfvec+bit\"}")
+    binary_rerank_factor: float = Field(default=4.0, description="二值预筛候选数 = 重排候选数 × 该倍数")
+    # 全文检索(search_tsv 列 + GIN 索引,见 services/text_search.py)
+    text_search_config: str = Field(default="", description="PG 文本检索配置名(如 zhparser 的 chinese),由触发器维护;留空则应用侧 jieba 分词写入")
+    hybrid_rrf_k: int = Field(default=60, description="混合检索 RRF 常数 k: 得分 = Σ 权重 / (k + 排名)")
+
     @property
     def url(self) -> str:
         """构建数据库连接URL"""
@@ -51,6 +81,10 @@ class AISettings(BaseSettings):
     max_tokens: int = Field(default=2000, description="最大token数")
     temperature: float = Field(default=0.7, description="生成温度")
     enable_dev_embeddings: bool = Field(default=True, description="开发环境启用嵌入回退(无密钥也可运行)")
+    http_pool_limit: int = Field(default=100, description="共享HTTP客户端总连接数上限")
+    http_limit_per_host: int = Field(default=30, description="共享HTTP客户端单主机连接数上限")
+    http_keepalive_timeout: float = Field(default=60.0, description="空闲长连接保活时间(秒)")
+    http_timeout: float = Field(default=120.0, description="模型请求总超时(秒)")
     
     @validator('temperature')
     def validate_temperature(cls, v):
@@ -102,6 +136,9 @@ class FileExtractionSettings(BaseSettings):
     cache_ttl: int = Field(default=604800, description="File cache TTL in seconds (7 days)")
     max_file_size: int = Field(default=10*1024*1024, description="Max file size 10MB, auto chunking above")
     chunk_size: int = Field(default=5*1024*1024, description="Chunk size for large files 5MB")
+    max_stream_file_size: int = Field(default=1024*1024*1024, description="Max size for TXT/MD/EPUB book uploads ingested via streaming (1GB)")
+    parse_cache_dir: Optional[str] = Field(default=None, description="Parse result cache directory (default: workspace_dir/parse_cache)")
+    parse_cache_max_bytes: int = Field(default=2*1024*1024*1024, description="Parse result cache size limit 2GB, least recently used entries evicted above")
 
 
 class SearchEngineSettings(BaseSettings):
@@ -159,6 +196,11 @@ class Settings(BaseSettings):
     # Cache configuration
     cache_ttl: int = Field(default=300, description="Cache TTL (seconds)")
     cache_max_size: int = Field(default=1000, description="Memory cache max size")
+    cache_l1_max_bytes: int = Field(default=64 * 1024 * 1024, description="In-process L1 cache byte budget")
+    cache_l1_ttl: int = Field(default=60, description="Max seconds an L1 copy of a Redis value is served before re-reading Redis")
+    embedding_cache_quantization: str = Field(default="float32", description="Embedding cache storage format (float32, float16, int8)")
+    embedding_cache_ttl: int = Field(default=7 * 24 * 3600, description="Embedding cache TTL (seconds)")
+    embedding_cache_local_max_entries: int = Field(default=20000, description="Max vectors in the in-process embedding cache when Redis is unavailable")
 
     # Upload configuration
     upload_dir: str = Field(default="./uploads", description="File upload directory")
@@ -170,6 +212,19 @@ class Settings(BaseSettings):
     embed_api_timeout: int = Field(default=30, description="Embedding API request timeout (seconds)")
     embed_retry_max: int = Field(default=3, description="Max retries for embedding API failures")
     task_timeout_seconds: int = Field(default=1800, description="Max task execution time (30 minutes)")
+    ingest_classify_concurrency: int = Field(default=2, description="Batches classified concurrently in the ingest pipeline")
+    ingest_embed_concurrency: int = Field(default=2, description="Batches embedded concurrently in the ingest pipeline")
+    ingest_db_concurrency: int = Field(default=1, description="Batches written to the database concurrently in the ingest pipeline")
+    ingest_queue_size: int = Field(default=4, description="Max batches buffered between ingest pipeline stages (backpressure)")
+    classify_batch_enabled: bool = Field(default=True, description="Classify several paragraphs per LLM prompt")
+    classify_batch_token_budget: int = Field(default=1500, description="Estimated input tokens of paragraph text per batched classification prompt")
+    classify_batch_max_items: int = Field(default=20, description="Max paragraphs per batched classification prompt")
+    classify_concurrency: int = Field(default=6, description="Initial concurrent classification requests (adapts to latency and 429s)")
+    classify_max_concurrency: int = Field(default=16, description="Upper bound for adaptive classification concurrency")
+    classify_target_latency: float = Field(default=30.0, description="Classification request latency (seconds) above which concurrency is reduced")
+    classify_cache_ttl: int = Field(default=30 * 24 * 3600, description="Classification result cache TTL (seconds)")
+    cpu_workers: int = Field(default=0, description="Process pool size for CPU-bound work such as file parsing (0 = min(4, cpu_count))")
+    cpu_preload_jieba: bool = Field(default=True, description="Load jieba dictionaries when each CPU worker process starts")
     
     @validator('environment')
     def validate_environment(cls, v):
@@ -178,6 +233,13 @@ class Settings(BaseSettings):
             raise ValueError(f'environment must be one of {allowed_envs}')
         return v
     
+    @validator('embedding_cache_quantization')
+    def validate_embedding_cache_quantization(cls, v):
+        allowed = ['float32', 'float16', 'int8']
+        if v not in allowed:
+            raise ValueError(f'embedding_cache_quantization must be one of {allowed}')
+        return v
+    
     @validator('secret_key')
     def validate_secret_key(cls, v):
         if len(v) < 32:
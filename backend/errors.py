@@ -27,6 +27,7 @@ class DomainError(str, Enum):
     WORKFLOW_ERROR = "WORKFLOW_ERROR"
     SSE_STREAM_ERROR = "SSE_STREAM_ERROR"
     CONNECTION_NOT_FOUND = "CONNECTION_NOT_FOUND"
+    MAINTENANCE_ERROR = "MAINTENANCE_ERROR"
 
 
 def restful_error(code: DomainError, message: str, status_code: int = 400) -> JSONResponse:
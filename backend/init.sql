@@ -17,9 +17,10 @@ CREATE INDEX IF NOT EXISTS documents_embedding_idx
 ON documents USING hnsw (embedding vector_cosine_ops) 
 WITH (m = 16, ef_construction = 64);
 
--- Create text search index
-CREATE INDEX IF NOT EXISTS documents_content_idx 
-ON documents USING gin(to_tsvector('english', left(content, 300000)));
+-- Create full-text search column and index (search_tsv is filled by the application, see services/text_search.py)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_tsv tsvector;
+CREATE INDEX IF NOT EXISTS idx_documents_search_tsv 
+ON documents USING gin(search_tsv);
 
 -- Create title index
 CREATE INDEX IF NOT EXISTS documents_title_idx 
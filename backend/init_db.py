@@ -90,10 +90,11 @@ async def init_database():
             WITH (m = 16, ef_construction = 64)
         """)
         
-        # 文本搜索索引
+        # 全文检索列与索引(search_tsv 由应用写入,见 services/text_search.py)
+        await conn.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_tsv tsvector")
         await conn.execute("""
-            CREATE INDEX IF NOT EXISTS documents_content_idx 
-            ON documents USING gin(to_tsvector('english', left(content, 300000)))
+            CREATE INDEX IF NOT EXISTS idx_documents_search_tsv 
+            ON documents USING gin(search_tsv)
         """)
         
         # 标题索引
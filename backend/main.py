@@ -16,7 +16,11 @@ from routers import models, projects, system, tools, workspace
 
 # 导入服务
 from services.ai_service import cleanup_ai_service
-from services.db_service import init_db
+from services.db_service import init_db, cleanup_db_service
+from services.pg_pool import get_pg_pool, close_pg_pool
+from services.keyword_index import flush_keyword_indexes
+from services.cpu_executor import warm_cpu_executor, shutdown_cpu_executor
+from services.embedding_cache import get_embedding_cache
 from services.cache_service import get_cache
 from services.redis_health_async import check_redis_or_raise, check_redis_optional
 
@@ -60,6 +64,11 @@ async def lifespan(app: FastAPI):
             await init_db()
             logger.info("数据库初始化完成")
             
+            # 创建进程级共享 asyncpg 连接池(各服务的原生 SQL 统一借用)
+            pg = await get_pg_pool()
+            if pg.available:
+                logger.info("✅ 共享数据库连接池已就绪")
+            
             # 初始化项目同步服务并执行同步
             try:
                 from services.project_sync_service import ProjectSyncService
@@ -82,12 +91,18 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"数据库初始化失败: {e}")
     
-
+    # 预热 CPU 进程池(子进程预加载 jieba 词典)
+    await warm_cpu_executor()
     
     yield
     
     logger.info("Shutting down StoryAI backend server...")
     await cleanup_ai_service()
+    flush_keyword_indexes()
+    shutdown_cpu_executor()
+    await get_embedding_cache().close()
+    await close_pg_pool()
+    await cleanup_db_service()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -0,0 +1,46 @@
+-- 迁移脚本: 强化学习Q值表
+-- 设计理念: Q值/访问次数按 (段落, 查询簇) 存放在独立窄表中,
+-- 反馈更新只改动窄表的小行,不再用 jsonb_set 重写 paragraphs.meta(避免TOAST膨胀与热表死元组)
+
+CREATE TABLE IF NOT EXISTS rl_q_values (
+    paragraph_id INTEGER NOT NULL REFERENCES paragraphs(id) ON DELETE CASCADE,
+    query_cluster VARCHAR(64) NOT NULL,
+    q_value DOUBLE PRECISION NOT NULL DEFAULT 0.5,
+    visit_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (paragraph_id, query_cluster)
+);
+
+-- 预留页内空间,使Q值更新尽量走HOT(表可能已由应用启动时的 ORM 建表创建,故单独设置)
+ALTER TABLE rl_q_values SET (fillfactor = 80);
+
+-- 按查询簇批量读取候选段落Q值
+CREATE INDEX IF NOT EXISTS idx_rl_q_values_cluster ON rl_q_values(query_cluster, paragraph_id);
+
+-- 迁移已有数据: meta.q_values / meta.visit_count -> rl_q_values
+INSERT INTO rl_q_values (paragraph_id, query_cluster, q_value, visit_count)
+SELECT p.id,
+       q.key,
+       LEAST(1.0, GREATEST(0.0, (q.value #>> '{}')::float)),
+       COALESCE(
+           CASE WHEN jsonb_typeof(p.meta->'visit_count'->q.key) = 'number'
+                THEN (p.meta->'visit_count'->>q.key)::float::int END,
+           0
+       )
+FROM paragraphs p
+CROSS JOIN LATERAL jsonb_each(
+    CASE WHEN jsonb_typeof(p.meta->'q_values') = 'object'
+         THEN p.meta->'q_values' ELSE '{}'::jsonb END
+) AS q
+WHERE jsonb_typeof(q.value) = 'number'
+ON CONFLICT (paragraph_id, query_cluster) DO NOTHING;
+
+-- 添加注释
+COMMENT ON TABLE rl_q_values IS '强化学习Q值表(段落 × 查询簇)';
+COMMENT ON COLUMN rl_q_values.query_cluster IS '查询簇ID, 如 query_cluster_0';
+COMMENT ON COLUMN rl_q_values.q_value IS '段落在该查询簇下的预期质量Q值(0-1)';
+COMMENT ON COLUMN rl_q_values.visit_count IS '段落在该查询簇下被选中的次数';
+
+-- 可选: 确认迁移无误后清理 meta 中的旧字段
+-- UPDATE paragraphs SET meta = meta - 'q_values' - 'visit_count'
+-- WHERE meta ? 'q_values' OR meta ? 'visit_count';
@@ -0,0 +1,37 @@
+-- 迁移脚本: 段落偏置紧凑参数化
+-- 设计理念: paragraph_bias(1536维)只由 13 个标量决定(情感偏置、位置 sin/cos、最多 10 个关键词散列,
+-- 见 services/paragraph_enhancer.compute_bias_features),enhanced_embedding = embedding × weight + bias
+-- 也可在检索时由 w·(q·e) + q·b 精确算出(paragraph_enhancer.enhanced_cosine),两列无需物化.
+--
+-- 存储估算(每段,float32,不含索引):
+--   paragraph_bias + enhanced_embedding: 2 × (1536 × 4 + 8) ≈ 12.3KB
+--   bias_features REAL[13]:              13 × 4 + 24      ≈ 76B
+--   100 万段落约 11.5GB → 73MB;另可删除 idx_enhanced_embedding(ivfflat 约与列同量级),
+--   写入量每段减少约 2/3(embedding 仍为 6KB)
+
+ALTER TABLE paragraphs
+ADD COLUMN IF NOT EXISTS bias_features REAL[];
+
+COMMENT ON COLUMN paragraphs.bias_features IS '紧凑偏置参数 [情感, 位置sin, 位置cos, 关键词×10],展开见 paragraph_enhancer.expand_bias_features';
+
+-- 从已物化的 paragraph_bias 回填(数组下标从 1 开始: 第1维 / 第513、514维 / 第1025-1034维)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'paragraphs' AND column_name = 'paragraph_bias'
+    ) THEN
+        UPDATE paragraphs
+        SET bias_features = ARRAY[b[1], b[513], b[514]] || b[1025:1034]
+        FROM (SELECT id AS bid, paragraph_bias::real[] AS b FROM paragraphs
+              WHERE paragraph_bias IS NOT NULL AND bias_features IS NULL) src
+        WHERE paragraphs.id = src.bid;
+    END IF;
+END $$;
+
+-- 可选: 确认回填无误后释放空间(检索已不再读取这两列).enhanced_embedding 列保留但清空,
+-- 需要对个别书做增强向量 ANN 检索时用 migrations/materialize_enhanced_embedding.py 按书物化并建部分索引
+-- DROP INDEX IF EXISTS idx_enhanced_embedding;
+-- UPDATE paragraphs SET enhanced_embedding = NULL WHERE enhanced_embedding IS NOT NULL;
+-- ALTER TABLE paragraphs DROP COLUMN IF EXISTS paragraph_bias;
+-- VACUUM FULL paragraphs;  -- 或 pg_repack,DROP COLUMN 不会立即归还空间
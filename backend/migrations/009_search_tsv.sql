@@ -0,0 +1,18 @@
+-- 迁移脚本: 全文检索存储列
+-- 设计理念: documents / paragraphs 新增 search_tsv tsvector 列 + GIN 索引,混合检索的文本路直接走索引,
+-- 不再在查询时逐行计算 to_tsvector('english', ...)(英文配置切不开中文,且与向量条件 OR 后无法用索引).
+-- 默认由应用侧 jieba 分词写入(入库时写入,存量行在服务启动后由后台任务分批回填);
+-- 配置 DATABASE__TEXT_SEARCH_CONFIG(如 zhparser 建的 chinese)后,服务启动时改建触发器按该配置维护.
+-- 详见 services/text_search.py
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_tsv tsvector;
+ALTER TABLE paragraphs ADD COLUMN IF NOT EXISTS search_tsv tsvector;
+
+CREATE INDEX IF NOT EXISTS idx_documents_search_tsv ON documents USING gin (search_tsv);
+CREATE INDEX IF NOT EXISTS idx_paragraphs_search_tsv ON paragraphs USING gin (search_tsv);
+
+-- 旧的英文表达式索引已无查询使用
+DROP INDEX IF EXISTS documents_content_idx;
+
+COMMENT ON COLUMN documents.search_tsv IS 'jieba';
+COMMENT ON COLUMN paragraphs.search_tsv IS 'jieba';
@@ -13,9 +13,9 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sse_starlette.sse import EventSourceResponse
 
-from services.ai_service import get_ai_service
+from services.ai_service import get_ai_service, get_http_client_stats
 from api_framework import ApiException  # {{ line 15-15 logic+clean fix | 来源: ensure ApiException is imported for proper exception mapping }}
-from services.cache_service import get_cache
+from services.cache_service import get_cache, get_cache_stats
 from contracts import ApiResponse, ErrorResponse, success_response
 from errors import restful_error, sse_error_event, DomainError
 from services.json_repairer import safe_json_loads  # 使用安全的JSON解析
@@ -343,18 +343,7 @@ async def test_model(request: ModelTestRequest):
 async def get_cache_statistics():
     """获取缓存统计信息"""
     try:
-        # 简化实现,返回基本统计信息
-        cache = await get_cache()
-        # 这里我们简单返回一个固定的统计结构
-        stats = {
-            "l1_cache": {
-                "size": 0,
-                "max_size": 1000,
-                "keys": []
-            },
-            "redis_available": True,
-            "redis_connected": True
-        }
+        stats = await get_cache_stats()
         
         return {
             "success": True,
@@ -365,6 +354,14 @@ async def get_cache_statistics():
         logger.error(f"Error getting cache stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/http/stats")
+async def get_http_statistics():
+    """获取共享HTTP客户端统计(请求数、新建/复用连接数)"""
+    return {
+        "success": True,
+        "stats": get_http_client_stats()
+    }
+
 @router.post("/cache/clear")
 async def clear_all_cache():
     """清空所有缓存"""
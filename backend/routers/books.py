@@ -10,6 +10,7 @@ from fastapi.responses import JSONResponse
 from sse_starlette.sse import EventSourceResponse
 
 from services.text_ingest_service import ingest_file_stream
+from services.file_parser_service import STREAM_EXTENSIONS
 from errors import DomainError, restful_error, sse_error_event
 from config import get_settings
 
@@ -19,6 +20,8 @@ router = APIRouter(prefix="/api/v1/books", tags=["Books"])
 settings = get_settings()
 UPLOAD_DIR = settings.upload_dir
 MAX_FILE_SIZE = settings.max_file_size
+# 可流式入库的格式允许更大的文件
+MAX_STREAM_FILE_SIZE = max(settings.file_extraction.max_stream_file_size, MAX_FILE_SIZE)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
@@ -36,6 +39,7 @@ async def upload_book(file: UploadFile = File(...)):
 
     file_id = str(uuid.uuid4())
     target_path = os.path.join(UPLOAD_DIR, f"{file_id}{ext}")
+    max_size = MAX_STREAM_FILE_SIZE if ext in STREAM_EXTENSIONS else MAX_FILE_SIZE
 
     size = 0
     try:
@@ -45,13 +49,13 @@ async def upload_book(file: UploadFile = File(...)):
                 if not chunk:
                     break
                 size += len(chunk)
-                if size > MAX_FILE_SIZE:
+                if size > max_size:
                     out.close()
                     try:
                         os.remove(target_path)
                     except Exception:
                         pass
-                    return _error(DomainError.FILE_TOO_LARGE, f"文件超过大小限制: {MAX_FILE_SIZE} bytes")
+                    return _error(DomainError.FILE_TOO_LARGE, f"文件超过大小限制: {max_size} bytes")
                 out.write(chunk)
         return {"fileId": file_id, "filename": file.filename, "path": target_path, "size": size}
     finally:
@@ -3,13 +3,17 @@
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File, status
 from fastapi.responses import JSONResponse  # {{ line 7-7 logic+clean fix | 来源: ensure explicit 201 response }}
 from fastapi import Response  # {{ line 8-8 logic+clean fix | 来源: use Response for 204 no content }}
 from pydantic import BaseModel, Field
 
+from sse_starlette.sse import EventSourceResponse
+
 from services.db_service import get_db_service
+from services.index_maintenance import get_index_maintenance_service
+from services.pg_pool import get_pg_pool
 from services.cache_service import get_cache
 
 logger = logging.getLogger(__name__)
@@ -43,6 +47,18 @@ class HybridSearchRequest(BaseModel):
     limit: int = Field(default=10, ge=1, le=100, description="返回结果数量")
     text_weight: float = Field(default=0.3, ge=0.0, le=1.0, description="文本权重")
     vector_weight: float = Field(default=0.7, ge=0.0, le=1.0, description="向量权重")
+    fusion: Literal["rrf", "weighted"] = Field(default="rrf", description="融合方式: rrf 加权倒数排名;weighted 分数加权")
+
+class ParagraphHybridSearchRequest(HybridSearchRequest):
+    book_id: Optional[str] = Field(None, description="书籍ID过滤")
+
+class ReindexRequest(BaseModel):
+    tables: Optional[List[str]] = Field(None, description="要维护的表,默认 documents 与 paragraphs")
+    mode: Literal["reindex", "rebuild"] = Field(default="reindex", description="reindex: 原参数并发重建;rebuild: 新参数建索引后替换")
+    m: Optional[int] = Field(None, ge=2, le=100, description="HNSW m(rebuild 模式)")
+    ef_construction: Optional[int] = Field(None, ge=4, le=1000, description="HNSW ef_construction(rebuild 模式)")
+    lists: Optional[int] = Field(None, ge=1, le=32768, description="IVFFlat lists(rebuild 模式,默认按行数估算)")
+    vacuum: bool = Field(default=True, description="完成后执行 VACUUM (ANALYZE)")
 
 class EmbeddingUpdate(BaseModel):
     embedding: List[float] = Field(..., description="嵌入向量")
@@ -72,6 +88,15 @@ class SearchResult(BaseModel):
     vector_score: Optional[float] = None
     combined_score: Optional[float] = None
 
+class ParagraphSearchResult(BaseModel):
+    id: int
+    book_id: Optional[str]
+    content: str
+    meta: Optional[Dict[str, Any]]
+    text_score: Optional[float] = None
+    vector_score: Optional[float] = None
+    combined_score: Optional[float] = None
+
 @router.post("/documents", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
 async def create_document(doc: DocumentCreate):
     """创建文档"""
@@ -262,7 +287,8 @@ async def hybrid_search(search_request: HybridSearchRequest):
             query_embedding=search_request.query_embedding,
             limit=search_request.limit,
             text_weight=search_request.text_weight,
-            vector_weight=search_request.vector_weight
+            vector_weight=search_request.vector_weight,
+            fusion=search_request.fusion
         )
         
         return results
@@ -273,6 +299,34 @@ async def hybrid_search(search_request: HybridSearchRequest):
         logger.error(f"Error in hybrid search: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/search/hybrid/paragraphs", response_model=List[ParagraphSearchResult])
+async def hybrid_search_paragraphs(search_request: ParagraphHybridSearchRequest):
+    """段落混合搜索(全文 + 向量,RRF 融合)"""
+    try:
+        db_service = await get_db_service()
+        
+        if len(search_request.query_embedding) != 1536:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Expected embedding dimension 1536, got {len(search_request.query_embedding)}"
+            )
+        
+        return await db_service.hybrid_search_paragraphs(
+            query_text=search_request.query_text,
+            query_embedding=search_request.query_embedding,
+            limit=search_request.limit,
+            book_id=search_request.book_id,
+            text_weight=search_request.text_weight,
+            vector_weight=search_request.vector_weight,
+            fusion=search_request.fusion
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in paragraph hybrid search: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/stats")
 async def get_database_stats():
     """获取数据库统计信息"""
@@ -306,34 +360,76 @@ async def get_database_stats():
         logger.error(f"Error getting database stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/maintenance/reindex")
-async def reindex_vectors():
-    """重建向量索引"""
+@router.get("/pool")
+async def get_pool_stats():
+    """获取连接池状态与借出/等待指标(用于连接池容量规划)"""
     try:
         db_service = await get_db_service()
-        
-        # 这里可以添加重建索引的逻辑
-        # 由于索引重建是耗时操作,建议在后台任务中执行
-        
+        pg = await get_pg_pool()
         return {
             "success": True,
-            "message": "Vector reindexing initiated (background task)"
+            "pool": db_service.get_pool_stats(),
+            "asyncpg_pool": pg.get_stats()
         }
-        
+
     except Exception as e:
-        logger.error(f"Error reindexing vectors: {str(e)}")
+        logger.error(f"Error getting pool stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/maintenance/reindex")
+async def reindex_vectors(request: Optional[ReindexRequest] = None):
+    """后台重建向量索引
+    
+    mode=reindex: REINDEX INDEX CONCURRENTLY;mode=rebuild: 以新的 m/ef_construction(或 lists)
+    并发建新索引后替换旧索引.完成后 VACUUM (ANALYZE),进度见 events_url(SSE)
+    """
+    request = request or ReindexRequest()
+    service = get_index_maintenance_service()
+    try:
+        job = service.start_reindex(
+            tables=request.tables, mode=request.mode, m=request.m,
+            ef_construction=request.ef_construction, lists=request.lists, vacuum=request.vacuum,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        "success": True,
+        "job_id": job.job_id,
+        "status_url": f"/api/db/maintenance/reindex/{job.job_id}",
+        "events_url": f"/api/db/maintenance/reindex/{job.job_id}/events",
+        "message": "Vector reindexing started (background task)"
+    }
+
+@router.get("/maintenance/reindex/{job_id}")
+async def get_reindex_status(job_id: str):
+    """索引维护任务状态"""
+    job = get_index_maintenance_service().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reindex job not found")
+    return job.to_dict()
+
+@router.get("/maintenance/reindex/{job_id}/events")
+async def stream_reindex_events(job_id: str):
+    """索引维护进度 SSE(回放已发生事件后持续推送,直到 complete / error)"""
+    job = get_index_maintenance_service().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reindex job not found")
+    return EventSourceResponse(job.stream(), ping=15)
+
 @router.post("/maintenance/vacuum")
 async def vacuum_database():
-    """数据库维护 - VACUUM"""
+    """数据库维护 - VACUUM (ANALYZE)
+    
+    VACUUM 不能在事务块中执行,这里借用共享 asyncpg 连接(未开启事务即自动提交)
+    """
     try:
-        db_service = await get_db_service()
-        
-        async with db_service.get_session() as session:
-            # 注意:VACUUM不能在事务中执行,这里仅作示例
-            await session.execute("ANALYZE documents")
-            await session.commit()
+        pg = await get_pg_pool()
+        async with pg.acquire() as conn:
+            for table in ("documents", "paragraphs"):
+                await conn.execute(f"VACUUM (ANALYZE) {table}")
         
         return {
             "success": True,
@@ -12,8 +12,9 @@ from services.keyword_rag import KeywordRAG
 from services.rl_optimizer import get_rl_optimizer
 from services.formula_engine import parse_formula, evaluate_formula, score_answer, update_memory_quality
 from services.db_service import get_db_service, DatabaseService
+from services.pg_pool import get_pg_pool
 from services.classify_service import get_literary_dictionary
-from services.ai_service import AIService
+from services.ai_service import get_ai_service
 from api_framework import ApiException
 from errors import restful_error, sse_error_event, DomainError
 
@@ -314,9 +315,9 @@ async def generate_story_stream(
                 quality = "high" if score >= plan.quality_threshold else "low"
                 
                 # 生成向量并更新记忆库
-                async with AIService() as ai:
-                    vecs = await ai.get_embeddings([combined_output], model_id="text-embedding-3-small")
-                    embedding = vecs[0]
+                ai = await get_ai_service()
+                vecs = await ai.get_embeddings([combined_output], model_id="text-embedding-3-small")
+                embedding = vecs[0]
                 
                 success = await update_memory_quality(
                     paragraph=combined_output,
@@ -377,12 +378,12 @@ async def intelligent_splicing_with_rl(payload: Dict[str, Any] = Body(...)):
         return {"code": 400, "message": "query is required", "data": None}
     
     try:
-        db = await get_db_service()
+        pg = await get_pg_pool()
         
         # 1. 生成查询向量
-        async with AIService() as ai:
-            embeddings = await ai.get_embeddings([query], model_id="text-embedding-3-small")
-            query_vec = np.array(embeddings[0])
+        ai = await get_ai_service()
+        embeddings = await ai.get_embeddings([query], model_id="text-embedding-3-small")
+        query_vec = np.array(embeddings[0])
         
         # 2. 关键词RAG检索
         rag = KeywordRAG()
@@ -398,7 +399,7 @@ async def intelligent_splicing_with_rl(payload: Dict[str, Any] = Body(...)):
         
         # 3. 强化学习段落选择(如果启用)
         if enable_rl and candidate_paragraphs:
-            rl_optimizer = await get_rl_optimizer(db.pool)
+            rl_optimizer = await get_rl_optimizer(pg)
             selected_paragraphs = await rl_optimizer.select_paragraphs_with_rl(
                 candidate_paragraphs=candidate_paragraphs,
                 query_vec=query_vec,
@@ -412,7 +413,7 @@ async def intelligent_splicing_with_rl(payload: Dict[str, Any] = Body(...)):
         
         # 5. 异步后台优化(不阻塞响应)
         if enable_rl and selected_paragraphs:
-            rl_optimizer = await get_rl_optimizer(db.pool)
+            rl_optimizer = await get_rl_optimizer(pg)
             asyncio.create_task(
                 rl_optimizer.async_evaluate_and_optimize(
                     spliced_content=spliced_content,
@@ -496,13 +497,13 @@ async def submit_splicing_feedback(payload: Dict[str, Any] = Body(...)):
         return {"code": 400, "message": "paragraph_ids, query and feedback_type are required", "data": None}
     
     try:
-        db = await get_db_service()
-        rl_optimizer = await get_rl_optimizer(db.pool)
+        pg = await get_pg_pool()
+        rl_optimizer = await get_rl_optimizer(pg)
         
         # 生成查询向量
-        async with AIService() as ai:
-            embeddings = await ai.get_embeddings([query], model_id="text-embedding-3-small")
-            query_vec = np.array(embeddings[0])
+        ai = await get_ai_service()
+        embeddings = await ai.get_embeddings([query], model_id="text-embedding-3-small")
+        query_vec = np.array(embeddings[0])
         
         # 计算奖励(仅基于用户反馈)
         reward = await rl_optimizer.calculate_reward(
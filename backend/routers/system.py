@@ -9,6 +9,7 @@ from api_framework import ApiException, ErrorCode, get_request_id, log_request,
 from contracts import ApiResponse, success_response, error_response
 from services.db_service import get_db_service
 from services.redis_health_async import check_redis_optional
+from services.cpu_executor import get_cpu_executor_stats
 from config import get_settings
 
 router = APIRouter(prefix="/system", tags=["system"])
@@ -168,6 +169,7 @@ async def system_stats(request: Request):
                 "memory_usage": memory.percent / 100.0,
                 "disk_usage": disk.percent / 100.0
             },
+            "cpu_executor": get_cpu_executor_stats(),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -0,0 +1,169 @@
+"""
+批量入库端到端吞吐基准(BatchIngestTask 流水线)
+
+用法:
+    # 真实服务: 解析/拆分/分类/向量化/入库全链路,结束后删除写入的文档与段落
+    python scripts/bench_batch_ingest.py --size-mb 5
+
+    # 模拟各阶段耗时(无需模型 API 与数据库),对比流水线与串行执行的理论耗时
+    python scripts/bench_batch_ingest.py --simulate --classify-ms 800 --embed-ms 300 --db-ms 150
+
+    # 调整各阶段并发与队列长度
+    python scripts/bench_batch_ingest.py --simulate --classify-concurrency 4 --embed-concurrency 2 --queue-size 8
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+# Ensure minimal env for Settings validation (secret_key >= 32 chars)
+os.environ.setdefault("SECRET_KEY", "offline-test-secret-key-0123456789abcdef0123456789")
+
+import sqlalchemy as sa
+
+from services import batch_ingest_service as bis
+from services.db_service import get_db_service, cleanup_db_service
+
+BENCH_BOOK_ID = "__bench_batch_ingest__"
+
+_SENTENCES = [
+    "山风从谷口灌进来,吹得檐下的铜铃叮当作响。",
+    "他把剑横在膝上,望着远处渐渐暗下去的天色,一言不发。",
+    "“你当真要走?”她低声问道,手里的茶早已凉透。",
+    "城门外的官道上尘土飞扬,一队人马正朝着北方疾驰而去。",
+    "夜色深沉,客栈里只剩掌柜的算盘声还在断断续续地响着。",
+    "老人叹了口气,将那封泛黄的书信重新折好,塞回怀中。",
+]
+
+
+def write_novel(path: Path, size_mb: float) -> int:
+    """生成约 size_mb 的中文小说文本(按章节与段落组织)"""
+    rng = random.Random(42)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    chapter = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            if written == 0 or rng.random() < 0.02:
+                chapter += 1
+                line = f"\n第{chapter}章\n\n"
+            else:
+                line = "".join(rng.choice(_SENTENCES) for _ in range(rng.randint(2, 8))) + "\n\n"
+            f.write(line)
+            written += len(line.encode("utf-8"))
+    return written
+
+
+def install_simulated_stages(classify_ms: float, embed_ms: float, db_ms: float):
+    """用固定延迟替换分类/向量化/入库调用(仅模拟模式)"""
+
+    async def classify(batch, **kwargs):
+        await asyncio.sleep(classify_ms / 1000)
+        return [{"category": None, "labels": []} for _ in batch], 0
+
+    class SimulatedAI:
+        async def get_embeddings(self, texts, model_id=None):
+            await asyncio.sleep(embed_ms / 1000)
+            return [None for _ in texts]
+
+    class SimulatedDB:
+        async def insert_document(self, **kwargs):
+            return 0
+
+        async def insert_paragraphs(self, rows):
+            await asyncio.sleep(db_ms / 1000)
+            return list(range(len(rows)))
+
+    async def get_simulated_db():
+        return SimulatedDB()
+
+    async def get_simulated_ai():
+        return SimulatedAI()
+
+    bis.classify_paragraphs_cached = classify
+    bis.get_ai_service = get_simulated_ai
+    bis.get_db_service = get_simulated_db
+
+
+async def cleanup(doc_id):
+    db = await get_db_service()
+    async with db.get_session() as session:
+        await session.execute(sa.text("DELETE FROM paragraphs WHERE book_id = :b"), {"b": BENCH_BOOK_ID})
+        if doc_id is not None:
+            await session.execute(sa.text("DELETE FROM documents WHERE id = :id"), {"id": doc_id})
+        await session.commit()
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--classify-concurrency", type=int, default=2)
+    parser.add_argument("--embed-concurrency", type=int, default=2)
+    parser.add_argument("--db-concurrency", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--simulate", action="store_true", help="以固定延迟模拟分类/向量化/入库")
+    parser.add_argument("--classify-ms", type=float, default=800.0, help="模拟: 每批分类耗时")
+    parser.add_argument("--embed-ms", type=float, default=300.0, help="模拟: 每批向量化耗时")
+    parser.add_argument("--db-ms", type=float, default=150.0, help="模拟: 每批入库耗时")
+    args = parser.parse_args()
+
+    if args.simulate:
+        install_simulated_stages(args.classify_ms, args.embed_ms, args.db_ms)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "novel.txt"
+        size = write_novel(path, args.size_mb)
+
+        task = bis.BatchIngestTask(
+            task_id="bench",
+            file_path=str(path),
+            book_id=BENCH_BOOK_ID,
+            batch_size=args.batch_size,
+            classify_concurrency=args.classify_concurrency,
+            embed_concurrency=args.embed_concurrency,
+            db_concurrency=args.db_concurrency,
+            queue_size=args.queue_size,
+        )
+
+        stage_marks = {}
+        start = time.perf_counter()
+        last = None
+        try:
+            async for event in task.execute():
+                last = event
+                if event["event"] not in stage_marks and event["event"] != "progress":
+                    stage_marks[event["event"]] = time.perf_counter() - start
+        finally:
+            if not args.simulate:
+                await cleanup(task.doc_id)
+                await cleanup_db_service()
+        elapsed = time.perf_counter() - start
+
+    if last is None or last["event"] != "complete":
+        print(f"INGEST_FAILED: {last}")
+        return 1
+
+    paragraphs = task.progress.total_paragraphs
+    batches = task.progress.total_batches
+    print(f"file: {size / 1024 / 1024:.2f} MB, {paragraphs} paragraphs, {batches} batches")
+    for name, t in stage_marks.items():
+        print(f"  {name:>18}: +{t:8.3f}s")
+    print(f"total: {elapsed:.3f}s  {paragraphs / elapsed:10.1f} paragraphs/s  {size / 1024 / 1024 / elapsed:.3f} MB/s")
+    if args.simulate:
+        sequential = batches * (args.classify_ms + args.embed_ms + args.db_ms) / 1000
+        print(f"sequential estimate: {sequential:.3f}s  speedup: {sequential / elapsed:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,64 @@
+"""
+编码识别基准: 采样检测(头/中/尾窗口 + 全文单次解码) vs 全量检测
+
+用法:
+    python scripts/bench_encoding_detection.py --size-mb 10 --repeat 3
+
+样本集(UTF-8 / GBK / Big5 / UTF-8 BOM / 混合编码)生成在临时目录,结束后删除.
+混合编码样本会触发全量回退,耗时应与全量检测相当.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from services.file_parser_service import (
+    CHARSET_NORMALIZER_AVAILABLE,
+    _detect_and_decode,
+    _detect_and_decode_full,
+)
+from tests.utils.fixture_factory import write_encoding_bench_fixtures
+
+
+def best_of(fn, raw: bytes, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"charset-normalizer: {'yes' if CHARSET_NORMALIZER_AVAILABLE else 'no'}")
+    print(f"{'fixture':>10} {'size':>8} {'full':>9} {'sampled':>9} {'speedup':>8}  encoding")
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        files = write_encoding_bench_fixtures(Path(tmp), size_mb=args.size_mb)
+        for name, path in files.items():
+            raw = path.read_bytes()
+            full_time, (full_text, _, _) = best_of(_detect_and_decode_full, raw, args.repeat)
+            sampled_time, (text, enc, _) = best_of(_detect_and_decode, raw, args.repeat)
+            if text != full_text:
+                mismatches += 1
+            print(
+                f"{name:>10} {len(raw) / 1024 / 1024:7.1f}M {full_time:8.3f}s {sampled_time:8.3f}s "
+                f"{full_time / sampled_time:7.1f}x  {enc}{'' if text == full_text else '  (MISMATCH)'}"
+            )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+段落写入基准: COPY 批量路径 vs 逐行 INSERT + CAST 路径
+
+用法:
+    python scripts/bench_paragraph_insert.py --rows 5000 --dim 1536
+
+写入的行使用独立 book_id,结束后删除.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+# Ensure minimal env for Settings validation (secret_key >= 32 chars)
+os.environ.setdefault("SECRET_KEY", "offline-test-secret-key-0123456789abcdef0123456789")
+
+import sqlalchemy as sa
+
+from services.db_service import get_db_service, cleanup_db_service
+
+BENCH_BOOK_ID = "__bench_paragraph_insert__"
+
+
+def make_rows(n: int, dim: int):
+    rng = random.Random(42)
+    return [
+        {
+            "book_id": BENCH_BOOK_ID,
+            "chapter_index": i // 100,
+            "paragraph_index": i,
+            "content": f"基准段落 {i} " + "字" * rng.randint(50, 400),
+            "meta": {"bench": True, "i": i},
+            "embedding": [rng.random() for _ in range(dim)],
+        }
+        for i in range(n)
+    ]
+
+
+async def run_once(db, rows, bulk: bool) -> float:
+    start = time.perf_counter()
+    ids = await db.insert_paragraphs(rows, bulk=bulk)
+    elapsed = time.perf_counter() - start
+    assert len(ids) == len(rows)
+    assert ids == sorted(ids), "ids must follow input order"
+    return elapsed
+
+
+async def cleanup(db):
+    async with db.get_session() as session:
+        await session.execute(
+            sa.text("DELETE FROM paragraphs WHERE book_id = :b"), {"b": BENCH_BOOK_ID}
+        )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--skip-rowwise", action="store_true", help="只测 COPY 路径(大批量时逐行路径很慢)")
+    args = parser.parse_args()
+
+    db = await get_db_service()
+    if not db._initialized:
+        print("DB_INIT_FAIL")
+        return 1
+
+    rows = make_rows(args.rows, args.dim)
+    try:
+        results = {}
+        results["copy"] = await run_once(db, rows, bulk=True)
+        await cleanup(db)
+        if not args.skip_rowwise:
+            results["rowwise"] = await run_once(db, rows, bulk=False)
+            await cleanup(db)
+
+        for mode, elapsed in results.items():
+            print(f"{mode:>8}: {elapsed:8.3f}s  {args.rows / elapsed:10.1f} rows/s")
+        if "rowwise" in results:
+            print(f" speedup: {results['rowwise'] / results['copy']:.1f}x")
+        return 0
+    finally:
+        await cleanup(db)
+        await cleanup_db_service()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
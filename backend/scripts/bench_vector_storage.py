@@ -0,0 +1,124 @@
+"""
+向量存储模式基准: vector(float32) vs halfvec(float16) vs halfvec+bit(二值预筛 + 全精度重排)
+
+用法:
+    python scripts/bench_vector_storage.py --rows 10000 --dim 1536 --queries 100 --k 10
+    python scripts/bench_vector_storage.py --modes vector,halfvec,halfvec+bit,vector+bit
+
+每种模式写入同一批带聚类结构的随机向量到独立的临时基准表,建 HNSW 索引后用与线上相同的
+AnnQuery SQL 检索;召回率以 numpy 精确余弦 top-k 为基准.结束后删除基准表.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+# Ensure minimal env for Settings validation (secret_key >= 32 chars)
+os.environ.setdefault("SECRET_KEY", "offline-test-secret-key-0123456789abcdef0123456789")
+
+import numpy as np
+
+from services.ann_query import AnnQuery, _apply_search_params, search_params
+from services.pg_pool import get_pg_pool, close_pg_pool
+from services.vector_storage import StorageMode, bit_expression
+
+
+def make_data(rows: int, dim: int, queries: int, clusters: int = 64, seed: int = 42):
+    """聚类结构的数据更接近真实嵌入分布(纯均匀随机向量上所有方法的召回都偏低)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    data = centers[rng.integers(0, clusters, rows)] + 0.3 * rng.standard_normal((rows, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picks = rng.integers(0, rows, queries)
+    q = data[picks] + 0.05 * rng.standard_normal((queries, dim)).astype(np.float32)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return data, q
+
+
+def exact_topk(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    sims = queries @ data.T
+    return np.argsort(-sims, axis=1)[:, :k] + 1  # 表内 id 从 1 开始
+
+
+async def setup_table(conn, table: str, mode: StorageMode, data: np.ndarray):
+    dim = data.shape[1]
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(f"CREATE TABLE {table} (id integer PRIMARY KEY, embedding {mode.column_type(dim)})")
+    await conn.copy_records_to_table(
+        table, records=[(i + 1, row) for i, row in enumerate(data)], columns=["id", "embedding"]
+    )
+    started = time.perf_counter()
+    await conn.execute(f"CREATE INDEX ON {table} USING hnsw (embedding {mode.opclass})")
+    if mode.binary:
+        await conn.execute(f"CREATE INDEX ON {table} USING hnsw ({bit_expression('embedding', dim)} bit_hamming_ops)")
+    build_seconds = time.perf_counter() - started
+    await conn.execute(f"ANALYZE {table}")
+    return build_seconds
+
+
+async def run_mode(pg, mode: StorageMode, data, queries, truth, k: int):
+    table = "bench_vector_storage_" + str(mode).replace("+", "_")
+    async with pg.acquire() as conn:
+        build_seconds = await setup_table(conn, table, mode, data)
+        try:
+            query = AnnQuery(table, ["id"], storage=mode)
+            ef, probes = search_params(query.index_candidates(k))
+            latencies, recalls = [], []
+            for q, expected in zip(queries, truth):
+                sql, params = query.build(q, k)
+                started = time.perf_counter()
+                async with conn.transaction():
+                    await _apply_search_params(conn, ef, probes)
+                    rows = await conn.fetch(sql, *params)
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len({r["id"] for r in rows} & set(expected.tolist())) / k)
+            table_bytes = await conn.fetchval("SELECT pg_table_size($1::regclass)", table)
+            index_bytes = await conn.fetchval("SELECT pg_indexes_size($1::regclass)", table)
+        finally:
+            await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    return {
+        "mode": str(mode),
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "build_s": build_seconds,
+        "table_mb": table_bytes / 2 ** 20,
+        "index_mb": index_bytes / 2 ** 20,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Vector storage mode benchmark")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", default="vector,halfvec,halfvec+bit")
+    args = parser.parse_args()
+
+    data, queries = make_data(args.rows, args.dim, args.queries)
+    truth = exact_topk(data, queries, args.k)
+    pg = await get_pg_pool()
+    if not pg.available:
+        print("Database unavailable, check DATABASE__* settings")
+        return
+    try:
+        print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k}")
+        print(f"{'mode':<14}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'build s':>10}{'table MB':>10}{'index MB':>10}")
+        for name in args.modes.split(","):
+            r = await run_mode(pg, StorageMode.parse(name), data, queries, truth, args.k)
+            print(f"{r['mode']:<14}{r['recall']:>10.3f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                  f"{r['build_s']:>10.1f}{r['table_mb']:>10.1f}{r['index_mb']:>10.1f}")
+    finally:
+        await close_pg_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+"""
+离线重训 RL 查询聚类质心
+
+用法:
+    python scripts/refit_query_clusters.py --sample-size 50000 --batch-size 2048
+
+从 paragraphs 表以 TABLESAMPLE 采样向量,用 MiniBatchKMeans 训练,
+保存为新版本的 workspace/rl/query_centroids_v{N}.npy;
+运行中的服务下次启动(或重新加载)时生效.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+# Ensure minimal env for Settings validation (secret_key >= 32 chars)
+os.environ.setdefault("SECRET_KEY", "offline-test-secret-key-0123456789abcdef0123456789")
+
+from services.pg_pool import get_pg_pool, close_pg_pool
+from services.rl_optimizer import ReinforcementLearningOptimizer
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample-size", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--num-clusters", type=int, default=50)
+    args = parser.parse_args()
+
+    pg = await get_pg_pool()
+    if not pg.available:
+        print("DB_CONNECT_FAIL")
+        return 1
+
+    try:
+        rl = ReinforcementLearningOptimizer(pg, num_clusters=args.num_clusters)
+        # 先加载当前版本,新质心会按旧编号对齐
+        rl.load_centroids()
+        ok = await rl.refit_query_clusters(sample_size=args.sample_size, batch_size=args.batch_size)
+        if not ok:
+            print("NOT_ENOUGH_SAMPLES")
+            return 2
+        print(f"CENTROIDS_SAVED: version={rl.centroid_version}")
+        return 0
+    finally:
+        await close_pg_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -218,28 +218,98 @@ class ModelConfig:
         """清除模型配置缓存"""
         ModelConfig.get_model_config.cache_clear()
 
+# 进程共享的HTTP会话: 所有 AIService 实例借用同一个连接池,长连接复用,避免每次请求重新建连/TLS握手
+# (aiohttp 仅支持 HTTP/1.1,复用依赖 keep-alive)
+_shared_session: Optional[aiohttp.ClientSession] = None
+_shared_session_loop: Optional[asyncio.AbstractEventLoop] = None
+_http_stats: Dict[str, int] = {
+    "requests": 0,
+    "new_connections": 0,
+    "reused_connections": 0,
+    "sessions_created": 0,
+}
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    """请求/连接计数,用于观察连接复用率"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        _http_stats["requests"] += 1
+
+    async def on_connection_create_end(session, ctx, params):
+        _http_stats["new_connections"] += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        _http_stats["reused_connections"] += 1
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace
+
+
+async def get_shared_session() -> aiohttp.ClientSession:
+    """获取共享HTTP会话(惰性创建;事件循环变化或会话关闭后重建)"""
+    global _shared_session, _shared_session_loop
+    loop = asyncio.get_running_loop()
+    if _shared_session is None or _shared_session.closed or _shared_session_loop is not loop:
+        ai_settings = get_settings().ai
+        connector = aiohttp.TCPConnector(
+            limit=ai_settings.http_pool_limit,
+            limit_per_host=ai_settings.http_limit_per_host,
+            keepalive_timeout=ai_settings.http_keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        _shared_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=ai_settings.http_timeout),
+            connector=connector,
+            headers={"User-Agent": "StoryAI/1.0"},
+            trace_configs=[_build_trace_config()],
+        )
+        _shared_session_loop = loop
+        _http_stats["sessions_created"] += 1
+    return _shared_session
+
+
+async def close_shared_session():
+    """关闭共享HTTP会话(应用关闭时调用)"""
+    global _shared_session, _shared_session_loop
+    if _shared_session is not None and not _shared_session.closed:
+        await _shared_session.close()
+    _shared_session = None
+    _shared_session_loop = None
+
+
+def get_http_client_stats() -> Dict[str, Any]:
+    """共享HTTP客户端统计: 请求数、新建连接数、复用连接数"""
+    connections = _http_stats["new_connections"] + _http_stats["reused_connections"]
+    return {
+        **_http_stats,
+        "reuse_rate": round(_http_stats["reused_connections"] / connections, 4) if connections else 0.0,
+        "session_open": _shared_session is not None and not _shared_session.closed,
+    }
+
+
 class AIService:
     """统一的AI服务接口,支持多模型动态配置"""
     
-    def __init__(self):
-        self.session: Optional[aiohttp.ClientSession] = None
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
+        # 显式传入的会话由调用方管理;未传入时借用进程共享会话
+        self.session: Optional[aiohttp.ClientSession] = session
         self._cache: Dict[str, Any] = {}
     
     async def __aenter__(self):
-        if not self.session:
-            timeout = aiohttp.ClientTimeout(total=120.0)
-            connector = aiohttp.TCPConnector(limit=100, limit_per_host=30)
-            self.session = aiohttp.ClientSession(
-                timeout=timeout,
-                connector=connector,
-                headers={"User-Agent": "StoryAI/1.0"}
-            )
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
-            self.session = None
+        # 共享会话由 cleanup_ai_service 在应用关闭时统一释放
+        return None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is not None and not self.session.closed:
+            return self.session
+        return await get_shared_session()
     
     async def run_agent(
         self, 
@@ -282,6 +352,9 @@ class AIService:
                 
         # {{ line ~295-305 logic+clean fix | 来源: dev fallback on ApiException when enabled }}
         except ApiException as e:
+            # 限流交由调用方退避重试,不以模拟响应掩盖
+            if e.status_code == 429:
+                raise
             settings = get_settings()
             if getattr(settings.ai, "enable_dev_embeddings", False):
                 logger.warning(f"API exception, using dev fallback for agent: {str(e)}")
@@ -407,8 +480,7 @@ class AIService:
                     message=f"Embeddings only supported for OpenAI-compatible models currently: {model_id}"
                 )
 
-            if not self.session:
-                await self.__aenter__()
+            session = await self._get_session()
 
             url = f"{config['base_url']}/embeddings"
             headers = {
@@ -420,7 +492,7 @@ class AIService:
                 "input": texts
             }
 
-            async with self.session.post(url, headers=headers, json=payload) as response:
+            async with session.post(url, headers=headers, json=payload) as response:
                 if response.status == 200:
                     result = await response.json()
                     vectors = [item["embedding"] for item in result.get("data", [])]
@@ -558,18 +630,19 @@ class AIService:
             "messages": [{"role": "user", "content": prompt}]
         }
         
-        if not self.session:
-            await self.__aenter__()
+        session = await self._get_session()
         
-        async with self.session.post(url, headers=headers, json=payload) as response:
+        async with session.post(url, headers=headers, json=payload) as response:
             if response.status == 200:
                 result = await response.json()
                 return result["content"][0]["text"]
             else:
                 error_text = await response.text()
                 raise ApiException(
-                    ErrorCode.AI_API_ERROR,
-                    f"Anthropic API error: {response.status} - {error_text}"
+                    status_code=response.status,
+                    code=ErrorCode.RATE_LIMIT_ERROR if response.status == 429 else ErrorCode.AI_API_ERROR,
+                    message=f"Anthropic API error: {response.status} - {error_text}",
+                    details=response.headers.get("Retry-After")
                 )
     
     async def _call_openai_compatible(
@@ -602,11 +675,10 @@ class AIService:
                 if key not in ["max_tokens", "temperature"] and value is not None:
                     payload[key] = value
         
-        if not self.session:
-            await self.__aenter__()
+        session = await self._get_session()
         
         try:
-            async with self.session.post(url, headers=headers, json=payload) as response:
+            async with session.post(url, headers=headers, json=payload) as response:
                 if response.status == 200:
                     result = await response.json()
                     if "choices" in result and len(result["choices"]) > 0:
@@ -619,8 +691,10 @@ class AIService:
                 else:
                     error_text = await response.text()
                     raise ApiException(
-                        ErrorCode.AI_API_ERROR,
-                        f"{config['model_name']} API error: {response.status} - {error_text}"
+                        status_code=response.status,
+                        code=ErrorCode.RATE_LIMIT_ERROR if response.status == 429 else ErrorCode.AI_API_ERROR,
+                        message=f"{config['model_name']} API error: {response.status} - {error_text}",
+                        details=response.headers.get("Retry-After")
                     )
         except aiohttp.ClientError as e:
             raise ApiException(
@@ -650,11 +724,10 @@ class AIService:
             "stream": True
         }
         
-        if not self.session:
-            await self.__aenter__()
+        session = await self._get_session()
         
         try:
-            async with self.session.post(url, headers=headers, json=payload) as response:
+            async with session.post(url, headers=headers, json=payload) as response:
                 if response.status == 200:
                     async for line in response.content:
                         line = line.decode('utf-8').strip()
@@ -708,11 +781,10 @@ class AIService:
             "stream": True
         }
         
-        if not self.session:
-            await self.__aenter__()
+        session = await self._get_session()
         
         try:
-            async with self.session.post(url, headers=headers, json=payload) as response:
+            async with session.post(url, headers=headers, json=payload) as response:
                 if response.status == 200:
                     async for line in response.content:
                         line = line.decode('utf-8').strip()
@@ -799,16 +871,14 @@ class AIService:
 _ai_service = None
 
 async def get_ai_service() -> AIService:
-    """获取AI服务实例"""
+    """获取AI服务实例(借用共享HTTP会话)"""
     global _ai_service
     if _ai_service is None:
         _ai_service = AIService()
-        await _ai_service.__aenter__()
     return _ai_service
 
 async def cleanup_ai_service():
-    """清理AI服务实例"""
+    """清理AI服务实例并关闭共享HTTP会话"""
     global _ai_service
-    if _ai_service:
-        await _ai_service.__aexit__(None, None, None)
-        _ai_service = None
+    _ai_service = None
+    await close_shared_session()
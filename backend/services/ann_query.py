@@ -0,0 +1,265 @@
+"""
+pgvector 近似最近邻(ANN)检索查询构造器
+要点:
+1. 内层子查询只做 "ORDER BY 向量 <=> $1 LIMIT 候选数",这是 HNSW / IVFFlat 索引唯一能加速的形式;
+   WHERE 中若出现 "1 - (向量 <=> $1) >= 阈值" 这类基于距离的谓词,规划器可能放弃索引而全表精确扫描
+2. 距离在内层只计算一次(别名 distance),相似度阈值在外层过滤,再截断到 limit;
+   为抵消阈值过滤和 ANN 近似带来的损失,内层按 overfetch 倍数多取候选
+3. 每个请求在事务内用 set_config(..., true) 设置 hnsw.ef_search / ivfflat.probes,
+   仅对本次查询生效,不污染连接池中的连接;ef_search 不小于候选数(HNSW 最多返回 ef_search 行)
+4. 分区路由: 大书在 vector_indexes 中登记了按 book_id 的部分索引(WHERE book_id = '...'),
+   命中登记时过滤条件以字面量内联,规划器才能匹配部分索引(参数化的通用计划无法证明谓词蕴含)
+5. 存储模式(services.vector_storage): 查询向量转换为列的类型(vector / halfvec);启用 "+bit" 的表
+   先按 binary_quantize 汉明距离预筛 prefilter_count 行,再在其中按全精度距离取候选
+"""
+
+import json
+import logging
+import math
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import get_settings
+from services.vector_storage import VECTOR_COLUMNS, StorageMode, bit_expression, storage_mode
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# pgvector 的 hnsw.ef_search 上限
+MAX_EF_SEARCH = 1000
+
+# 分区索引登记缓存: {(table, column): {value, ...}},多 worker 进程间靠 TTL 收敛
+PARTITION_CACHE_TTL = 60
+_partition_cache: Dict[Tuple[str, str], Set[str]] = {}
+_partition_loaded_at = 0.0
+
+
+def quote_literal(value: str) -> str:
+    """SQL 字符串字面量(standard_conforming_strings 下单引号加倍即可)"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class AnnQuery:
+    """
+    ANN 查询构造器
+
+    用法:
+        q = AnnQuery("paragraphs", ["id", "content", "meta"]).where("is_active = true")
+        if book_id:
+            q.where("book_id = {}", book_id)
+        sql, params = q.build(query_vec, limit=10, threshold=0.8)
+
+    where() 子句中的 {} 依次替换为 $n 占位符;$1 固定为查询向量
+    """
+
+    def __init__(self, table: str, columns: Sequence[str], vector_column: str = "embedding",
+                 storage: Optional[StorageMode] = None):
+        self.table = table
+        self.columns = list(columns)
+        self.vector_column = vector_column
+        # 存储模式决定查询向量的类型转换与是否二值预筛(预筛索引只建在检索列上)
+        self.storage = storage or storage_mode(table)
+        self.binary = self.storage.binary and vector_column == VECTOR_COLUMNS.get(table, ("embedding",))[0]
+        self._filters: List[str] = [f"{vector_column} IS NOT NULL"]
+        self._filter_values: List[Any] = []
+        self._partition: Optional[Tuple[str, Any]] = None
+
+    def where(self, clause: str, *values) -> "AnnQuery":
+        """追加过滤条件(不得包含基于距离的谓词)"""
+        if clause.count("{}") != len(values):
+            raise ValueError("placeholder count does not match values")
+        # 先占位,build 时统一编号
+        self._filters.append(clause)
+        self._filter_values.extend(values)
+        return self
+
+    def partition(self, column: str, value: Any) -> "AnnQuery":
+        """按分区键过滤(如 book_id);有对应部分索引时 build 内联字面量,否则作为参数"""
+        self._partition = (column, value)
+        return self
+
+    @property
+    def partition_key(self) -> Optional[Tuple[str, str]]:
+        return (self.table, self._partition[0]) if self._partition else None
+
+    def candidate_count(self, limit: int, overfetch: Optional[float] = None) -> int:
+        """内层候选数: limit × overfetch,不超过 vector_fetch_max"""
+        db = settings.database
+        factor = db.vector_overfetch if overfetch is None else overfetch
+        return max(limit, min(db.vector_fetch_max, int(math.ceil(limit * max(factor, 1.0)))))
+
+    def prefilter_count(self, limit: int, overfetch: Optional[float] = None) -> int:
+        """二值预筛候选数: 重排候选数 × binary_rerank_factor,受 HNSW ef_search 上限约束"""
+        fetch = self.candidate_count(limit, overfetch)
+        factor = max(settings.database.binary_rerank_factor, 1.0)
+        return max(fetch, min(MAX_EF_SEARCH, int(math.ceil(fetch * factor))))
+
+    def uses_prefilter(self, partition_indexed: bool = False) -> bool:
+        # 有专属部分索引的分区直接走全精度部分索引,不经全局二值索引
+        return self.binary and not partition_indexed
+
+    def index_candidates(self, limit: int, overfetch: Optional[float] = None,
+                         partition_indexed: bool = False) -> int:
+        """索引扫描需返回的行数(用于 ef_search 下限)"""
+        if self.uses_prefilter(partition_indexed):
+            return self.prefilter_count(limit, overfetch)
+        return self.candidate_count(limit, overfetch)
+
+    def build(self, query_vec: Any, limit: int, threshold: Optional[float] = None,
+              overfetch: Optional[float] = None, partition_indexed: bool = False) -> Tuple[str, List[Any]]:
+        """生成 ($n 参数化 SQL, 参数列表);partition_indexed 表示分区值有部分索引"""
+        params: List[Any] = [query_vec]
+
+        def next_param(value: Any) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        values = iter(self._filter_values)
+        filters = []
+        for clause in self._filters:
+            while "{}" in clause:
+                clause = clause.replace("{}", next_param(next(values)), 1)
+            filters.append(clause)
+        if self._partition is not None:
+            column, value = self._partition
+            rhs = quote_literal(value) if partition_indexed else next_param(value)
+            filters.append(f"{column} = {rhs}")
+
+        distance = f"{self.vector_column} <=> $1::{self.storage.precision}"
+        if self.uses_prefilter(partition_indexed):
+            # 汉明距离预筛(走 binary_quantize 表达式索引),再按全精度距离重排
+            dim = settings.database.vector_dimension
+            hamming = f"{bit_expression(self.vector_column, dim)} <~> binary_quantize($1::{self.storage.precision})::bit({dim})"
+            prefetch = next_param(self.prefilter_count(limit, overfetch))
+            fetch = next_param(self.candidate_count(limit, overfetch))
+            columns = list(dict.fromkeys(self.columns + [self.vector_column]))
+            inner = (
+                f"SELECT {', '.join(self.columns)}, {distance} AS distance\n"
+                f"    FROM (\n"
+                f"        SELECT {', '.join(columns)}\n"
+                f"        FROM {self.table}\n"
+                f"        WHERE {' AND '.join(filters)}\n"
+                f"        ORDER BY {hamming}\n"
+                f"        LIMIT {prefetch}\n"
+                f"    ) AS prefiltered\n"
+                f"    ORDER BY {distance}\n"
+                f"    LIMIT {fetch}"
+            )
+        else:
+            fetch = next_param(self.candidate_count(limit, overfetch))
+            inner = (
+                f"SELECT {', '.join(self.columns)}, {distance} AS distance\n"
+                f"    FROM {self.table}\n"
+                f"    WHERE {' AND '.join(filters)}\n"
+                f"    ORDER BY {distance}\n"
+                f"    LIMIT {fetch}"
+            )
+
+        outer_where = ""
+        if threshold is not None:
+            outer_where = f"\nWHERE 1 - candidates.distance >= {next_param(float(threshold))}"
+        sql = (
+            f"SELECT candidates.*, 1 - candidates.distance AS similarity\n"
+            f"FROM (\n    {inner}\n) AS candidates{outer_where}\n"
+            f"ORDER BY candidates.distance\n"
+            f"LIMIT {next_param(limit)}"
+        )
+        return sql, params
+
+
+def search_params(candidates: int, ef_search: Optional[int] = None,
+                  probes: Optional[int] = None) -> Tuple[int, int]:
+    """本次请求的 (ef_search, probes): 未指定时取配置值,ef_search 至少为候选数"""
+    db = settings.database
+    ef = ef_search if ef_search is not None else db.hnsw_ef_search
+    ef = min(MAX_EF_SEARCH, max(ef, candidates))
+    return ef, max(1, probes if probes is not None else db.ivfflat_probes)
+
+
+def register_partition_index(table: str, column: str, value: str):
+    """建好部分索引后登记到本进程缓存(其他进程在 TTL 后从 vector_indexes 重新加载)"""
+    _partition_cache.setdefault((table, column), set()).add(str(value))
+
+
+def unregister_partition_index(table: str, column: str, value: str):
+    _partition_cache.get((table, column), set()).discard(str(value))
+
+
+async def load_partition_indexes(conn=None, force: bool = False) -> Dict[Tuple[str, str], Set[str]]:
+    """从 vector_indexes 加载分区部分索引登记(index_params.partition = {column, value})"""
+    global _partition_loaded_at
+    if not force and time.time() - _partition_loaded_at < PARTITION_CACHE_TTL:
+        return _partition_cache
+    sql = """
+        SELECT table_name, index_params FROM vector_indexes
+        WHERE is_active = true AND index_params ? 'partition'
+    """
+    if conn is None:
+        from services.pg_pool import get_pg_pool
+        pg = await get_pg_pool()
+        rows = await pg.fetch_all(sql)
+    else:
+        rows = [dict(r) for r in await conn.fetch(sql)]
+    loaded: Dict[Tuple[str, str], Set[str]] = {}
+    for row in rows:
+        params = row["index_params"]
+        if isinstance(params, str):
+            params = json.loads(params)
+        part = params.get("partition") or {}
+        if part.get("column") and part.get("value") is not None:
+            loaded.setdefault((row["table_name"], part["column"]), set()).add(str(part["value"]))
+    _partition_cache.clear()
+    _partition_cache.update(loaded)
+    _partition_loaded_at = time.time()
+    return _partition_cache
+
+
+async def is_partition_indexed(query: AnnQuery, conn=None) -> bool:
+    """查询的分区值是否有专属部分索引;登记表不可读时按无索引处理"""
+    key = query.partition_key
+    if key is None:
+        return False
+    try:
+        registry = await load_partition_indexes(conn)
+    except Exception as e:
+        logger.debug(f"Partition index registry unavailable: {e}")
+        return False
+    return str(query._partition[1]) in registry.get(key, ())
+
+
+async def _apply_search_params(conn, ef_search: int, probes: int):
+    # set_config(..., is_local=true) 等价于 SET LOCAL,但可以参数化
+    await conn.execute(
+        "SELECT set_config('hnsw.ef_search', $1, true), set_config('ivfflat.probes', $2, true)",
+        str(ef_search), str(probes),
+    )
+
+
+async def fetch_ann(query: AnnQuery, query_vec: Any, limit: int, threshold: Optional[float] = None,
+                    overfetch: Optional[float] = None, ef_search: Optional[int] = None,
+                    probes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """在共享连接池上执行 ANN 查询,返回按相似度降序的行(含 distance / similarity)"""
+    from services.pg_pool import get_pg_pool
+
+    indexed = await is_partition_indexed(query)
+    sql, params = query.build(query_vec, limit, threshold, overfetch, partition_indexed=indexed)
+    ef, n_probes = search_params(query.index_candidates(limit, overfetch, indexed), ef_search, probes)
+    pg = await get_pg_pool()
+    async with pg.acquire() as conn:
+        async with conn.transaction():
+            await _apply_search_params(conn, ef, n_probes)
+            rows = await conn.fetch(sql, *params)
+    return [dict(r) for r in rows]
+
+
+async def explain_ann(conn, query: AnnQuery, query_vec: Any, limit: int, threshold: Optional[float] = None,
+                      overfetch: Optional[float] = None, ef_search: Optional[int] = None,
+                      probes: Optional[int] = None) -> str:
+    """返回 ANN 查询的 EXPLAIN 文本(诊断与测试用;调用方负责连接)"""
+    indexed = await is_partition_indexed(query, conn)
+    sql, params = query.build(query_vec, limit, threshold, overfetch, partition_indexed=indexed)
+    ef, n_probes = search_params(query.index_candidates(limit, overfetch, indexed), ef_search, probes)
+    async with conn.transaction():
+        await _apply_search_params(conn, ef, n_probes)
+        rows = await conn.fetch(f"EXPLAIN {sql}", *params)
+    return "\n".join(r[0] for r in rows)
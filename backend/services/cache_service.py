@@ -1,11 +1,19 @@
-"""Simplified cache service - Redis only with in-memory fallback
-Removed: MemoryCache class, HybridCache L1 layer, lru_cache decorators
-Kept: RedisCache with automatic fallback to dict-based cache when Redis unavailable
+"""Cache service - bounded in-process L1 in front of Redis
+
+- LocalCache: size-bounded LRU with per-entry TTL and byte accounting
+- RedisCache: L1 read-through / write-through over Redis; when Redis is disabled or
+  unreachable the same L1 becomes the only tier, so memory stays bounded either way
+- Connection health is tracked from command failures (no PING per operation);
+  reconnects are attempted at most once per reconnect interval
 """
 
+import fnmatch
 import json
 import logging
-from typing import Any, Optional, Dict
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Dict, List, Tuple
 import os
 
 try:
@@ -19,134 +27,346 @@ from config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait before retrying a failed Redis connection
+RECONNECT_INTERVAL = 5.0
+
+
+class LocalCache:
+    """In-process LRU cache bounded by entry count and approximate byte size
+
+    Values are stored as serialized strings (callers own (de)serialization) so a
+    cached object can never be mutated through a returned reference.
+    Expired entries are dropped lazily on access and eagerly when making room.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # key -> (value, expires_at or None, nbytes)
+        self._data: "OrderedDict[str, Tuple[str, Optional[float], int]]" = OrderedDict()
+        self.bytes_used = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @staticmethod
+    def _sizeof(key: str, value: str) -> int:
+        # sys.getsizeof reports the real allocation of a str (header + code units)
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _remove(self, key: str):
+        _, _, nbytes = self._data.pop(key)
+        self.bytes_used -= nbytes
+
+    def _live(self, key: str, now: Optional[float] = None) -> Optional[Tuple[str, Optional[float], int]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at = entry[1]
+        if expires_at is not None and expires_at <= (now if now is not None else time.monotonic()):
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._live(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+        """Store a value; returns False when the value alone exceeds max_bytes"""
+        nbytes = self._sizeof(key, value)
+        if nbytes > self.max_bytes or self.max_entries <= 0:
+            self.delete(key)
+            return False
+        if key in self._data:
+            self._remove(key)
+
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl and ttl > 0 else None
+        self._data[key] = (value, expires_at, nbytes)
+        self.bytes_used += nbytes
+        self._make_room()
+        return True
+
+    def _make_room(self):
+        if len(self._data) <= self.max_entries and self.bytes_used <= self.max_bytes:
+            return
+        # Expired entries go first, then least recently used
+        now = time.monotonic()
+        for key in [k for k, (_, exp, _) in self._data.items() if exp is not None and exp <= now]:
+            self._remove(key)
+            self.expirations += 1
+        while self._data and (len(self._data) > self.max_entries or self.bytes_used > self.max_bytes):
+            _, (_, _, nbytes) = self._data.popitem(last=False)
+            self.bytes_used -= nbytes
+            self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        if key in self._data:
+            self._remove(key)
+            return True
+        return False
+
+    def exists(self, key: str) -> bool:
+        return self._live(key) is not None
+
+    def ttl(self, key: str) -> int:
+        """Remaining TTL in seconds, -1 without expiry, -2 when missing (Redis semantics)"""
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, int(entry[1] - time.monotonic()))
+
+    def expire(self, key: str, seconds: int) -> bool:
+        entry = self._live(key)
+        if entry is None:
+            return False
+        value, _, nbytes = entry
+        self._data[key] = (value, time.monotonic() + seconds, nbytes)
+        return True
+
+    def clear(self, pattern: str = "*") -> int:
+        if pattern == "*":
+            count = len(self._data)
+            self._data.clear()
+            self.bytes_used = 0
+            return count
+        keys = [k for k in self._data if fnmatch.fnmatchcase(k, pattern)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_entries,
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
 
 class RedisCache:
-    """Redis cache implementation with automatic in-memory fallback
-    
-    Fallback Strategy:
-    - When REDIS__ENABLED=false or Redis connection fails, automatically falls back to dict-based cache
-    - Fallback cache is only valid within a single request lifecycle, cleared on service restart
-    - Production environment requires Redis, development environment allows fallback
+    """Redis cache with a bounded in-process L1
+
+    Tiering:
+    - Redis mode: reads hit L1 first, then Redis (populating L1 with at most
+      cache_l1_ttl seconds so writes from other processes become visible); writes
+      and deletes go to both tiers
+    - Fallback mode (REDIS__ENABLED=false or Redis unreachable): L1 is the only
+      tier and honours the caller's TTL; contents are lost on restart
     """
-    
+
     def __init__(self, redis_url: str = None):
+        settings = get_settings()
         self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379")
         self._redis: Optional[aioredis.Redis] = None
         self._connected = False
-        self._fallback_cache: Dict[str, str] = {}  # Simple dict for fallback
         self._using_fallback = False
-        
+        self._retry_after = 0.0
+        self._l1_ttl = settings.cache_l1_ttl
+        self._l1 = LocalCache(
+            max_entries=settings.cache_max_size,
+            max_bytes=settings.cache_l1_max_bytes,
+        )
+
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+
+    @property
+    def l1(self) -> LocalCache:
+        return self._l1
+
+    def _enter_fallback(self, message: str, level: int = logging.WARNING):
+        if not self._using_fallback:
+            logger.log(level, message)
+            self._using_fallback = True
+
+    def _mark_down(self, op: str, e: Exception):
+        """Record a failed Redis command; the next reconnect waits RECONNECT_INTERVAL"""
+        logger.error(f"Redis {op} error: {e}, using in-memory fallback")
+        self.redis_errors += 1
+        self._connected = False
+        self._retry_after = time.monotonic() + RECONNECT_INTERVAL
+        self._using_fallback = True
+
+    def _l1_ttl_for(self, ttl: Optional[int]) -> Optional[int]:
+        """TTL for an L1 copy: capped by cache_l1_ttl while Redis is authoritative"""
+        if self._using_fallback:
+            return ttl
+        if ttl and ttl > 0:
+            return min(ttl, self._l1_ttl)
+        return self._l1_ttl
+
     async def _ensure_connection(self) -> bool:
-        """Ensure Redis connection with fallback detection"""
+        """Return True when Redis is usable; no round-trip once connected"""
+        if self._connected and self._redis is not None:
+            return True
+
         settings = get_settings()
-        
-        # Check if Redis is enabled
         if not settings.redis.enabled:
-            if not self._using_fallback:
-                logger.info("Redis disabled in config, using in-memory fallback cache (not persistent)")
-                self._using_fallback = True
+            self._enter_fallback("Redis disabled in config, using in-memory fallback cache (not persistent)", logging.INFO)
             return False
-        
         if not REDIS_AVAILABLE:
-            if not self._using_fallback:
-                logger.warning("Redis unavailable, using in-memory fallback cache (not persistent)")
-                self._using_fallback = True
+            self._enter_fallback("Redis unavailable, using in-memory fallback cache (not persistent)")
             return False
-        
-        # Try to connect to Redis
-        if self._connected and self._redis:
-            try:
-                await self._redis.ping()
-                return True
-            except Exception:
-                self._connected = False
-        
+        if time.monotonic() < self._retry_after:
+            return False
+
         try:
-            self._redis = await aioredis.from_url(
-                self.redis_url,
-                encoding='utf-8',
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True,
-                health_check_interval=30
-            )
+            if self._redis is None:
+                self._redis = aioredis.from_url(
+                    self.redis_url,
+                    encoding='utf-8',
+                    decode_responses=True,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                    retry_on_timeout=True,
+                    health_check_interval=30
+                )
+            # One ping per (re)connect; afterwards failures are detected from commands
             await self._redis.ping()
             self._connected = True
+            if self._using_fallback:
+                # Entries written while Redis was down may be stale relative to Redis
+                self._l1.clear()
             self._using_fallback = False
             logger.info("Redis connection established")
             return True
         except Exception as e:
-            if not self._using_fallback:
-                logger.error(f"Failed to connect to Redis: {e}, using in-memory fallback")
-                self._using_fallback = True
+            self._enter_fallback(f"Failed to connect to Redis: {e}, using in-memory fallback", logging.ERROR)
             self._connected = False
+            self._retry_after = time.monotonic() + RECONNECT_INTERVAL
             return False
-    
+
     async def get(self, key: str) -> Optional[Any]:
-        """Get cache value with fallback support"""
+        """Get cache value (L1 first, then Redis)"""
+        from services.json_repairer import safe_json_loads
+
+        value = self._l1.get(key)
+        if value is not None:
+            return safe_json_loads(value)
+
         if await self._ensure_connection():
             try:
                 value = await self._redis.get(key)
-                if value:
-                    # 使用安全的JSON解析
-                    from services.json_repairer import safe_json_loads
-                    return safe_json_loads(value)
             except Exception as e:
-                logger.error(f"Redis get error: {e}, trying fallback")
-                self._using_fallback = True
-        
-        # Fallback to in-memory dict
-        if self._using_fallback:
-            value = self._fallback_cache.get(key)
-            if value:
-                # 使用安全的JSON解析
-                from services.json_repairer import safe_json_loads
-                return safe_json_loads(value)
-        
+                self._mark_down("get", e)
+                return None
+            if value is None:
+                self.redis_misses += 1
+                return None
+            self.redis_hits += 1
+            self._l1.set(key, value, ttl=self._l1_ttl_for(None))
+            return safe_json_loads(value)
+
         return None
-    
+
     async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set cache value with fallback support"""
+        """Set cache value in both tiers"""
         serialized_value = json.dumps(value, ensure_ascii=False)
-        
+
         if await self._ensure_connection():
             try:
                 if ttl:
                     await self._redis.setex(key, ttl, serialized_value)
                 else:
                     await self._redis.set(key, serialized_value)
+                self._l1.set(key, serialized_value, ttl=self._l1_ttl_for(ttl))
                 return True
             except Exception as e:
-                logger.error(f"Redis set error: {e}, using fallback")
-                self._using_fallback = True
-        
-        # Fallback to in-memory dict (ignoring TTL in fallback mode)
-        if self._using_fallback:
-            self._fallback_cache[key] = serialized_value
+                self._mark_down("set", e)
+
+        return self._l1.set(key, serialized_value, ttl=ttl)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Batched get: L1 first, then one MGET for the remaining keys"""
+        from services.json_repairer import safe_json_loads
+
+        results: List[Optional[Any]] = [None] * len(keys)
+        missing: List[int] = []
+        for i, key in enumerate(keys):
+            value = self._l1.get(key)
+            if value is not None:
+                results[i] = safe_json_loads(value)
+            else:
+                missing.append(i)
+
+        if missing and await self._ensure_connection():
+            try:
+                values = await self._redis.mget([keys[i] for i in missing])
+            except Exception as e:
+                self._mark_down("mget", e)
+                return results
+            for i, value in zip(missing, values):
+                if value is None:
+                    self.redis_misses += 1
+                    continue
+                self.redis_hits += 1
+                self._l1.set(keys[i], value, ttl=self._l1_ttl_for(None))
+                results[i] = safe_json_loads(value)
+
+        return results
+
+    async def set_many(self, items: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Batched set: one pipelined round-trip to Redis, mirrored into L1"""
+        serialized = {key: json.dumps(value, ensure_ascii=False) for key, value in items.items()}
+        if not serialized:
             return True
-        
-        return False
-    
-    async def delete(self, key: str) -> bool:
-        """Delete cache item with fallback support"""
+
         if await self._ensure_connection():
             try:
-                result = await self._redis.delete(key)
-                return result > 0
+                pipe = self._redis.pipeline(transaction=False)
+                for key, value in serialized.items():
+                    pipe.set(key, value, ex=ttl or None)
+                await pipe.execute()
+                for key, value in serialized.items():
+                    self._l1.set(key, value, ttl=self._l1_ttl_for(ttl))
+                return True
             except Exception as e:
-                logger.error(f"Redis delete error: {e}")
-                self._using_fallback = True
-        
-        # Fallback
-        if self._using_fallback and key in self._fallback_cache:
-            del self._fallback_cache[key]
-            return True
-        
-        return False
-    
+                self._mark_down("pipeline", e)
+
+        return all([self._l1.set(key, value, ttl=ttl) for key, value in serialized.items()])
+
+    async def delete(self, *keys: str) -> int:
+        """Delete one or more keys; returns the number removed"""
+        if not keys:
+            return 0
+        local_count = sum(1 for key in keys if self._l1.delete(key))
+
+        if await self._ensure_connection():
+            try:
+                return await self._redis.delete(*keys)
+            except Exception as e:
+                self._mark_down("delete", e)
+
+        return local_count
+
     async def clear(self, pattern: str = "*") -> int:
-        """Clear cache (supports pattern matching)"""
+        """Clear cache (supports glob pattern matching in both tiers)"""
+        local_count = self._l1.clear(pattern)
+
         if await self._ensure_connection():
             try:
                 keys = await self._redis.keys(pattern)
@@ -154,93 +374,96 @@ class RedisCache:
                     return await self._redis.delete(*keys)
                 return 0
             except Exception as e:
-                logger.error(f"Redis clear error: {e}")
-        
-        # Fallback: clear all (pattern matching not supported in dict)
-        if self._using_fallback:
-            count = len(self._fallback_cache)
-            self._fallback_cache.clear()
-            return count
-        
-        return 0
-    
+                self._mark_down("clear", e)
+
+        return local_count
+
     async def exists(self, key: str) -> bool:
         """Check if key exists"""
+        if self._l1.exists(key):
+            return True
+
         if await self._ensure_connection():
             try:
                 return await self._redis.exists(key) > 0
             except Exception as e:
-                logger.error(f"Redis exists error: {e}")
-        
-        # Fallback
-        if self._using_fallback:
-            return key in self._fallback_cache
-        
+                self._mark_down("exists", e)
+
         return False
-    
+
     async def ttl(self, key: str) -> int:
         """Get TTL of key"""
         if await self._ensure_connection():
             try:
                 return await self._redis.ttl(key)
             except Exception as e:
-                logger.error(f"Redis ttl error: {e}")
-        
-        # Fallback: TTL not supported in dict mode
-        return -1
-    
+                self._mark_down("ttl", e)
+
+        return self._l1.ttl(key)
+
     async def hgetall(self, key: str) -> Dict[str, str]:
         """Get all fields in hash (for metadata storage)"""
         if await self._ensure_connection():
             try:
                 return await self._redis.hgetall(key)
             except Exception as e:
-                logger.error(f"Redis hgetall error: {e}")
-                self._using_fallback = True
-        
-        # Fallback: simulate hash with nested dict
-        if self._using_fallback:
-            value = self._fallback_cache.get(key)
-            if value:
-                try:
-                    return json.loads(value)
-                except:
-                    pass
-        
+                self._mark_down("hgetall", e)
+
+        # Fallback: hash stored as a JSON object
+        value = self._l1.get(key)
+        if value:
+            try:
+                return json.loads(value)
+            except ValueError:
+                pass
+
         return {}
-    
+
     async def hmset(self, key: str, mapping: Dict[str, Any]) -> bool:
         """Set multiple hash fields (for metadata storage)"""
         if await self._ensure_connection():
             try:
                 await self._redis.hset(key, mapping=mapping)
+                self._l1.delete(key)
                 return True
             except Exception as e:
-                logger.error(f"Redis hmset error: {e}")
-                self._using_fallback = True
-        
+                self._mark_down("hmset", e)
+
         # Fallback: store as JSON
-        if self._using_fallback:
-            self._fallback_cache[key] = json.dumps(mapping, ensure_ascii=False)
-            return True
-        
-        return False
-    
+        return self._l1.set(key, json.dumps(mapping, ensure_ascii=False))
+
     async def expire(self, key: str, seconds: int) -> bool:
         """Set key expiration"""
         if await self._ensure_connection():
             try:
-                return await self._redis.expire(key, seconds)
+                result = await self._redis.expire(key, seconds)
+                self._l1.expire(key, min(seconds, self._l1_ttl))
+                return result
             except Exception as e:
-                logger.error(f"Redis expire error: {e}")
-        
-        # Fallback: expiration not supported in dict mode
-        return False
-    
+                self._mark_down("expire", e)
+
+        return self._l1.expire(key, seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        redis_lookups = self.redis_hits + self.redis_misses
+        return {
+            "l1_cache": self._l1.get_stats(),
+            "redis_available": REDIS_AVAILABLE and get_settings().redis.enabled,
+            "redis_connected": self._connected,
+            "using_fallback": self._using_fallback,
+            "redis": {
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "hit_rate": round(self.redis_hits / redis_lookups, 4) if redis_lookups else 0.0,
+                "errors": self.redis_errors,
+            },
+        }
+
     async def close(self):
         """Close Redis connection"""
         if self._redis:
             await self._redis.close()
+            self._redis = None
             self._connected = False
 
 
@@ -351,25 +574,20 @@ def clear_model_config_cache():
 
 # 缓存统计信息
 async def get_cache_stats() -> dict:
-    """获取缓存统计信息"""
-    from services.cache_service import _redis_cache
-    import asyncio
-    
-    stats = {
-        "l1_cache": {
-            "size": 0,  # 需要实现实际的缓存大小统计
-            "max_size": 1000,
-            "keys": []
-        },
-        "redis_available": True,  # 需要检查实际的Redis可用性
-        "redis_connected": False
-    }
-    
-    # Redis统计
-    if _redis_cache:
-        try:
-            stats["redis_connected"] = await _redis_cache._ensure_connection()
-        except Exception:
-            pass
-    
+    """获取缓存统计信息(L1 / Redis 命中、未命中、淘汰计数,以及向量缓存与解析缓存)"""
+    cache = await get_redis_cache()
+    stats = cache.get_stats()
+
+    # 延迟导入: embedding_cache 依赖本模块
+    from services import embedding_cache
+    if embedding_cache._embedding_cache is not None:
+        stats["embedding_cache"] = embedding_cache._embedding_cache.get_stats()
+
+    from services.json_repairer import get_json_decode_stats
+    stats["json_decode"] = get_json_decode_stats()
+
+    from services import parse_cache
+    if parse_cache._parse_cache is not None:
+        stats["parse_cache"] = parse_cache._parse_cache.get_stats()
+
     return stats
@@ -65,25 +65,21 @@ class ChapterService:
         return DEPENDENCIES_AVAILABLE and bool(get_settings().database.enabled) and asyncpg is not None
 
     async def _get_db_pool(self):
-        """Get or create database connection pool; return None if disabled or init fails."""
+        """Get the process-wide shared pool; return None if disabled or unavailable."""
         if not self._db_enabled() or asyncpg is None:
             return None
 
         if self.db_pool or self._db_init_failed:
             return self.db_pool
 
-        try:
-            self.db_pool = await asyncpg.create_pool(
-                settings.database.url,
-                min_size=1,
-                max_size=10
-            )
-            return self.db_pool
-        except Exception as e:
-            logger.warning(f"DB pool init failed, falling back to file storage: {e}")
+        from services.pg_pool import get_pg_pool
+        pg = await get_pg_pool()
+        if not pg.available:
+            logger.warning("Shared DB pool unavailable, falling back to file storage")
             self._db_init_failed = True
-            self.db_pool = None
             return None
+        self.db_pool = pg
+        return self.db_pool
     
     def _get_chapter_file_path(self, project_id: str, chapter_number: int) -> Path:
         """Get file path for chapter JSON file"""
@@ -16,17 +16,43 @@ meta 示例:
 实现策略:
 - 轻量内置分类词典(可扩展): LITERARY_DICTIONARY
 - 调用 AIService.run_agent 进行分类提示,返回 JSON; 使用 json_repairer 修复
-- 并发控制: 限制并发以避免速率限制
+- 批量模式: 按 token 预算把多个段落打包进一个提示,要求返回按序号标注的 JSON 数组;
+  校验失败的段落重新拆分后重试,单段时退回单段提示;请求出错只重试一次,不拆分
+- 自适应并发: 按请求延迟与 429 限流动态调整并发(加性增、乘性减)
+- 结果缓存: 以 (段落内容哈希, model_id, 词典/提示词版本) 为键存入 Redis,
+  入库前批量查询,仅对未命中的段落调用模型
 
 遵循 simple_cache 规范: 使用 lru_cache 缓存词典
 """
 
 import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
 from functools import lru_cache
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
-from services.ai_service import AIService
-from services.json_repairer import repair_and_load
+from api_framework import ApiException
+from config import get_settings
+from services.ai_service import get_ai_service
+from services.cache_service import get_cache, slugify_model_name
+from services.json_repairer import repair_and_load, repair_and_load_async
+
+logger = logging.getLogger(__name__)
+
+# 单段输出 token 估计(与原单段提示的 max_tokens 一致)
+SINGLE_OUTPUT_TOKENS = 400
+# 批量模式下每段输出 token 估计及整体上限
+BATCH_OUTPUT_TOKENS_PER_ITEM = 160
+BATCH_OUTPUT_TOKENS_MAX = 4000
+# 429 限流后的最大重试次数
+MAX_RATE_LIMIT_RETRIES = 4
+# 批量请求出错(非 429、超时、429 重试耗尽)后的重试次数;仍失败则整组使用默认 meta
+REQUEST_ERROR_RETRIES = 1
+# 提示词模板版本: 修改分类提示词或 meta 结构时递增,使旧缓存失效
+CLASSIFY_PROMPT_VERSION = 2
 
 
 @lru_cache(maxsize=1)
@@ -50,16 +76,36 @@ def get_literary_dictionary() -> Dict[str, Any]:
     }
 
 
-def build_classify_prompt(paragraph: str) -> str:
+@lru_cache(maxsize=1)
+def dictionary_version() -> str:
+    """分类词典 + 提示词版本的指纹,作为缓存键的一部分"""
+    payload = json.dumps(get_literary_dictionary(), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(f"{CLASSIFY_PROMPT_VERSION}:{payload}".encode("utf-8")).hexdigest()[:12]
+
+
+def classification_cache_key(text: str, model_id: str) -> str:
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return f"cls:{slugify_model_name(model_id)}:{dictionary_version()}:{digest}"
+
+
+def default_meta() -> Dict[str, Any]:
+    return {"category": None, "subcategory": None, "labels": [], "isDialogue": False}
+
+
+def _dictionary_constraints() -> str:
     dic = get_literary_dictionary()
     cats = ", ".join(dic["categories"].keys())
     subs = []
     for k, v in dic["categories"].items():
         subs.append(f"{k}: {', '.join(v['subcategories'])}")
     subs_str = "; ".join(subs)
+    return f"主类别(category)限定: [{cats}];子类别(subcategory)限定: {subs_str}.\n"
+
+
+def build_classify_prompt(paragraph: str) -> str:
     prompt = (
         "你是'大语言模型级别'的文学写作分类器.请进行层次化、多标签分类,并仅返回一个 JSON 对象,不要包含任何额外文字.\n"
-        f"主类别(category)限定: [{cats}];子类别(subcategory)限定: {subs_str}.\n"
+        + _dictionary_constraints() +
         "要求:\n"
         "- labels 为多标签数组,包含风格/情感/主题/场景等关键特征;\n"
         "- isDialogue 布尔;characters 提取人物名;emotion 单词;style 文风;scene 简述;\n"
@@ -70,40 +116,325 @@ def build_classify_prompt(paragraph: str) -> str:
     return prompt
 
 
-async def classify_paragraphs(paragraphs: List[str], model_id: str = "gpt-3.5-turbo", concurrency: int = 6) -> List[Dict[str, Any]]:
-    """对段落列表进行分类,返回与输入一一对应的 meta 列表"""
-    metas: List[Optional[Dict[str, Any]]] = [None] * len(paragraphs)
+def build_batch_classify_prompt(paragraphs: Sequence[str]) -> str:
+    """多段落分类提示: 段落以 [序号] 标注,要求返回按 index 对应的 JSON 数组"""
+    n = len(paragraphs)
+    blocks = "\n\n".join(f"[{i}] {text}" for i, text in enumerate(paragraphs))
+    prompt = (
+        f"你是'大语言模型级别'的文学写作分类器.下面共有 {n} 个段落,以 [序号] 标注.请逐段进行层次化、多标签分类,"
+        "并仅返回一个 JSON 数组,不要包含任何额外文字.\n"
+        + _dictionary_constraints() +
+        "要求:\n"
+        f"- 数组恰好 {n} 个元素,每个元素对应一个段落,index 为段落序号(整数 0..{n - 1});\n"
+        "- labels 为多标签数组,包含风格/情感/主题/场景等关键特征;\n"
+        "- isDialogue 布尔;characters 提取人物名;emotion 单词;style 文风;scene 简述;\n"
+        "- 每个元素字段固定且必须出现: {index, category, subcategory, labels, isDialogue, characters, emotion, style, scene};\n"
+        "- 输出必须是有效JSON,不能含中文全角引号或多余说明.\n"
+        f"段落:\n{blocks}\n"
+    )
+    return prompt
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数: CJK 字符约 1 token/字,其余约 4 字符/token"""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def pack_batches(paragraphs: Sequence[str], token_budget: int, max_items: int) -> List[List[int]]:
+    """按输入 token 预算与条数上限贪心打包段落下标;超预算的单段独占一批"""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for idx, text in enumerate(paragraphs):
+        cost = estimate_tokens(text)
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(idx)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _has_category(obj: Dict[str, Any]) -> bool:
+    return any(k in obj for k in ("category", "类别", "Category"))
+
 
-    async def worker(idx: int, text: str):
+def normalize_meta(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """兼容字段名大小写/拼写"""
+    return {
+        "category": obj.get("category") or obj.get("类别") or obj.get("Category"),
+        "subcategory": obj.get("subcategory") or obj.get("子类别") or obj.get("Subcategory"),
+        "labels": obj.get("labels") or obj.get("关键词") or obj.get("Labels") or [],
+        "isDialogue": bool(obj.get("isDialogue") or obj.get("is_dialogue") or obj.get("对话")),
+        "characters": obj.get("characters") or obj.get("人物") or obj.get("Characters") or [],
+        "emotion": obj.get("emotion") or obj.get("情感") or obj.get("Emotion"),
+        "style": obj.get("style") or obj.get("文风") or obj.get("Style"),
+        "scene": obj.get("scene") or obj.get("场景") or obj.get("Scene"),
+    }
+
+
+def parse_batch_response(resp: str, n: int) -> Dict[int, Dict[str, Any]]:
+    """解析批量分类结果,返回 {序号: meta};缺失、越界、重复或缺字段的元素视为失败"""
+    return _batch_results(repair_and_load(resp, []), n)
+
+
+def _batch_results(obj: Any, n: int) -> Dict[int, Dict[str, Any]]:
+    """从已解析的批量响应中取出 {序号: meta}"""
+    if isinstance(obj, dict):
+        # 兼容 {"results": [...]} 之类的包装
+        obj = next((v for v in obj.values() if isinstance(v, list)), [])
+    if not isinstance(obj, list):
+        return {}
+
+    results: Dict[int, Dict[str, Any]] = {}
+    for item in obj:
+        if not isinstance(item, dict) or not _has_category(item):
+            continue
         try:
-            async with AIService() as ai:
-                prompt = build_classify_prompt(text)
-                resp = await ai.run_agent(prompt, model_id=model_id, parameters={"temperature": 0.2, "max_tokens": 400})
-                obj = repair_and_load(resp)
-                # 兼容字段名大小写/拼写
-                meta = {
-                    "category": obj.get("category") or obj.get("类别") or obj.get("Category"),
-                    "subcategory": obj.get("subcategory") or obj.get("子类别") or obj.get("Subcategory"),
-                    "labels": obj.get("labels") or obj.get("关键词") or obj.get("Labels") or [],
-                    "isDialogue": bool(obj.get("isDialogue") or obj.get("is_dialogue") or obj.get("对话")),
-                    "characters": obj.get("characters") or obj.get("人物") or obj.get("Characters") or [],
-                    "emotion": obj.get("emotion") or obj.get("情感") or obj.get("Emotion"),
-                    "style": obj.get("style") or obj.get("文风") or obj.get("Style"),
-                    "scene": obj.get("scene") or obj.get("场景") or obj.get("Scene"),
-                }
-                metas[idx] = meta
-        except Exception:
-            metas[idx] = {"category": None, "subcategory": None, "labels": [], "isDialogue": False}
-
-    sem = asyncio.Semaphore(concurrency)
-
-    async def run_with_sem(i: int, t: str):
-        async with sem:
-            await worker(i, t)
-
-    tasks = [run_with_sem(i, p) for i, p in enumerate(paragraphs)]
-    await asyncio.gather(*tasks)
+            idx = int(item.get("index", item.get("序号")))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < n and idx not in results:
+            results[idx] = normalize_meta(item)
+    return results
+
+
+class AdaptiveConcurrency:
+    """
+    自适应并发限制(AIMD)
+    - 成功且延迟低于目标: 每累计 limit 次成功并发 +1
+    - 延迟超过目标: 并发 -1
+    - 429 限流: 并发减半,并在 Retry-After(或指数退避)期间暂停发出新请求
+    """
 
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 16, target_latency: float = 30.0):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial))
+        self.target_latency = target_latency
+        self._in_flight = 0
+        self._successes = 0
+        self._cooldown_until = 0.0
+        self._cond = asyncio.Condition()
+
+        self.requests = 0
+        self.rate_limited = 0
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, latency: Optional[float] = None, rate_limited: bool = False,
+                      retry_after: Optional[float] = None):
+        async with self._cond:
+            self._in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(self.min_limit, self.limit // 2)
+                self._successes = 0
+                if retry_after:
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + retry_after)
+            elif latency is not None:
+                self.requests += 1
+                if latency > self.target_latency:
+                    self.limit = max(self.min_limit, self.limit - 1)
+                    self._successes = 0
+                else:
+                    self._successes += 1
+                    if self._successes >= self.limit:
+                        self.limit = min(self.max_limit, self.limit + 1)
+                        self._successes = 0
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+        }
+
+
+# 每个模型一个并发控制器,跨调用保留学习到的并发水平(按事件循环隔离)
+_limiters: Dict[str, Tuple[asyncio.AbstractEventLoop, AdaptiveConcurrency]] = {}
+
+
+def get_classify_limiter(model_id: str, initial: Optional[int] = None) -> AdaptiveConcurrency:
+    loop = asyncio.get_running_loop()
+    entry = _limiters.get(model_id)
+    if entry is None or entry[0] is not loop:
+        settings = get_settings()
+        limiter = AdaptiveConcurrency(
+            initial or settings.classify_concurrency,
+            max_limit=settings.classify_max_concurrency,
+            target_latency=settings.classify_target_latency,
+        )
+        _limiters[model_id] = (loop, limiter)
+        return limiter
+    return entry[1]
+
+
+def _retry_after_seconds(e: ApiException, attempt: int) -> float:
+    try:
+        return max(0.0, float(e.details))
+    except (TypeError, ValueError):
+        return float(2 ** attempt)
+
+
+async def _run_prompt(prompt: str, model_id: str, max_tokens: int, limiter: AdaptiveConcurrency) -> str:
+    """在并发控制下调用模型;429 时减并发并按 Retry-After 退避重试"""
+    ai = await get_ai_service()
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await limiter.acquire()
+        started = time.monotonic()
+        try:
+            resp = await ai.run_agent(prompt, model_id=model_id, parameters={"temperature": 0.2, "max_tokens": max_tokens})
+        except ApiException as e:
+            if e.status_code == 429 and attempt < MAX_RATE_LIMIT_RETRIES:
+                await limiter.release(rate_limited=True, retry_after=_retry_after_seconds(e, attempt))
+                continue
+            await limiter.release()
+            raise
+        except BaseException:
+            await limiter.release()
+            raise
+        await limiter.release(latency=time.monotonic() - started)
+        return resp
+    raise RuntimeError("classification rate limited")
+
+
+async def _classify_single(text: str, model_id: str, limiter: AdaptiveConcurrency) -> Dict[str, Any]:
+    try:
+        resp = await _run_prompt(build_classify_prompt(text), model_id, SINGLE_OUTPUT_TOKENS, limiter)
+        obj = await repair_and_load_async(resp)
+        return normalize_meta(obj) if isinstance(obj, dict) else default_meta()
+    except Exception:
+        return default_meta()
+
+
+async def _classify_group(items: List[Tuple[int, str]], metas: List[Optional[Dict[str, Any]]],
+                          model_id: str, limiter: AdaptiveConcurrency):
+    """分类一组段落;响应校验失败的段落重新拆分重试,单段时退回单段提示"""
+    if len(items) == 1:
+        idx, text = items[0]
+        metas[idx] = await _classify_single(text, model_id, limiter)
+        return
+
+    texts = [text for _, text in items]
+    max_tokens = min(BATCH_OUTPUT_TOKENS_MAX, 80 + BATCH_OUTPUT_TOKENS_PER_ITEM * len(items))
+    resp = None
+    for attempt in range(REQUEST_ERROR_RETRIES + 1):
+        try:
+            resp = await _run_prompt(build_batch_classify_prompt(texts), model_id, max_tokens, limiter)
+            break
+        except Exception as e:
+            logger.warning(f"Batch classification request failed for {len(items)} paragraphs "
+                           f"(attempt {attempt + 1}): {str(e)}")
+    if resp is None:
+        # 请求/服务端错误: 拆分只会放大对已出错服务的请求量,整组退回默认 meta
+        for idx, _ in items:
+            metas[idx] = default_meta()
+        return
+
+    try:
+        parsed = _batch_results(await repair_and_load_async(resp, []), len(items))
+    except Exception as e:
+        logger.warning(f"Batch classification response invalid for {len(items)} paragraphs: {str(e)}")
+        parsed = {}
+
+    failed = []
+    for local_idx, (idx, text) in enumerate(items):
+        if local_idx in parsed:
+            metas[idx] = parsed[local_idx]
+        else:
+            failed.append((idx, text))
+    if not failed:
+        return
+
+    if len(failed) < len(items):
+        # 部分成功: 失败的段落合成一个更小的批次重试
+        await _classify_group(failed, metas, model_id, limiter)
+    else:
+        # 整批失败: 对半拆分
+        mid = len(failed) // 2
+        await asyncio.gather(
+            _classify_group(failed[:mid], metas, model_id, limiter),
+            _classify_group(failed[mid:], metas, model_id, limiter),
+        )
+
+
+async def classify_paragraphs(paragraphs: List[str], model_id: str = "gpt-3.5-turbo", concurrency: Optional[int] = None,
+                              batched: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """对段落列表进行分类,返回与输入一一对应的 meta 列表
+
+    Args:
+        concurrency: 初始并发(之后按延迟与 429 自适应调整),默认取配置 classify_concurrency
+        batched: 是否多段落打包分类,默认取配置 classify_batch_enabled
+    """
+    if not paragraphs:
+        return []
+    settings = get_settings()
+    if batched is None:
+        batched = settings.classify_batch_enabled
+    limiter = get_classify_limiter(model_id, concurrency)
+    metas: List[Optional[Dict[str, Any]]] = [None] * len(paragraphs)
+    requests_before = limiter.requests
+
+    if batched:
+        groups = pack_batches(paragraphs, settings.classify_batch_token_budget, settings.classify_batch_max_items)
+    else:
+        groups = [[i] for i in range(len(paragraphs))]
+    await asyncio.gather(*(
+        _classify_group([(i, paragraphs[i]) for i in group], metas, model_id, limiter)
+        for group in groups
+    ))
+
+    logger.info(
+        f"Classified {len(paragraphs)} paragraphs in {len(groups)} groups, "
+        f"{limiter.requests - requests_before} requests, concurrency={limiter.limit}, rate_limited={limiter.rate_limited}"
+    )
     # 填充缺失
-    return [m or {"category": None, "subcategory": None, "labels": [], "isDialogue": False} for m in metas]
+    return [m or default_meta() for m in metas]
+
+
+async def classify_paragraphs_cached(paragraphs: List[str], model_id: str = "gpt-3.5-turbo",
+                                     concurrency: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """先批量查询分类缓存,仅对未命中的段落调用模型;返回 (metas, 缓存命中数)
+
+    分类失败得到的默认 meta 不写入缓存,下次入库时会重新分类.
+    """
+    if not paragraphs:
+        return [], 0
+    cache = await get_cache()
+    keys = [classification_cache_key(p, model_id) for p in paragraphs]
+    try:
+        cached = await cache.get_many(keys)
+    except Exception as e:
+        logger.warning(f"Classification cache lookup failed: {str(e)}")
+        cached = [None] * len(paragraphs)
+
+    metas: List[Optional[Dict[str, Any]]] = [m if isinstance(m, dict) else None for m in cached]
+    miss_idx = [i for i, m in enumerate(metas) if m is None]
+    hits = len(paragraphs) - len(miss_idx)
+
+    if miss_idx:
+        fresh = await classify_paragraphs([paragraphs[i] for i in miss_idx], model_id=model_id, concurrency=concurrency)
+        to_store: Dict[str, Any] = {}
+        for i, meta in zip(miss_idx, fresh):
+            metas[i] = meta
+            if meta.get("category") is not None:
+                to_store[keys[i]] = meta
+        try:
+            await cache.set_many(to_store, ttl=get_settings().classify_cache_ttl)
+        except Exception as e:
+            logger.warning(f"Classification cache store failed: {str(e)}")
 
+    # 返回副本: 调用方会在 meta 上追加 overlength 等字段
+    return [dict(m) for m in metas], hits
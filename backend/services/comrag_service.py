@@ -11,6 +11,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 
 from services.db_service import get_db_service
+from services.ann_query import AnnQuery, fetch_ann
 from services.ai_service import AIService
 
 
@@ -237,21 +238,19 @@ async def search_memory_by_vector(
     Returns:
         记忆列表
     """
-    db = await get_db_service()
-    table_name = f"memory_{memory_type}"
-    
-    query = f"""
-        SELECT id, content, embedding, quality_score, llm_score, 
-               user_feedback_score, usage_count, meta,
-               1 - (embedding <=> $1::vector) as similarity
-        FROM {table_name}
-        WHERE 1 - (embedding <=> $1::vector) >= $2
-        ORDER BY embedding <=> $1::vector
-        LIMIT $3
-    """
-    
-    results = await db.execute_query(query, [query_embedding, threshold, limit])
-    return results
+    if memory_type not in ("high", "low"):
+        raise ValueError(f"unknown memory_type: {memory_type}")
+    
+    # 阈值在外层过滤,内层 ORDER BY ... LIMIT 可走 HNSW 索引(见 services.ann_query)
+    query = AnnQuery(
+        f"memory_{memory_type}",
+        ["id", "content", "embedding", "quality_score", "llm_score",
+         "user_feedback_score", "usage_count", "meta"],
+    )
+    rows = await fetch_ann(query, query_embedding, limit, threshold)
+    for row in rows:
+        row.pop("distance", None)
+    return rows
 
 
 async def update_usage_count(memory_id: int, memory_type: str = "high") -> None:
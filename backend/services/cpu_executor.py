@@ -0,0 +1,135 @@
+"""
+CPU 密集任务执行器
+文件解析、段落拆分、jieba 关键词提取、JSON 修复等同步计算通过 run_cpu(fn, *args)
+提交到进程池,以 awaitable 形式返回结果,不阻塞事件循环,并发任务可以利用多核;
+map_cpu 把长列表分片后分发到多个子进程.
+子进程启动时预加载 jieba 词典与 TF-IDF 词频表(cpu_preload_jieba),首个任务无需等待加载.
+进程池由 main.py 的 lifespan 预热与关闭;进程池不可用(受限环境无法创建子进程)或子进程
+异常退出时,回退到线程执行. 提交的函数及参数必须可 pickle(模块级函数).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+_executor: Optional[ProcessPoolExecutor] = None
+_disabled = False
+_stats = {"submitted": 0, "thread_fallbacks": 0, "broken_pools": 0}
+
+
+def _max_workers() -> int:
+    configured = settings.cpu_workers
+    if configured > 0:
+        return configured
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def _init_worker(preload_jieba: bool):
+    """子进程初始化: 预加载 jieba 主词典与 TF-IDF 词频表"""
+    if not preload_jieba:
+        return
+    try:
+        import jieba
+        import jieba.analyse
+    except ImportError:
+        return
+    jieba.setLogLevel(logging.WARNING)
+    jieba.initialize()
+    jieba.analyse.extract_tags("预热", topK=1)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def get_cpu_executor() -> Optional[ProcessPoolExecutor]:
+    """获取进程池(首次调用时创建);不可用时返回 None"""
+    global _executor, _disabled
+    if _executor is None and not _disabled:
+        try:
+            # spawn: 子进程不继承父进程的事件循环与连接池等状态
+            _executor = ProcessPoolExecutor(
+                max_workers=_max_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.cpu_preload_jieba,),
+            )
+            logger.info(f"CPU process pool ready (workers={_max_workers()})")
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"CPU process pool unavailable, using threads: {str(e)}")
+            _disabled = True
+    return _executor
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """在进程池中执行 fn(*args, **kwargs) 并等待结果"""
+    global _executor
+    _stats["submitted"] += 1
+    executor = get_cpu_executor()
+    if executor is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+        except BrokenProcessPool:
+            # 子进程被杀(如 OOM): 丢弃进程池,下次调用重建;本次改在线程中执行
+            logger.error("CPU process pool broken, recreating on next call")
+            _stats["broken_pools"] += 1
+            if _executor is executor:
+                _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+    _stats["thread_fallbacks"] += 1
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+async def map_cpu(fn: Callable[..., List[Any]], items: Sequence[Any], *args,
+                  chunk_size: Optional[int] = None) -> List[Any]:
+    """
+    把 items 分片后并行执行 fn(分片, *args) 并按原顺序拼接结果;fn 接收一个列表并返回等长列表.
+    默认分片数与进程数相同
+    """
+    if not items:
+        return []
+    if chunk_size is None:
+        chunk_size = max(1, -(-len(items) // _max_workers()))
+    chunks = [list(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+    results = await asyncio.gather(*(run_cpu(fn, chunk, *args) for chunk in chunks))
+    return [item for chunk in results for item in chunk]
+
+
+async def warm_cpu_executor():
+    """启动全部子进程(并完成 jieba 预加载),避免首个请求承担进程启动开销"""
+    executor = get_cpu_executor()
+    if executor is None:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        pids = await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(_max_workers())))
+        logger.info(f"CPU process pool warmed ({len(set(pids))} workers)")
+    except Exception as e:
+        logger.warning(f"CPU process pool warmup failed: {str(e)}")
+
+
+def get_cpu_executor_stats() -> Dict[str, Any]:
+    return {
+        "backend": "process" if _executor is not None else ("thread" if _disabled else "idle"),
+        "max_workers": _max_workers(),
+        **_stats,
+    }
+
+
+def shutdown_cpu_executor():
+    """关闭进程池(应用关闭时调用)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        logger.info("CPU process pool closed")
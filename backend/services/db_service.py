@@ -5,6 +5,8 @@ PostgreSQL + pgvector 数据库服务
 
 import logging
 import asyncio
+import hashlib
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from contextlib import asynccontextmanager
 import json
@@ -14,10 +16,12 @@ try:
     import asyncpg
     import sqlalchemy as sa
     from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-    from sqlalchemy.pool import NullPool
+    from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
+    from sqlalchemy import event
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
     from sqlalchemy.orm import declarative_base
     from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
-    from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean
+    from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, Index
     from sqlalchemy.sql import func
     from pgvector.sqlalchemy import Vector
     DEPENDENCIES_AVAILABLE = True
@@ -26,6 +30,18 @@ except ImportError:
     logging.warning("Database dependencies not available. Install: pip install asyncpg sqlalchemy[asyncio] numpy pgvector")
 
 from services.cache_service import get_cache
+from services.pg_pool import (
+    get_pg_pool, _encode_vector_binary, _decode_vector_binary, _encode_halfvec_binary, _decode_halfvec_binary,
+)
+from services.vector_storage import storage_mode
+from services.ann_query import (
+    AnnQuery, fetch_ann, quote_literal, register_partition_index, unregister_partition_index,
+)
+from services.text_search import (
+    TEXT_SEARCH_SOURCES, TSV_COLUMN, HybridQuery, build_lexemes, build_lexemes_batch,
+    ddl_statements, decode_tsvector_binary, encode_tsvector_binary, fetch_hybrid,
+    refresh_statement, source_text, text_search_config, tsv_mode, tsvector_literal,
+)
 from config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -69,6 +85,19 @@ class Paragraph(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+class ParagraphQValue(Base):
+    """强化学习Q值表 - 段落在各查询簇下的Q值与访问次数(见迁移 007)"""
+    __tablename__ = "rl_q_values"
+    __table_args__ = (
+        Index("idx_rl_q_values_cluster", "query_cluster", "paragraph_id"),
+    )
+
+    paragraph_id = Column(Integer, ForeignKey("paragraphs.id", ondelete="CASCADE"), primary_key=True)
+    query_cluster = Column(String(64), primary_key=True)
+    q_value = Column(Float, nullable=False, default=0.5)
+    visit_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
 class Formula(Base):
     """剧情公式/拼接规则库"""
     __tablename__ = "formulas"
@@ -143,6 +172,78 @@ class Project(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+# COPY 写入段落时使用的列顺序(id 预先从序列分配,保证返回顺序与输入一致)
+PARAGRAPH_COPY_COLUMNS = (
+    "id", "book_id", "chapter_index", "section_index", "paragraph_index",
+    "content", "meta", "embedding", "embedding_model", "is_active",
+)
+# 可选列: keywords 来自迁移 002,bias_features 来自迁移 008
+PARAGRAPH_OPTIONAL_COLUMNS = ("keywords", "sequence_weight", "bias_features")
+
+
+def _optional_column_value(p: Dict[str, Any], column: str):
+    """可选列的写入值;未提供(或空列表)时为 None"""
+    value = p.get(column)
+    if value is None:
+        return None
+    if column == "sequence_weight":
+        return float(value)
+    if column == "bias_features":
+        return [float(v) for v in value] or None
+    return list(value) or None
+
+
+class PoolMetrics:
+    """连接池指标: 借出/归还/新建连接计数与借出等待时间,用于连接池容量规划"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.wait_count += 1
+        self.total_wait_ms += wait_ms
+        if wait_ms > self.max_wait_ms:
+            self.max_wait_ms = wait_ms
+
+    def attach(self, engine):
+        """在同步引擎上注册连接池事件"""
+        def _on_connect(dbapi_conn, conn_record):
+            self.connects += 1
+
+        def _on_checkout(dbapi_conn, conn_record, conn_proxy):
+            self.checkouts += 1
+
+        def _on_checkin(dbapi_conn, conn_record):
+            self.checkins += 1
+
+        def _on_invalidate(dbapi_conn, conn_record, exception):
+            self.invalidations += 1
+
+        event.listen(engine, "connect", _on_connect)
+        event.listen(engine, "checkout", _on_checkout)
+        event.listen(engine, "checkin", _on_checkin)
+        event.listen(engine, "invalidate", _on_invalidate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "wait_count": self.wait_count,
+            "avg_wait_ms": round(self.total_wait_ms / self.wait_count, 3) if self.wait_count else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
 class DatabaseService:
     """数据库服务类"""
     
@@ -150,6 +251,10 @@ class DatabaseService:
         self.engine = None
         self.session_factory = None
         self._initialized = False
+        self.pool_metrics = PoolMetrics()
+        self._vector_schema: Optional[str] = None
+        self._vector_codecs: Optional[List[Tuple[str, Any, Any]]] = None
+        self._background_tasks: set = set()
         
     async def initialize(self):
         """初始化数据库连接"""
@@ -164,18 +269,35 @@ class DatabaseService:
             if database_url.startswith("postgresql://"):
                 database_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
             
+            db_settings = settings.database
+            connect_args = {
+                # 预处理语句缓存: 向量参数统一以文本 + CAST(... AS vector) 传入,
+                # 计划与 pgvector 的类型 OID 解耦,可安全缓存;DDL 完成后会重置连接池使旧缓存失效
+                "prepared_statement_cache_size": db_settings.statement_cache_size,
+                "server_settings": {
+                    "jit": "off",  # 禁用JIT编译
+                    "application_name": "story_ai_backend"
+                }
+            }
+            if db_settings.pooled:
+                pool_kwargs = {
+                    "poolclass": AsyncAdaptedQueuePool,
+                    "pool_size": db_settings.pool_size,
+                    "max_overflow": db_settings.max_overflow,
+                    "pool_timeout": db_settings.pool_timeout,
+                    "pool_recycle": db_settings.pool_recycle,
+                    "pool_pre_ping": db_settings.pool_pre_ping,
+                }
+            else:
+                pool_kwargs = {"poolclass": NullPool}
+
             self.engine = create_async_engine(
                 database_url,
-                poolclass=NullPool,  # 使用NullPool避免连接池相关问题
                 echo=settings.debug,
-                connect_args={
-                    "prepared_statement_cache_size": 0,  # 禁用预处理语句缓存
-                    "server_settings": {
-                        "jit": "off",  # 禁用JIT编译
-                        "application_name": "story_ai_backend"
-                    }
-                }
+                connect_args=connect_args,
+                **pool_kwargs
             )
+            self.pool_metrics.attach(self.engine.sync_engine)
             
             # 创建会话工厂
             self.session_factory = async_sessionmaker(
@@ -200,8 +322,18 @@ class DatabaseService:
             # 创建向量索引
             await self._create_vector_indexes()
 
-            # 创建/修复文本搜索索引(确保使用截断以避免 tsvector 1MB 限制)
+            # 全文检索列 search_tsv 与 GIN 索引
             await self._ensure_text_indexes()
+
+            # DDL 可能改变列类型/扩展 OID,丢弃建表期间的连接,避免预处理语句缓存失效
+            await self.engine.dispose()
+            
+            # 大书的 book_id 部分索引(CONCURRENTLY 构建可能耗时很久,放后台不阻塞启动;建好并登记前检索走全局索引).
+            # 必须在上面所有 paragraphs DDL 之后启动: ALTER/DROP TRIGGER 需要的 ACCESS EXCLUSIVE 锁
+            # 与构建持有的 SHARE UPDATE EXCLUSIVE 锁冲突,会阻塞启动甚至死锁
+            task = asyncio.create_task(self.ensure_book_vector_indexes())
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
             
             self._initialized = True
             logger.info("Database service initialized successfully")
@@ -232,7 +364,8 @@ class DatabaseService:
             raise
 
     async def _ensure_vector_columns(self):
-        """确保 embedding 列为 pgvector 类型.如果当前为数组类型,执行一次性迁移."""
+        """确保 embedding 列为 pgvector 类型.如果当前为数组类型,执行一次性迁移.
+        已按 vector_storage 转换为 halfvec 的列保持不变."""
         try:
             async with self.engine.begin() as conn:
                 # documents.embedding
@@ -240,7 +373,7 @@ class DatabaseService:
                     "SELECT udt_name FROM information_schema.columns WHERE table_name = 'documents' AND column_name = 'embedding'"
                 ))
                 row = result.fetchone()
-                if not row or row[0] != 'vector':
+                if not row or row[0] not in ('vector', 'halfvec'):
                     logger.info("Migrating documents.embedding to vector(1536)")
                     await conn.execute(sa.text(
                         "ALTER TABLE documents ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector"
@@ -251,7 +384,7 @@ class DatabaseService:
                     "SELECT udt_name FROM information_schema.columns WHERE table_name = 'paragraphs' AND column_name = 'embedding'"
                 ))
                 row = result.fetchone()
-                if not row or row[0] != 'vector':
+                if not row or row[0] not in ('vector', 'halfvec'):
                     logger.info("Migrating paragraphs.embedding to vector(1536)")
                     await conn.execute(sa.text(
                         "ALTER TABLE paragraphs ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector"
@@ -262,7 +395,7 @@ class DatabaseService:
                     "SELECT udt_name FROM information_schema.columns WHERE table_name = 'formulas' AND column_name = 'embedding'"
                 ))
                 row = result.fetchone()
-                if row and row[0] != 'vector':
+                if row and row[0] not in ('vector', 'halfvec'):
                     logger.info("Migrating formulas.embedding to vector(1536)")
                     await conn.execute(sa.text(
                         "ALTER TABLE formulas ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector"
@@ -282,9 +415,9 @@ class DatabaseService:
                 
                 if not result.fetchone():
                     # 创建HNSW索引(推荐用于高维向量)
-                    await conn.execute(sa.text("""
+                    await conn.execute(sa.text(f"""
                         CREATE INDEX IF NOT EXISTS idx_documents_embedding_hnsw 
-                        ON documents USING hnsw (embedding vector_cosine_ops)
+                        ON documents USING hnsw (embedding {storage_mode("documents").opclass})
                         WITH (m = 16, ef_construction = 64)
                     """))
                     logger.info("HNSW vector index created")
@@ -301,9 +434,9 @@ class DatabaseService:
                     WHERE tablename = 'paragraphs' AND indexname = 'idx_paragraphs_embedding_hnsw'
                 """))
                 if not result_p.fetchone():
-                    await conn.execute(sa.text("""
+                    await conn.execute(sa.text(f"""
                         CREATE INDEX IF NOT EXISTS idx_paragraphs_embedding_hnsw 
-                        ON paragraphs USING hnsw (embedding vector_cosine_ops)
+                        ON paragraphs USING hnsw (embedding {storage_mode("paragraphs").opclass})
                         WITH (m = 16, ef_construction = 64)
                     """))
                     logger.info("HNSW vector index for paragraphs created")
@@ -312,70 +445,199 @@ class DatabaseService:
                         {"m": 16, "ef_construction": 64}, 1536, "cosine"
                     )
                 
+                
         except Exception as e:
             logger.warning(f"Failed to create vector indexes: {str(e)}")
             # 尝试创建IVFFlat索引作为备选
             try:
                 async with self.engine.begin() as conn:
-                    await conn.execute(sa.text("""
+                    await conn.execute(sa.text(f"""
                         CREATE INDEX IF NOT EXISTS idx_documents_embedding_ivfflat 
-                        ON documents USING ivfflat (embedding vector_cosine_ops)
+                        ON documents USING ivfflat (embedding {storage_mode("documents").opclass})
                         WITH (lists = 100)
                     """))
                     logger.info("IVFFlat vector index created as fallback")
                     # paragraphs 备选索引
-                    await conn.execute(sa.text("""
+                    await conn.execute(sa.text(f"""
                         CREATE INDEX IF NOT EXISTS idx_paragraphs_embedding_ivfflat 
-                        ON paragraphs USING ivfflat (embedding vector_cosine_ops)
+                        ON paragraphs USING ivfflat (embedding {storage_mode("paragraphs").opclass})
                         WITH (lists = 100)
                     """))
                     logger.info("IVFFlat vector index for paragraphs created as fallback")
             except Exception as e2:
                 logger.error(f"Failed to create fallback index: {str(e2)}")
 
+    @staticmethod
+    def _book_index_name(book_id: str) -> str:
+        # 标识符上限 63 字节,book_id 取摘要
+        return "idx_paragraphs_embedding_hnsw_b_" + hashlib.blake2b(book_id.encode("utf-8"), digest_size=8).hexdigest()
+
+    async def ensure_book_vector_indexes(self, book_id: Optional[str] = None) -> List[str]:
+        """为段落数达到阈值的书创建 book_id 部分 HNSW 索引,并登记到 vector_indexes
+        
+        几乎所有段落检索都带 book_id 过滤;全局 HNSW 先取近邻再过滤,书多时召回差且浪费.
+        部分索引只含该书的行,检索时由 ann_query 路由(内联 book_id 字面量以匹配索引谓词).
+        未达阈值的小书仍走全局索引.book_id 为空时检查所有书,返回新建的 book_id 列表.
+        """
+        db = settings.database
+        min_rows = db.paragraph_book_index_min_rows
+        if min_rows <= 0:
+            return []
+        created: List[str] = []
+        try:
+            async with self.engine.connect() as conn:
+                # CREATE INDEX CONCURRENTLY 不能在事务块中执行,不阻塞入库写入
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                sql = """
+                    SELECT book_id, count(*) AS n FROM paragraphs
+                    WHERE embedding IS NOT NULL AND book_id IS NOT NULL
+                """
+                params: Dict[str, Any] = {"min_rows": min_rows}
+                if book_id is not None:
+                    sql += " AND book_id = :book_id"
+                    params["book_id"] = book_id
+                sql += " GROUP BY book_id HAVING count(*) >= :min_rows"
+                candidates = [row[0] for row in (await conn.execute(sa.text(sql), params)).fetchall()]
+                
+                # 只认有效索引;中断的 CONCURRENTLY 会留下 INVALID 索引,下面先删后建
+                existing = {
+                    row[0] for row in (await conn.execute(sa.text("""
+                        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                        WHERE i.indrelid = 'paragraphs'::regclass AND i.indisvalid
+                    """))).fetchall()
+                }
+                for bid in candidates:
+                    name = self._book_index_name(bid)
+                    if name in existing:
+                        register_partition_index("paragraphs", "book_id", bid)
+                        continue
+                    # 多 worker 同时启动时只由一个进程构建;否则后完成的 worker 会删掉别人刚建好的索引.
+                    # 没拿到锁说明另一进程正在构建,登记由它写入 vector_indexes,本进程按 TTL 刷新后可见
+                    got_lock = (await conn.execute(
+                        sa.text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": name}
+                    )).scalar()
+                    if not got_lock:
+                        continue
+                    try:
+                        # 拿到锁后重新检查: 等锁期间其他进程可能已建好
+                        valid = (await conn.execute(sa.text("""
+                            SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                            WHERE c.relname = :name
+                        """), {"name": name})).scalar()
+                        if valid:
+                            register_partition_index("paragraphs", "book_id", bid)
+                            continue
+                        await conn.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                        await conn.execute(sa.text(f"""
+                            CREATE INDEX CONCURRENTLY {name}
+                            ON paragraphs USING hnsw (embedding {storage_mode("paragraphs").opclass})
+                            WITH (m = {int(db.hnsw_m)}, ef_construction = {int(db.hnsw_ef_construction)})
+                            WHERE book_id = {quote_literal(bid)}
+                        """))
+                        await self._record_vector_index(
+                            conn, "paragraphs", "embedding", "hnsw",
+                            {"m": db.hnsw_m, "ef_construction": db.hnsw_ef_construction, "index_name": name,
+                             "partition": {"column": "book_id", "value": bid}},
+                            1536, "cosine"
+                        )
+                        register_partition_index("paragraphs", "book_id", bid)
+                        created.append(bid)
+                        logger.info(f"Partial HNSW index {name} created for book {bid}")
+                    finally:
+                        await conn.execute(sa.text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": name})
+        except Exception as e:
+            logger.warning(f"Failed to create per-book vector indexes: {str(e)}")
+        return created
+
+    def schedule_book_vector_index(self, book_id: str):
+        """入库完成后在后台为该书补建部分索引(不阻塞入库流的结束事件)"""
+        if settings.database.paragraph_book_index_min_rows <= 0 or not book_id:
+            return
+        task = asyncio.create_task(self.ensure_book_vector_indexes(book_id))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def drop_book_vector_index(self, book_id: str):
+        """删除书的部分索引并注销登记"""
+        name = self._book_index_name(book_id)
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            await conn.execute(sa.text("""
+                UPDATE vector_indexes SET is_active = false
+                WHERE table_name = 'paragraphs' AND index_params->>'index_name' = :name
+            """), {"name": name})
+        unregister_partition_index("paragraphs", "book_id", book_id)
+
     async def _ensure_text_indexes(self):
-        """确保文本搜索索引安全:对 content 采用截断,避免 ProgramLimitExceededError.
-        规则:documents_content_idx 使用 to_tsvector('english', left(content, 300000))
-        若发现旧索引未使用截断表达式,则删除并重建.
+        """全文检索列与索引(见 services.text_search)
+        
+        documents / paragraphs 建 search_tsv 列 + GIN 索引,配置了 PG 文本检索配置时另建维护触发器.
+        列注释记录当前分词方式,方式变化时清空重算;存量行由后台任务分批回填.
+        旧的 documents_content_idx(to_tsvector('english', ...) 表达式索引)已无查询使用,删除.
         """
         try:
+            mode = tsv_mode()
             async with self.engine.begin() as conn:
-                # 查询现有索引定义
-                res = await conn.execute(sa.text(
-                    """
-                    SELECT indexname, indexdef
-                    FROM pg_indexes
-                    WHERE tablename = 'documents' AND indexname = 'documents_content_idx'
-                    """
-                ))
-                row = res.fetchone()
-                desired = "to_tsvector('english', left(content, 300000))"
-                if row:
-                    indexdef = row.indexdef if hasattr(row, 'indexdef') else row[1]
-                    if desired not in indexdef:
-                        logger.warning("Found legacy documents_content_idx without truncation; rebuilding...")
-                        await conn.execute(sa.text("DROP INDEX IF EXISTS documents_content_idx"))
-                        await conn.execute(sa.text(
-                            """
-                            CREATE INDEX documents_content_idx 
-                            ON documents USING gin(to_tsvector('english', left(content, 300000)))
-                            """
-                        ))
-                        logger.info("documents_content_idx rebuilt with truncation")
-                    else:
-                        logger.info("documents_content_idx is up-to-date")
-                else:
-                    # 不存在则创建
-                    await conn.execute(sa.text(
+                await conn.execute(sa.text("DROP INDEX IF EXISTS documents_content_idx"))
+                for table in TEXT_SEARCH_SOURCES:
+                    for sql in ddl_statements(table):
+                        await conn.execute(sa.text(sql))
+                    res = await conn.execute(sa.text(
                         """
-                        CREATE INDEX IF NOT EXISTS documents_content_idx 
-                        ON documents USING gin(to_tsvector('english', left(content, 300000)))
+                        SELECT col_description(attrelid, attnum) FROM pg_attribute
+                        WHERE attrelid = CAST(:table AS regclass) AND attname = :column
                         """
-                    ))
-                    logger.info("documents_content_idx created (with truncation)")
+                    ), {"table": table, "column": TSV_COLUMN})
+                    if res.scalar() != mode:
+                        logger.info(f"{table}.{TSV_COLUMN} tokenizer changed to {mode}; recomputing")
+                        await conn.execute(sa.text(f"UPDATE {table} SET {TSV_COLUMN} = NULL WHERE {TSV_COLUMN} IS NOT NULL"))
+                        await conn.execute(sa.text(f"COMMENT ON COLUMN {table}.{TSV_COLUMN} IS '{mode}'"))
+            task = asyncio.create_task(self.backfill_search_tsv())
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
         except Exception as e:
             logger.warning(f"Failed to ensure text indexes: {str(e)}")
-    
+
+    async def backfill_search_tsv(self, batch_size: int = 500) -> Dict[str, int]:
+        """分批计算 search_tsv 为空的行(入库时已写入的行不会重复计算)
+        
+        配置模式由数据库按配置计算;jieba 模式在进程池中分词后写回.
+        """
+        config = text_search_config()
+        filled: Dict[str, int] = {}
+        try:
+            pg = await get_pg_pool()
+            for table, columns in TEXT_SEARCH_SOURCES.items():
+                filled[table] = 0
+                while True:
+                    if config is not None:
+                        status = await pg.execute(refresh_statement(table), batch_size)
+                        count = int(status.rsplit(" ", 1)[-1])
+                    else:
+                        rows = await pg.fetch_all(
+                            f"SELECT id, {', '.join(columns)} FROM {table} "
+                            f"WHERE {TSV_COLUMN} IS NULL ORDER BY id LIMIT $1",
+                            batch_size,
+                        )
+                        count = len(rows)
+                        if rows:
+                            from services.cpu_executor import map_cpu
+                            lexemes = await map_cpu(build_lexemes_batch, [source_text(table, r) for r in rows])
+                            await pg.execute(
+                                f"UPDATE {table} AS t SET {TSV_COLUMN} = v.tsv::tsvector "
+                                f"FROM unnest($1::int[], $2::text[]) AS v(id, tsv) WHERE t.id = v.id",
+                                [r["id"] for r in rows], [tsvector_literal(lx) for lx in lexemes],
+                            )
+                    filled[table] += count
+                    if count < batch_size:
+                        break
+                if filled[table]:
+                    logger.info(f"Backfilled {TSV_COLUMN} for {filled[table]} {table} rows")
+        except Exception as e:
+            logger.warning(f"Failed to backfill {TSV_COLUMN}: {str(e)}")
+        return filled
+
     async def _record_vector_index(self, conn, table_name: str, column_name: str, 
                                  index_type: str, params: Dict, dimension: int, metric: str):
         """记录向量索引信息"""
@@ -401,6 +663,7 @@ class DatabaseService:
         # 创建会话
         session = self.session_factory()
         try:
+            await self._checkout(session)
             yield session
             await session.commit()
         except Exception as e:
@@ -410,6 +673,37 @@ class DatabaseService:
         finally:
             await session.close()
     
+    async def _checkout(self, session):
+        """显式借出连接并记录等待耗时(连接池饱和时体现为等待时间上升)"""
+        start = time.perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeoutError:
+            self.pool_metrics.timeouts += 1
+            raise
+        finally:
+            self.pool_metrics.record_wait((time.perf_counter() - start) * 1000)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取连接池状态与借出指标"""
+        db_settings = settings.database
+        stats: Dict[str, Any] = {
+            "pooled": db_settings.pooled,
+            "pool_size": db_settings.pool_size if db_settings.pooled else 0,
+            "max_overflow": db_settings.max_overflow if db_settings.pooled else 0,
+            "statement_cache_size": db_settings.statement_cache_size,
+            **self.pool_metrics.to_dict(),
+        }
+        pool = self.engine.pool if self.engine else None
+        if pool is not None and hasattr(pool, "checkedout"):
+            stats.update({
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "status": pool.status(),
+            })
+        return stats
+
     async def insert_document(self, title: str, content: str, embedding: Optional[List[float]] = None,
                             content_type: str = "text", source: str = None, 
                             doc_metadata: Dict = None) -> int:
@@ -442,77 +736,202 @@ class DatabaseService:
             session.add(doc)
             await session.commit()
             await session.refresh(doc)
-            # 若提供 embedding,使用 CAST 文本安全更新 vector 列
+            # 若提供 embedding,使用 CAST 文本安全更新 vector 列;jieba 模式同时写入全文检索列
+            assignments, params = [], {"doc_id": doc.id}
             if embedding:
-                embedding_str = '[' + ','.join(map(str, embedding)) + ']'
+                assignments.append("embedding = CAST(:embedding AS vector)")
+                params["embedding"] = '[' + ','.join(map(str, embedding)) + ']'
+            if text_search_config() is None:
+                from services.cpu_executor import run_cpu
+                lexemes = await run_cpu(build_lexemes, source_text("documents", {"title": title, "content": content}))
+                assignments.append(f"{TSV_COLUMN} = CAST(:tsv AS tsvector)")
+                params["tsv"] = tsvector_literal(lexemes)
+            if assignments:
                 await session.execute(
-                    sa.text("UPDATE documents SET embedding = CAST(:embedding AS vector) WHERE id = :doc_id"),
-                    {"embedding": embedding_str, "doc_id": doc.id}
+                    sa.text(f"UPDATE documents SET {', '.join(assignments)} WHERE id = :doc_id"), params
                 )
                 await session.commit()
             return doc.id
 
-    async def insert_paragraphs(self, paragraphs: List[Dict[str, Any]]) -> List[int]:
-        """Batch insert paragraphs with optimized bulk operations
-        Uses SQLAlchemy bulk_insert_mappings for better performance
+    async def insert_paragraphs(self, paragraphs: List[Dict[str, Any]], bulk: bool = True) -> List[int]:
+        """批量插入段落
         
         Args:
             paragraphs: List of paragraph dicts with keys:
                 - content (required)
                 - book_id, chapter_index, section_index, paragraph_index (optional)
                 - meta, embedding, embedding_model (optional)
+                - keywords (optional, 写入 keywords 列并增量更新关键词倒排索引)
+                - sequence_weight, bias_features (optional, 神经参数,见 paragraph_enhancer)
+            bulk: True 走 COPY 批量写入(单次往返,向量二进制编码);
+                  False 走逐行 INSERT + CAST 更新的兼容路径
         
         Returns:
-            List of inserted paragraph IDs
+            List of inserted paragraph IDs, 与输入顺序一致
         """
         if not paragraphs:
             return []
+        # jieba 模式: 全文检索词位在进程池中分词,随段落一并写入(配置模式由触发器计算)
+        lexemes: Optional[List[Any]] = None
+        if text_search_config() is None:
+            from services.cpu_executor import map_cpu
+            lexemes = await map_cpu(build_lexemes_batch, [source_text("paragraphs", p) for p in paragraphs])
+        if bulk:
+            ids = await self._insert_paragraphs_copy(paragraphs, lexemes)
+        else:
+            ids = await self._insert_paragraphs_rowwise(paragraphs, lexemes)
+        self._update_keyword_index(paragraphs, ids)
+        return ids
+
+    @staticmethod
+    def _update_keyword_index(paragraphs: List[Dict[str, Any]], ids: List[int]):
+        """新段落入库后增量更新已加载的关键词倒排索引"""
+        from services.keyword_index import get_keyword_index_registry
+
+        by_book: Dict[Optional[str], List[Tuple[int, List[str]]]] = {}
+        for pid, p in zip(ids, paragraphs):
+            if p.get("keywords"):
+                by_book.setdefault(p.get("book_id"), []).append((pid, p["keywords"]))
+        registry = get_keyword_index_registry()
+        for book_id, rows in by_book.items():
+            registry.add_paragraphs(book_id, rows)
+
+    @staticmethod
+    def _paragraph_mapping(p: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "book_id": p.get("book_id"),
+            "chapter_index": p.get("chapter_index"),
+            "section_index": p.get("section_index"),
+            "paragraph_index": p.get("paragraph_index"),
+            "content": p["content"],
+            "meta": p.get("meta", {}),
+            "embedding_model": p.get("embedding_model", "text-embedding-3-small"),
+            "is_active": True,
+        }
+
+    async def _get_vector_schema(self, session) -> str:
+        """vector 类型所在 schema(扩展可能未装在 public 下)"""
+        if self._vector_schema is None:
+            result = await session.execute(
+                sa.text("SELECT typnamespace::regnamespace::text FROM pg_type WHERE typname = 'vector' LIMIT 1")
+            )
+            self._vector_schema = result.scalar() or "public"
+        return self._vector_schema
+
+    async def _get_vector_codecs(self, session) -> List[Tuple[str, Any, Any]]:
+        """COPY 需要的 (类型名, 编码器, 解码器);halfvec 仅在扩展提供该类型时注册(pgvector >= 0.7)"""
+        if self._vector_codecs is None:
+            schema = await self._get_vector_schema(session)
+            result = await session.execute(sa.text(
+                "SELECT 1 FROM pg_type WHERE typname = 'halfvec' AND typnamespace::regnamespace::text = :schema"
+            ), {"schema": schema})
+            codecs = [("vector", _encode_vector_binary, _decode_vector_binary)]
+            if result.scalar():
+                codecs.append(("halfvec", _encode_halfvec_binary, _decode_halfvec_binary))
+            self._vector_codecs = codecs
+        return self._vector_codecs
+
+    async def _insert_paragraphs_copy(self, paragraphs: List[Dict[str, Any]],
+                                      lexemes: Optional[List[Any]] = None) -> List[int]:
+        """COPY 批量写入
         
+        1. 从 paragraphs 序列一次性预分配 N 个 id(顺序与输入一致);
+        2. 在同一事务内通过 asyncpg copy_records_to_table 写入全部行,
+           embedding 使用 pgvector 二进制编码,不再拼接文本再 CAST.
+        vector / halfvec / tsvector 编解码器仅在 COPY 期间注册,结束后复位,
+        不影响该池化连接上其它查询对 vector 列的解码方式.
+        """
+        async with self.get_session() as session:
+            # 先经 SQLAlchemy 执行一次,使适配层开启事务,随后的 COPY 落在同一事务中
+            result = await session.execute(
+                sa.text("SELECT nextval(pg_get_serial_sequence('paragraphs', 'id')) FROM generate_series(1, :n)"),
+                {"n": len(paragraphs)}
+            )
+            ids = [int(row[0]) for row in result.fetchall()]
+            schema = await self._get_vector_schema(session)
+
+            # 可选列(迁移 002 / 008)仅在调用方提供时写入
+            optional = [
+                c for c in PARAGRAPH_OPTIONAL_COLUMNS
+                if any(_optional_column_value(p, c) is not None for p in paragraphs)
+            ]
+            columns = list(PARAGRAPH_COPY_COLUMNS) + optional + ([TSV_COLUMN] if lexemes is not None else [])
+
+            records = []
+            for pid, p in zip(ids, paragraphs):
+                m = self._paragraph_mapping(p)
+                emb = p.get("embedding")
+                record = (
+                    pid, m["book_id"], m["chapter_index"], m["section_index"], m["paragraph_index"],
+                    m["content"], json.dumps(m["meta"] or {}, ensure_ascii=False),
+                    emb if emb is not None and len(emb) > 0 else None,
+                    m["embedding_model"], m["is_active"],
+                )
+                record += tuple(_optional_column_value(p, c) for c in optional)
+                records.append(record)
+            if lexemes is not None:
+                records = [record + (lx,) for record, lx in zip(records, lexemes)]
+
+            conn = await session.connection()
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            # embedding 列可能为 vector 或 halfvec(见 services.vector_storage),两种编解码器都注册
+            codecs = [(t, schema, enc, dec) for t, enc, dec in await self._get_vector_codecs(session)]
+            if lexemes is not None:
+                codecs.append(("tsvector", "pg_catalog", encode_tsvector_binary, decode_tsvector_binary))
+            for typename, type_schema, encoder, decoder in codecs:
+                await driver.set_type_codec(
+                    typename, schema=type_schema, format="binary", encoder=encoder, decoder=decoder,
+                )
+            try:
+                await driver.copy_records_to_table(
+                    "paragraphs", records=records, columns=columns
+                )
+            finally:
+                for typename, type_schema, _, _ in codecs:
+                    await driver.reset_type_codec(typename, schema=type_schema)
+
+        return ids
+
+    async def _insert_paragraphs_rowwise(self, paragraphs: List[Dict[str, Any]],
+                                         lexemes: Optional[List[Any]] = None) -> List[int]:
+        """逐行插入(兼容路径,亦作为基准对照)"""
         ids: List[int] = []
         # {{ logic+clean fix | 来源: PG numeric type mismatch("vector" OID) }}
         # 说明: 初始插入不直接绑定 Python list 到 embedding 列,避免 asyncpg/SQLAlchemy 对未知 PG 数字类型解码失败.
         # 后续使用 CAST(:embedding AS vector) 以文本形式安全更新向量.
-        
-        # Use bulk_insert_mappings for better performance
         async with self.get_session() as session:
-            # Prepare mappings
-            mappings = []
-            pending_embeddings: List[Optional[List[float]]] = []
-            pending_models: List[str] = []
+            pending: List[Tuple[Optional[List[float]], str]] = []
             for p in paragraphs:
-                mapping = {
-                    "book_id": p.get("book_id"),
-                    "chapter_index": p.get("chapter_index"),
-                    "section_index": p.get("section_index"),
-                    "paragraph_index": p.get("paragraph_index"),
-                    "content": p["content"],
-                    "meta": p.get("meta", {}),
-                    # 初始插入统一置空,后续以 CAST 方式更新
-                    "embedding": None,
-                    "embedding_model": p.get("embedding_model", "text-embedding-3-small"),
-                    "is_active": True
-                }
-                mappings.append(mapping)
-                pending_embeddings.append(p.get("embedding"))
-                pending_models.append(p.get("embedding_model", "text-embedding-3-small"))
-            
-            # Bulk insert with return of IDs
-            # Note: bulk_insert_mappings doesn't return IDs directly, so we need a workaround
-            # We'll insert and then query back the IDs
-            for mapping in mappings:
-                para = Paragraph(**mapping)
+                mapping = self._paragraph_mapping(p)
+                para = Paragraph(embedding=None, **mapping)
                 session.add(para)
                 await session.flush()
                 ids.append(para.id)
+                pending.append((p.get("embedding"), mapping["embedding_model"]))
             
             # 使用 CAST 将 embedding 文本安全写入 vector 列,避免客户端类型编解码器问题
-            for pid, emb, model in zip(ids, pending_embeddings, pending_models):
+            for pid, (emb, model) in zip(ids, pending):
                 if emb:
                     emb_str = '[' + ','.join(map(str, emb)) + ']'
                     await session.execute(
                         sa.text("UPDATE paragraphs SET embedding = CAST(:embedding AS vector), embedding_model = :model WHERE id = :id")
                         , {"embedding": emb_str, "model": model, "id": pid}
                     )
+            for pid, p in zip(ids, paragraphs):
+                values = {c: _optional_column_value(p, c) for c in PARAGRAPH_OPTIONAL_COLUMNS}
+                values = {c: v for c, v in values.items() if v is not None}
+                if values:
+                    assignments = ", ".join(f"{c} = :{c}" for c in values)
+                    await session.execute(
+                        sa.text(f"UPDATE paragraphs SET {assignments} WHERE id = :id"),
+                        {**values, "id": pid}
+                    )
+            for pid, lx in zip(ids, lexemes or []):
+                await session.execute(
+                    sa.text(f"UPDATE paragraphs SET {TSV_COLUMN} = CAST(:tsv AS tsvector) WHERE id = :id"),
+                    {"tsv": tsvector_literal(lx), "id": pid}
+                )
             
             await session.commit()
         
@@ -531,154 +950,93 @@ class DatabaseService:
             await session.commit()
     
     async def vector_search(self, query_embedding: List[float], limit: int = 10, 
-                          threshold: float = 0.8, content_type: str = None) -> List[Dict]:
-        """向量相似度搜索"""
-        async with self.get_session() as session:
-            # 将向量转换为字符串格式以避免参数类型问题
-            embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-            
-            # 构建查询,使用参数化查询避免类型问题
-            if content_type is None:
-                query = sa.text("""
-                    SELECT id, title, content, content_type, source, doc_metadata,
-                           1 - (embedding <=> CAST(:query_embedding AS vector)) as similarity
-                    FROM documents 
-                    WHERE embedding IS NOT NULL 
-                      AND is_active = true
-                      AND 1 - (embedding <=> CAST(:query_embedding AS vector)) >= :threshold
-                    ORDER BY embedding <=> CAST(:query_embedding AS vector)
-                    LIMIT :limit
-                """)
-                
-                result = await session.execute(query, {
-                    "query_embedding": embedding_str,
-                    "limit": limit,
-                    "threshold": threshold
-                })
-            else:
-                query = sa.text("""
-                    SELECT id, title, content, content_type, source, doc_metadata,
-                           1 - (embedding <=> CAST(:query_embedding AS vector)) as similarity
-                    FROM documents 
-                    WHERE embedding IS NOT NULL 
-                      AND is_active = true
-                      AND content_type = :content_type
-                      AND 1 - (embedding <=> CAST(:query_embedding AS vector)) >= :threshold
-                    ORDER BY embedding <=> CAST(:query_embedding AS vector)
-                    LIMIT :limit
-                """)
-                
-                result = await session.execute(query, {
-                    "query_embedding": embedding_str,
-                    "limit": limit,
-                    "threshold": threshold,
-                    "content_type": content_type
-                })
-            
-            documents = []
-            for row in result:
-                doc = {
-                    "id": row.id,
-                    "title": row.title,
-                    "content": row.content,
-                    "content_type": row.content_type,
-                    "source": row.source,
-                    "doc_metadata": row.doc_metadata if row.doc_metadata else {},
-                    "similarity": float(row.similarity)
-                }
-                documents.append(doc)
-            
-            return documents
+                          threshold: float = 0.8, content_type: str = None,
+                          ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[Dict]:
+        """向量相似度搜索
+        
+        ANN 查询见 services.ann_query: 内层按距离排序并多取候选(可走 HNSW/IVFFlat 索引),
+        阈值在外层过滤;ef_search / probes 可按请求覆盖
+        """
+        query = AnnQuery(
+            "documents", ["id", "title", "content", "content_type", "source", "doc_metadata"]
+        ).where("is_active = true")
+        if content_type is not None:
+            query.where("content_type = {}", content_type)
+        
+        rows = await fetch_ann(query, query_embedding, limit, threshold,
+                               ef_search=ef_search, probes=probes)
+        return [{
+            "id": row["id"],
+            "title": row["title"],
+            "content": row["content"],
+            "content_type": row["content_type"],
+            "source": row["source"],
+            "doc_metadata": row["doc_metadata"] if row["doc_metadata"] else {},
+            "similarity": float(row["similarity"])
+        } for row in rows]
 
     async def vector_search_paragraphs(self, query_embedding: List[float], limit: int = 10, threshold: float = 0.8,
-                                       book_id: Optional[str] = None) -> List[Dict]:
-        """段落向量相似度搜索"""
-        async with self.get_session() as session:
-            embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-            if book_id is None:
-                query = sa.text("""
-                    SELECT id, content, meta,
-                           1 - (embedding <=> CAST(:query_embedding AS vector)) as similarity
-                    FROM paragraphs
-                    WHERE embedding IS NOT NULL AND is_active = true
-                      AND 1 - (embedding <=> CAST(:query_embedding AS vector)) >= :threshold
-                    ORDER BY embedding <=> CAST(:query_embedding AS vector)
-                    LIMIT :limit
-                """)
-                params = {"query_embedding": embedding_str, "limit": limit, "threshold": threshold}
-            else:
-                query = sa.text("""
-                    SELECT id, content, meta,
-                           1 - (embedding <=> CAST(:query_embedding AS vector)) as similarity
-                    FROM paragraphs
-                    WHERE embedding IS NOT NULL AND is_active = true AND book_id = :book_id
-                      AND 1 - (embedding <=> CAST(:query_embedding AS vector)) >= :threshold
-                    ORDER BY embedding <=> CAST(:query_embedding AS vector)
-                    LIMIT :limit
-                """)
-                params = {"query_embedding": embedding_str, "limit": limit, "threshold": threshold, "book_id": book_id}
-
-            result = await session.execute(query, params)
-            items: List[Dict[str, Any]] = []
-            for row in result:
-                items.append({
-                    "id": row.id,
-                    "content": row.content,
-                    "meta": row.meta or {},
-                    "similarity": float(row.similarity)
-                })
-            return items
+                                       book_id: Optional[str] = None, ef_search: Optional[int] = None,
+                                       probes: Optional[int] = None) -> List[Dict]:
+        """段落向量相似度搜索(ANN 查询构造同 vector_search,book_id 按分区索引路由)"""
+        query = AnnQuery("paragraphs", ["id", "content", "meta"]).where("is_active = true")
+        if book_id is not None:
+            # 有 book_id 部分索引的书自动路由到该索引
+            query.partition("book_id", book_id)
+        
+        rows = await fetch_ann(query, query_embedding, limit, threshold,
+                               ef_search=ef_search, probes=probes)
+        return [{
+            "id": row["id"],
+            "content": row["content"],
+            "meta": row["meta"] or {},
+            "similarity": float(row["similarity"])
+        } for row in rows]
     
     async def hybrid_search(self, query_text: str, query_embedding: List[float], 
                           limit: int = 10, text_weight: float = 0.3, 
-                          vector_weight: float = 0.7) -> List[Dict]:
-        """混合搜索(文本+向量)"""
-        async with self.get_session() as session:
-            # {{ logic+clean fix | 来源: 混合搜索参数类型错误修复 }}
-            # 修复查询参数类型不匹配问题，确保所有参数正确传递
-            # 将向量转换为字符串格式
-            embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-            
-            # 修复 SQL 语法错误：ts_rank 函数调用
-            query = sa.text("""
-                SELECT id, title, content, content_type, source, doc_metadata,
-                       ts_rank(to_tsvector('english', title || ' ' || left(content, 300000)), plainto_tsquery(:query_text)) as text_score,
-                       1 - (embedding <=> CAST(:query_embedding AS vector)) as vector_score,
-                       (:text_weight * ts_rank(to_tsvector('english', title || ' ' || left(content, 300000)), plainto_tsquery(:query_text)) + 
-                        :vector_weight * (1 - (embedding <=> CAST(:query_embedding AS vector)))) as combined_score
-                FROM documents 
-                WHERE embedding IS NOT NULL 
-                  AND is_active = true
-                  AND (to_tsvector('english', title || ' ' || left(content, 300000)) @@ plainto_tsquery(:query_text)
-                       OR 1 - (embedding <=> CAST(:query_embedding AS vector)) >= 0.5)
-                ORDER BY combined_score DESC
-                LIMIT :limit
-            """)
-            
-            result = await session.execute(query, {
-                "query_text": query_text,
-                "query_embedding": embedding_str,
-                "text_weight": text_weight,
-                "vector_weight": vector_weight,
-                "limit": limit
-            })
-            
-            documents = []
-            for row in result:
-                doc = {
-                    "id": row.id,
-                    "title": row.title,
-                    "content": row.content,
-                    "content_type": row.content_type,
-                    "source": row.source,
-                    "doc_metadata": row.doc_metadata if row.doc_metadata else {},
-                    "text_score": float(row.text_score or 0),
-                    "vector_score": float(row.vector_score or 0),
-                    "combined_score": float(row.combined_score or 0)
-                }
-                documents.append(doc)
-            
-            return documents
+                          vector_weight: float = 0.7, fusion: str = "rrf") -> List[Dict]:
+        """混合搜索(文本+向量)
+        
+        文本路走 search_tsv GIN 索引、向量路走 ANN 索引,各自排名后在同一条 SQL 内融合
+        (fusion="rrf": 加权倒数排名;"weighted": 归一化 ts_rank 与相似度加权),见 services.text_search
+        """
+        query = HybridQuery(
+            "documents", ["id", "title", "content", "content_type", "source", "doc_metadata"]
+        ).where("is_active = true")
+        rows = await fetch_hybrid(query, query_text, query_embedding, limit,
+                                  text_weight=text_weight, vector_weight=vector_weight, fusion=fusion)
+        return [{
+            "id": row["id"],
+            "title": row["title"],
+            "content": row["content"],
+            "content_type": row["content_type"],
+            "source": row["source"],
+            "doc_metadata": row["doc_metadata"] or {},
+            "text_score": float(row["text_score"] or 0),
+            "vector_score": float(row["vector_score"] or 0),
+            "combined_score": float(row["combined_score"] or 0)
+        } for row in rows]
+
+    async def hybrid_search_paragraphs(self, query_text: str, query_embedding: List[float],
+                                       limit: int = 10, book_id: Optional[str] = None,
+                                       text_weight: float = 0.3, vector_weight: float = 0.7,
+                                       fusion: str = "rrf") -> List[Dict]:
+        """段落混合搜索(同 hybrid_search,book_id 过滤对两路都生效,向量路按分区索引路由)"""
+        query = HybridQuery("paragraphs", ["id", "book_id", "content", "meta"]).where("is_active = true")
+        if book_id is not None:
+            query.partition("book_id", book_id)
+        rows = await fetch_hybrid(query, query_text, query_embedding, limit,
+                                  text_weight=text_weight, vector_weight=vector_weight, fusion=fusion)
+        return [{
+            "id": row["id"],
+            "book_id": row["book_id"],
+            "content": row["content"],
+            "meta": row["meta"] or {},
+            "text_score": float(row["text_score"] or 0),
+            "vector_score": float(row["vector_score"] or 0),
+            "combined_score": float(row["combined_score"] or 0)
+        } for row in rows]
     
     async def get_document(self, doc_id: int) -> Optional[Dict]:
         """获取单个文档"""
@@ -1078,6 +1436,26 @@ class DatabaseService:
             await self.engine.dispose()
             logger.info("Database connections closed")
     
+    async def fetch_all(self, query: str, *args) -> List[Dict[str, Any]]:
+        """经共享 asyncpg 连接池执行 $n 参数化查询,返回字典列表"""
+        pg = await get_pg_pool()
+        return await pg.fetch_all(query, *args)
+
+    async def fetch_one(self, query: str, *args) -> Optional[Dict[str, Any]]:
+        """经共享连接池查询单行,返回字典或 None"""
+        pg = await get_pg_pool()
+        return await pg.fetch_one(query, *args)
+
+    async def fetchrow(self, query: str, *args):
+        """经共享连接池查询单行,返回 asyncpg.Record"""
+        pg = await get_pg_pool()
+        return await pg.fetchrow(query, *args)
+
+    async def executemany(self, query: str, args) -> None:
+        """经共享连接池批量执行同一语句"""
+        pg = await get_pg_pool()
+        await pg.executemany(query, args)
+
     async def execute_query(self, query: str, params: list = None) -> list:
         """Execute raw SQL query and return results as list of dicts
         
@@ -1098,15 +1476,16 @@ class DatabaseService:
                 [0.8]
             )
         """
-        async with self.engine.begin() as conn:
-            result = await conn.execute(sa.text(query), params or [])
-            if result.returns_rows:
-                # Fetch all rows and convert to list of dicts
-                rows = result.fetchall()
-                return [dict(row._mapping) for row in rows]
-            else:
-                # For INSERT/UPDATE/DELETE, return affected row count
-                return [{"affected_rows": result.rowcount}]
+        pg = await get_pg_pool()
+        async with pg.acquire() as conn:
+            stmt = await conn.prepare(query)
+            rows = await stmt.fetch(*(params or []))
+            if stmt.get_attributes():
+                return [dict(row) for row in rows]
+            # For INSERT/UPDATE/DELETE without RETURNING, return affected row count
+            status = stmt.get_statusmsg() or ""
+            affected = status.rsplit(" ", 1)[-1]
+            return [{"affected_rows": int(affected) if affected.isdigit() else 0}]
 
 # 全局数据库服务实例
 _db_service = None
@@ -1136,6 +1515,3 @@ async def init_db():
         await conn.run_sync(Base.metadata.create_all)
     # Ensure column types are pgvector
     await db_service._ensure_vector_columns()
-
-# Add execute_query method to DatabaseService class above
-
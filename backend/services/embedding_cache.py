@@ -0,0 +1,216 @@
+"""Embedding cache tier - content-addressed vectors stored as raw bytes
+
+- Key: emb:{model}:{dim}:{quantization}:{sha1(text)}
+- Value: float32 bytes (default), float16 bytes, or int8 bytes with a float32 scale header
+- Batched: one MGET per lookup batch, one pipelined write per store batch
+- Falls back to a bounded in-process LRU when Redis is disabled or unreachable
+"""
+
+import hashlib
+import logging
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from config import get_settings
+from services.cache_service import slugify_model_name
+
+logger = logging.getLogger(__name__)
+
+# Known embedding dimensions; the schema stores vector(1536) so that is the default
+EMBEDDING_DIMS: Dict[str, int] = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+DEFAULT_EMBEDDING_DIM = 1536
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+
+def embedding_dim_for(model: str) -> int:
+    return EMBEDDING_DIMS.get(model, DEFAULT_EMBEDDING_DIM)
+
+
+def encode_vector(vec: Sequence[float], quantization: str = "float32") -> bytes:
+    """Serialize a vector into the compact cache representation"""
+    arr = np.asarray(vec, dtype=np.float32)
+    if quantization == "float16":
+        return arr.astype("<f2").tobytes()
+    if quantization == "int8":
+        # Symmetric per-vector quantization: x ≈ q * scale
+        scale = float(np.max(np.abs(arr))) / 127.0 if arr.size else 0.0
+        q = np.zeros(arr.shape, dtype=np.int8) if scale == 0.0 else np.clip(np.rint(arr / scale), -127, 127).astype(np.int8)
+        return struct.pack("<f", scale) + q.tobytes()
+    return arr.astype("<f4").tobytes()
+
+
+def decode_vector(data: bytes, dim: int, quantization: str = "float32") -> Optional[np.ndarray]:
+    """Inverse of encode_vector; returns None when the payload does not match dim"""
+    if quantization == "float16":
+        if len(data) != dim * 2:
+            return None
+        return np.frombuffer(data, dtype="<f2").astype(np.float32)
+    if quantization == "int8":
+        if len(data) != dim + 4:
+            return None
+        (scale,) = struct.unpack_from("<f", data)
+        return np.frombuffer(data, dtype=np.int8, offset=4).astype(np.float32) * scale
+    if len(data) != dim * 4:
+        return None
+    return np.frombuffer(data, dtype="<f4").astype(np.float32)
+
+
+class EmbeddingCache:
+    """Batched, content-addressed embedding cache"""
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        quantization: Optional[str] = None,
+        ttl: Optional[int] = None,
+        local_max_entries: Optional[int] = None,
+    ):
+        settings = get_settings()
+        self.redis_url = redis_url or settings.get_redis_url()
+        self.quantization = quantization or settings.embedding_cache_quantization
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+        self.ttl = ttl if ttl is not None else settings.embedding_cache_ttl
+        self._redis_enabled = settings.redis.enabled and REDIS_AVAILABLE
+        self._redis = None
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._local_max_entries = local_max_entries or settings.embedding_cache_local_max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.round_trips = 0
+
+    def key_for(self, text: str, model: str, dim: int) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"emb:{slugify_model_name(model)}:{dim}:{self.quantization}:{digest}"
+
+    async def _client(self):
+        if not self._redis_enabled:
+            return None
+        if self._redis is None:
+            try:
+                # Binary client: values are raw bytes, not JSON text
+                self._redis = aioredis.from_url(
+                    self.redis_url,
+                    decode_responses=False,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                    health_check_interval=30,
+                )
+            except Exception as e:
+                logger.error(f"Embedding cache Redis init failed: {e}, using in-process cache")
+                self._redis_enabled = False
+                return None
+        return self._redis
+
+    async def get_many(self, texts: Sequence[str], model: str, dim: Optional[int] = None) -> List[Optional[np.ndarray]]:
+        """Look up a batch of texts; returns vectors (or None for misses) in input order"""
+        if not texts:
+            return []
+        dim = dim or embedding_dim_for(model)
+        keys = [self.key_for(t, model, dim) for t in texts]
+
+        raw: List[Optional[bytes]] = [None] * len(keys)
+        client = await self._client()
+        if client is not None:
+            try:
+                raw = await client.mget(keys)
+                self.round_trips += 1
+            except Exception as e:
+                logger.error(f"Embedding cache MGET error: {e}, using in-process cache")
+                client = None
+        if client is None:
+            raw = [self._local_get(k) for k in keys]
+
+        results: List[Optional[np.ndarray]] = []
+        for data in raw:
+            vec = decode_vector(data, dim, self.quantization) if data else None
+            results.append(vec)
+            if vec is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return results
+
+    async def set_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]], model: str,
+                       dim: Optional[int] = None) -> None:
+        """Store a batch of vectors with one pipelined round-trip"""
+        if not texts:
+            return
+        items = []
+        for text, vec in zip(texts, vectors):
+            if vec is None or len(vec) == 0:
+                continue
+            vec_dim = dim or len(vec)
+            items.append((self.key_for(text, model, vec_dim), encode_vector(vec, self.quantization)))
+        if not items:
+            return
+
+        client = await self._client()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for key, payload in items:
+                    pipe.set(key, payload, ex=self.ttl or None)
+                await pipe.execute()
+                self.round_trips += 1
+                return
+            except Exception as e:
+                logger.error(f"Embedding cache pipeline error: {e}, using in-process cache")
+        for key, payload in items:
+            self._local_set(key, payload)
+
+    def _local_get(self, key: str) -> Optional[bytes]:
+        data = self._local.get(key)
+        if data is not None:
+            self._local.move_to_end(key)
+        return data
+
+    def _local_set(self, key: str, payload: bytes):
+        self._local[key] = payload
+        self._local.move_to_end(key)
+        while len(self._local) > self._local_max_entries:
+            self._local.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis" if self._redis_enabled else "local",
+            "quantization": self.quantization,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "round_trips": self.round_trips,
+            "local_entries": len(self._local),
+        }
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+# Global embedding cache instance (singleton)
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get embedding cache instance (singleton pattern)"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
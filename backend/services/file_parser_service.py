@@ -16,14 +16,22 @@
       "source_path": str
   }
 }
+- 流式提取(open_text_stream): 大文件按段落边界分块产出规范化文本,峰值内存与分块大小相关而与文件大小无关
 """
 
 import os
 import io
+import re
+import html
+import posixpath
+import codecs
+import asyncio
 import zipfile
 import time
 import unicodedata
-from typing import Dict, Any, Optional, List, Tuple
+import xml.etree.ElementTree as ET
+from typing import Dict, Any, Optional, List, Tuple, Iterable, Iterator, AsyncIterator
+from urllib.parse import unquote
 
 # 三件套:编码识别 + 统一解析
 try:
@@ -85,41 +93,43 @@ def _normalize_encoding_name(enc: Optional[str]) -> Optional[str]:
     return mapping.get(e, e)
 
 
-def _detect_and_decode(raw: bytes) -> tuple[str, Optional[str], Optional[float]]:
-    """返回: (文本, 编码, 置信度)
-    策略:
-    1) 首选 charset-normalizer 给出的编码,严格解码;失败则进入 2)
-    2) 备选编码列表逐一严格解码,选择 CJK 占比最高者
-    3) 若均失败,最终使用 utf-8(ignore) 回退
-    """
-    det_enc: Optional[str] = None
-    det_conf: Optional[float] = None
-    if CHARSET_NORMALIZER_AVAILABLE:
-        try:
-            results = from_bytes(raw)
-            best_match = results.best()
-            if best_match:
-                det_enc = _normalize_encoding_name(str(best_match.encoding)) or None
-                det_conf = float(best_match.coherence)
-        except Exception:
-            det_enc = None
-            det_conf = None
+# 采样检测: 大文件只在头/中/尾三个窗口上识别编码并打分,全文只按胜出编码解码一次
+SAMPLE_WINDOW_SIZE = 64 * 1024
+SAMPLE_MIN_FILE_SIZE = 4 * SAMPLE_WINDOW_SIZE
+
+# 针对中文与常见 ANSI 的备选
+FALLBACK_ENCODINGS = [
+    "utf-8-sig",
+    "utf-8",
+    "gb18030",
+    "gbk",
+    "gb2312",
+    "big5",
+    "cp950",
+    "windows-1252",
+    "latin-1",
+]
+
+
+def _charset_detect(raw: bytes) -> Tuple[Optional[str], Optional[float]]:
+    """charset-normalizer 识别结果: (编码, 置信度)"""
+    if not CHARSET_NORMALIZER_AVAILABLE:
+        return None, None
+    try:
+        best_match = from_bytes(raw).best()
+        if best_match:
+            return _normalize_encoding_name(str(best_match.encoding)) or None, float(best_match.coherence)
+    except Exception:
+        pass
+    return None, None
+
 
+def _pick_encoding(raw: bytes, det_enc: Optional[str]) -> Tuple[Optional[str], Optional[str], float]:
+    """候选编码逐一严格解码,返回 CJK 占比最高者: (文本, 编码, 得分)"""
     candidates: List[str] = []
     if det_enc:
         candidates.append(det_enc)
-    # 针对中文与常见 ANSI 的备选
-    candidates.extend([
-        "utf-8-sig",
-        "utf-8",
-        "gb18030",
-        "gbk",
-        "gb2312",
-        "big5",
-        "cp950",
-        "windows-1252",
-        "latin-1",
-    ])
+    candidates.extend(FALLBACK_ENCODINGS)
     # 去重保持顺序
     seen = set()
     candidates = [c for c in candidates if not (c in seen or seen.add(c))]
@@ -142,31 +152,86 @@ def _detect_and_decode(raw: bytes) -> tuple[str, Optional[str], Optional[float]]
                 best_score = score
         except Exception:
             continue
+    return best_text, best_enc, best_score
 
-    if best_text is not None:
-        # 置信度策略: 若与 charset-normalizer 一致则沿用其置信度;否则依据启发式给高置信度
-        conf: Optional[float] = None
-        if det_enc and det_enc == best_enc:
-            conf = det_conf
+
+def _report_detection(text: str, best_enc: str, best_score: float,
+                      det_enc: Optional[str], det_conf: Optional[float]) -> tuple[str, Optional[str], Optional[float]]:
+    # 置信度策略: 若与 charset-normalizer 一致则沿用其置信度;否则依据启发式给高置信度
+    conf: Optional[float] = None
+    if det_enc and det_enc == best_enc:
+        conf = det_conf
+    else:
+        # 中文占比较高时给出较高置信度,否则给中等置信度
+        if best_score >= 0.3:
+            conf = max(det_conf or 0.0, 0.95)
         else:
-            # 中文占比较高时给出较高置信度,否则给中等置信度
-            if best_score >= 0.3:
-                conf = max(det_conf or 0.0, 0.95)
-            else:
-                conf = max(det_conf or 0.0, 0.75)
+            conf = max(det_conf or 0.0, 0.75)
 
-        # 报告编码名: gb 系统一律报告为 GBK 以匹配测试的宽泛判断
-        report_enc = best_enc
-        if best_enc in ("gb18030", "gbk", "gb2312"):
-            report_enc = "GBK"  # 与测试断言兼容
-        elif best_enc == "windows-1252":
-            report_enc = "Windows-1252"
+    # 报告编码名: gb 系统一律报告为 GBK 以匹配测试的宽泛判断
+    report_enc = best_enc
+    if best_enc in ("gb18030", "gbk", "gb2312"):
+        report_enc = "GBK"  # 与测试断言兼容
+    elif best_enc == "windows-1252":
+        report_enc = "Windows-1252"
 
-        return best_text, report_enc, conf
+    return text, report_enc, conf
+
+
+def _sample_windows(raw: bytes, window: int = SAMPLE_WINDOW_SIZE) -> Optional[bytes]:
+    """
+    取头/中/尾三个窗口拼接为样本;窗口边界对齐到换行符之后
+    (\n 不会出现在 UTF-8/GBK/GB18030/Big5 的多字节序列中,对齐后各窗口可独立严格解码).
+    文件过小或找不到换行边界时返回 None,由调用方走全量检测.
+    """
+    n = len(raw)
+    if n < SAMPLE_MIN_FILE_SIZE:
+        return None
+
+    head_end = raw.rfind(b"\n", 0, window)
+    mid_start = raw.find(b"\n", n // 2 - window // 2)
+    tail_start = raw.find(b"\n", n - window)
+    if head_end < 0 or mid_start < 0 or tail_start < 0:
+        return None
+    mid_end = raw.rfind(b"\n", mid_start + 1, mid_start + 1 + window)
+    if mid_end < 0:
+        return None
+    return raw[:head_end + 1] + raw[mid_start + 1:mid_end + 1] + raw[tail_start + 1:]
+
+
+def _detect_and_decode_full(raw: bytes) -> tuple[str, Optional[str], Optional[float]]:
+    """全量检测: 在整个缓冲区上识别编码,并对每个候选编码全文严格解码"""
+    det_enc, det_conf = _charset_detect(raw)
+    best_text, best_enc, best_score = _pick_encoding(raw, det_enc)
+    if best_text is not None:
+        return _report_detection(best_text, best_enc, best_score, det_enc, det_conf)
 
     # 若所有候选均失败,回退为 utf-8(ignore)
     return raw.decode("utf-8", errors="ignore"), "utf-8", det_conf
 
+
+def _detect_and_decode(raw: bytes) -> tuple[str, Optional[str], Optional[float]]:
+    """返回: (文本, 编码, 置信度)
+    策略:
+    1) 大文件: 在头/中/尾采样窗口上用 charset-normalizer 识别,并按 CJK 占比为候选编码打分;
+       全文仅用胜出编码严格解码一次,成功即返回
+    2) 小文件或 1) 的全文解码失败: 全量检测(charset-normalizer 首选编码 + 备选编码逐一严格解码,
+       选择 CJK 占比最高者)
+    3) 若均失败,最终使用 utf-8(ignore) 回退
+    """
+    sample = _sample_windows(raw)
+    if sample is not None:
+        det_enc, det_conf = _charset_detect(sample)
+        _, best_enc, best_score = _pick_encoding(sample, det_enc)
+        if best_enc:
+            try:
+                text = raw.decode(best_enc, errors="strict")
+                return _report_detection(text, best_enc, best_score, det_enc, det_conf)
+            except UnicodeDecodeError:
+                # 采样窗口之外存在该编码无法解码的字节(如混合编码),退回全量检测
+                pass
+    return _detect_and_decode_full(raw)
+
 def _read_txt_md(path: str, encoding_override: Optional[str] = None) -> Dict[str, Any]:
     with open(path, "rb") as f:
         raw = f.read()
@@ -271,6 +336,46 @@ def _read_docx(path: str) -> Dict[str, Any]:
     return _read_via_textract(path)
 
 
+_EPUB_HTML_EXTENSIONS = (".xhtml", ".html", ".htm")
+
+
+def _epub_html_members(zf: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """按 OPF <spine> 阅读顺序返回 (x)html 成员;找不到 OPF/spine 时退回 zip 顺序"""
+    def local(tag: str) -> str:
+        return tag.rsplit("}", 1)[-1]
+
+    members = {info.filename: info for info in zf.infolist()}
+    fallback = [info for info in zf.infolist() if info.filename.lower().endswith(_EPUB_HTML_EXTENSIONS)]
+    try:
+        container = ET.fromstring(zf.read("META-INF/container.xml"))
+        opf_path = next(el.get("full-path") for el in container.iter() if local(el.tag) == "rootfile")
+        opf = ET.fromstring(zf.read(opf_path))
+    except (KeyError, StopIteration, ET.ParseError):
+        return fallback
+
+    base = posixpath.dirname(opf_path)
+    manifest = {
+        el.get("id"): posixpath.normpath(posixpath.join(base, unquote(el.get("href", ""))))
+        for el in opf.iter() if local(el.tag) == "item"
+    }
+    ordered = []
+    for el in opf.iter():
+        if local(el.tag) != "itemref":
+            continue
+        info = members.get(manifest.get(el.get("idref")))
+        if info is not None and info not in ordered:
+            ordered.append(info)
+    return ordered or fallback
+
+
+def _epub_html_to_text(content: str) -> str:
+    """(x)html 转纯文本: 去掉 head/style/script 整块,块级标签转空行,去标签后还原字符实体"""
+    content = re.sub(r"<(head|style|script)\b[^>]*>.*?</\1\s*>", " ", content, flags=re.IGNORECASE | re.DOTALL)
+    # 块级标签转为空行,保证章节/段落边界可被切分
+    content = re.sub(r"</(p|div|h[1-6]|section|li)\s*>", "\n\n", content, flags=re.IGNORECASE)
+    return html.unescape(re.sub(r"<[^>]+>", " ", content))
+
+
 def _read_epub(path: str) -> Dict[str, Any]:
     # 统一走 textract,保留 3 次指数退避;若失败再回退到简易 zip 解析
     result = _read_via_textract(path)
@@ -280,16 +385,9 @@ def _read_epub(path: str) -> Dict[str, Any]:
     try:
         buf = []
         with zipfile.ZipFile(path, "r") as zf:
-            for name in zf.namelist():
-                if name.endswith((".xhtml", ".html", ".htm")):
-                    data = zf.read(name)
-                    try:
-                        content = data.decode("utf-8", errors="ignore")
-                    except Exception:
-                        content = data.decode("latin-1", errors="ignore")
-                    import re
-                    text = re.sub(r"<[^>]+>", " ", content)
-                    buf.append(text)
+            for info in _epub_html_members(zf):
+                content = zf.read(info).decode("utf-8", errors="ignore")
+                buf.append(_epub_html_to_text(content))
         text = "\n".join(buf)
         return {
             "text": _normalize_text(text),
@@ -436,3 +534,189 @@ def parse_file(path: str, format: str = "text", encoding_override: Optional[str]
             pass
 
     return result
+
+
+# ==================== 流式提取 ====================
+
+STREAM_EXTENSIONS = (".txt", ".md", ".epub")
+
+
+def _report_encoding_name(enc: Optional[str]) -> Optional[str]:
+    """报告编码名(与 _report_detection 保持一致)"""
+    if enc in ("gb18030", "gbk", "gb2312"):
+        return "GBK"
+    if enc == "windows-1252":
+        return "Windows-1252"
+    return enc
+
+
+def _read_sample_windows(f, size: int, window: int = SAMPLE_WINDOW_SIZE) -> Optional[bytes]:
+    """
+    从文件对象按 seek 读取头/中/尾窗口,对齐规则与 _sample_windows 相同;
+    只读取约 4 个窗口大小的字节,不加载全文
+    """
+    f.seek(0)
+    head = f.read(window)
+    head_end = head.rfind(b"\n")
+    f.seek(max(0, size // 2 - window // 2))
+    mid = f.read(2 * window + 1)
+    f.seek(size - window)
+    tail = f.read()
+    f.seek(0)
+
+    mid_start = mid.find(b"\n")
+    tail_start = tail.find(b"\n")
+    if head_end < 0 or mid_start < 0 or tail_start < 0:
+        return None
+    mid_end = mid.rfind(b"\n", mid_start + 1, mid_start + 1 + window)
+    if mid_end < 0:
+        return None
+    return head[:head_end + 1] + mid[mid_start + 1:mid_end + 1] + tail[tail_start + 1:]
+
+
+def _detect_file_encoding(path: str) -> Tuple[Optional[str], Optional[float]]:
+    """流式场景的编码识别: 大文件只读采样窗口,小文件读全文;返回 (codec 名, 置信度)"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        sample = _read_sample_windows(f, size) if size >= SAMPLE_MIN_FILE_SIZE else None
+        if sample is None:
+            sample = f.read()
+    det_enc, det_conf = _charset_detect(sample)
+    _, best_enc, best_score = _pick_encoding(sample, det_enc)
+    if not best_enc:
+        return "utf-8", det_conf
+    _, _, conf = _report_detection("", best_enc, best_score, det_enc, det_conf)
+    return best_enc, conf
+
+
+def _paragraph_cut(buf: str, limit: int) -> int:
+    """
+    返回 buf 中可安全切出的前缀长度(0 表示继续累积):
+    优先切在最后一个空行之后;超过 limit 仍无空行时退化为最后一个换行,再不行则硬切
+    """
+    idx = buf.rfind("\n\n")
+    if idx >= 0:
+        return idx + 2
+    if len(buf) <= limit:
+        return 0
+    idx = buf.rfind("\n")
+    return idx + 1 if idx >= 0 else len(buf)
+
+
+def iter_paragraph_chunks(pieces: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """
+    把任意切分的文本片段重新切分为以段落边界结尾的规范化文本块
+    - 片段末尾的 \\r 暂存到下一片段,避免 \\r\\n 被拆开后变成两个换行
+    - 切分点在空行之后,NFKC 与控制字符清理在块内进行,不会跨块改变结果
+    """
+    buf = ""
+    carry = ""
+    for piece in pieces:
+        piece = carry + piece
+        carry = ""
+        if piece.endswith("\r"):
+            carry = "\r"
+            piece = piece[:-1]
+        buf += piece.replace("\r\n", "\n").replace("\r", "\n")
+        cut = _paragraph_cut(buf, chunk_size)
+        if cut:
+            chunk = _normalize_text(buf[:cut])
+            buf = buf[cut:]
+            if chunk.strip():
+                yield chunk
+    buf += carry.replace("\r", "\n")
+    if buf.strip():
+        yield _normalize_text(buf)
+
+
+class TextStream:
+    """
+    流式文本提取: 同步/异步迭代均产出以段落边界结尾的规范化文本块
+    - .txt/.md: 采样识别编码后按 chunk_size 字节增量解码
+      (无法回头重解码,非法字节以 U+FFFD 替换,而非像全量解析那样整体回退其它编码)
+    - .epub: 按 OPF spine 顺序逐个 (x)html 成员去标签、还原实体后产出,不经 textract
+    - 其它格式: 无法流式解析,回退 parse_file 后再分块
+    bytes_read / total_bytes 可用于进度估算
+    """
+
+    def __init__(self, path: str, encoding_override: Optional[str] = None, chunk_size: Optional[int] = None):
+        if not chunk_size:
+            from config import get_settings
+            chunk_size = get_settings().file_extraction.chunk_size
+
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        self.codec: Optional[str] = None
+        self.meta: Dict[str, Any] = {
+            "title": os.path.basename(path),
+            "author": None,
+            "language": None,
+            "toc": [],
+            "pages": None,
+            "source_path": path,
+            "streamed": self.ext in STREAM_EXTENSIONS,
+        }
+        if self.ext in (".txt", ".md"):
+            ov = _normalize_encoding_name(encoding_override) if encoding_override else None
+            if ov and ov != "auto":
+                try:
+                    codecs.lookup(ov)
+                    self.codec, conf = ov, 0.99
+                except LookupError:
+                    pass  # 未知编码名,回退自动检测
+            if not self.codec:
+                self.codec, conf = _detect_file_encoding(path)
+            self.meta["encoding"] = _report_encoding_name(self.codec)
+            self.meta["confidence"] = conf
+
+    def _iter_txt_pieces(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder(self.codec or "utf-8")(errors="replace")
+        with open(self.path, "rb") as f:
+            while True:
+                raw = f.read(self.chunk_size)
+                if not raw:
+                    break
+                self.bytes_read += len(raw)
+                yield decoder.decode(raw)
+        yield decoder.decode(b"", final=True)
+
+    def _iter_epub_pieces(self) -> Iterator[str]:
+        with zipfile.ZipFile(self.path, "r") as zf:
+            for info in _epub_html_members(zf):
+                content = zf.read(info).decode("utf-8", errors="ignore")
+                self.bytes_read += info.compress_size
+                yield _epub_html_to_text(content) + "\n\n"
+        self.bytes_read = self.total_bytes
+
+    def _iter_parsed_pieces(self) -> Iterator[str]:
+        parsed = parse_file(self.path)
+        self.meta.update(parsed.get("meta", {}))
+        self.bytes_read = self.total_bytes
+        yield parsed.get("text", "")
+
+    def __iter__(self) -> Iterator[str]:
+        if self.ext in (".txt", ".md"):
+            pieces = self._iter_txt_pieces()
+        elif self.ext == ".epub":
+            pieces = self._iter_epub_pieces()
+        else:
+            pieces = self._iter_parsed_pieces()
+        return iter_paragraph_chunks(pieces, self.chunk_size)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        # 文件读取与解码放到线程中执行,不阻塞事件循环
+        it = iter(self)
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, it, done)
+            if chunk is done:
+                return
+            yield chunk
+
+
+def open_text_stream(path: str, encoding_override: Optional[str] = None, chunk_size: Optional[int] = None) -> TextStream:
+    """流式解析入口: 返回可 async for 迭代的 TextStream(meta 在迭代前即可用)"""
+    return TextStream(path, encoding_override=encoding_override, chunk_size=chunk_size)
@@ -25,7 +25,7 @@ import time
 from dataclasses import dataclass, field
 from typing import Dict, Any, List, Optional
 
-from services.ai_service import AIService
+from services.ai_service import get_ai_service
 from services.db_service import get_db_service
 from services.json_repairer import repair_and_load
 
@@ -119,9 +119,9 @@ async def evaluate_formula(plan: FormulaPlan, supplemental_query: Optional[str]
     if not query_text:
         return []
 
-    async with AIService() as ai:
-        vecs = await ai.get_embeddings([query_text], model_id="text-embedding-3-small")
-        query_vec = vecs[0]
+    ai = await get_ai_service()
+    vecs = await ai.get_embeddings([query_text], model_id="text-embedding-3-small")
+    query_vec = vecs[0]
 
     # Import ComRAG service for independent memory table access
     from services.comrag_service import search_memory_by_vector
@@ -244,12 +244,12 @@ async def score_answer(answer: str, contexts: List[str], model_id: str = "gpt-3.
     )
     
     try:
-        async with AIService() as ai:
-            resp = await ai.run_agent(prompt, model_id=model_id, parameters={"temperature": 0.2, "max_tokens": 150})
-            obj = repair_and_load(resp)  # 使用json-repair自动修复
-            score = float(obj.get("score", 0.5))
-            # 限制0-1范围
-            return max(0.0, min(1.0, score))
+        ai = await get_ai_service()
+        resp = await ai.run_agent(prompt, model_id=model_id, parameters={"temperature": 0.2, "max_tokens": 150})
+        obj = repair_and_load(resp)  # 使用json-repair自动修复
+        score = float(obj.get("score", 0.5))
+        # 限制0-1范围
+        return max(0.0, min(1.0, score))
     except Exception:
         # 评分失败返回中间值
         return 0.5
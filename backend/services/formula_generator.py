@@ -14,6 +14,17 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 import numpy as np
 
+from services.paragraph_enhancer import expand_bias_features
+
+BIAS_FINGERPRINT_DIM = 10
+
+
+def _bias_fingerprint(para: Dict[str, Any]) -> List[float]:
+    """完整偏置向量的前10维;新数据只存紧凑参数,先展开再截取,保证新旧数据口径一致"""
+    if para.get("bias_features") is not None:
+        return expand_bias_features(para["bias_features"])[:BIAS_FINGERPRINT_DIM].tolist()
+    return list(para.get("paragraph_bias", [0.0] * 1536)[:BIAS_FINGERPRINT_DIM])
+
 
 class FormulaGenerator:
     """公式生成器主类"""
@@ -91,7 +102,9 @@ class FormulaGenerator:
                 "paragraph_id": para.get("id", f"para_{book_id}_{idx}"),
                 "chapter_index": para.get("chapter_index", 0),
                 "weight": para.get("sequence_weight", 1.0),
-                "bias": para.get("paragraph_bias", [0.0] * 1536)[:10],  # 仅存储前10维作为指纹
+                "bias": _bias_fingerprint(para),  # 仅存储完整偏置向量的前10维作为指纹
+                # 紧凑偏置参数(13维,见 paragraph_enhancer);旧数据没有该列时为 None
+                "bias_features": para.get("bias_features"),
                 "global_position": para.get("global_position", idx / len(paragraphs))
             })
         
@@ -419,7 +432,9 @@ class FormulaGenerator:
                 "paragraph_id": para.get("id", f"para_{book_id}_{idx}"),
                 "chapter_index": para.get("chapter_index", 0),
                 "weight": para.get("sequence_weight", 1.0),
-                "bias": para.get("paragraph_bias", [0.0] * 1536)[:10],  # 仅存储前10维作为指纹
+                "bias": _bias_fingerprint(para),  # 仅存储完整偏置向量的前10维作为指纹
+                # 紧凑偏置参数(13维,见 paragraph_enhancer);旧数据没有该列时为 None
+                "bias_features": para.get("bias_features"),
                 "global_position": para.get("global_position", idx / len(paragraphs))
             })
         
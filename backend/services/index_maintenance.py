@@ -0,0 +1,434 @@
+"""
+向量索引后台维护
+1. 目标索引从系统目录发现(pg_index + pg_am),覆盖 HNSW / IVFFlat,含按 book_id 的部分索引
+2. 两种方式:
+   - reindex: REINDEX INDEX CONCURRENTLY,参数不变,重建期间读写不阻塞
+   - rebuild: 以新的 m / ef_construction(IVFFlat 为 lists)CREATE INDEX CONCURRENTLY 新索引,
+     建好后 DROP INDEX CONCURRENTLY 旧索引并改名替换;任何时刻至少有一个可用索引
+3. 构建连接上按配置设置 maintenance_work_mem / max_parallel_maintenance_workers(会话级,归还连接池时 RESET);
+   HNSW 图超出 maintenance_work_mem 时构建会显著变慢,开始前估算并提示,pgvector 的 NOTICE 也转发为事件
+4. 构建期间另借一条连接轮询 pg_stat_progress_create_index 推送进度;结果参数写回 vector_indexes
+5. 最后对涉及的表执行 VACUUM (ANALYZE),VACUUM 不能在事务中执行,使用自动提交连接
+任务状态只保存在本进程内存中(同批量入库任务),同一时间只允许一个维护任务
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from config import get_settings
+from errors import DomainError
+from services.ann_query import register_partition_index
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# 允许维护的表(表名来自请求,必须白名单)
+MAINTAINABLE_TABLES = ("documents", "paragraphs", "memory_high", "memory_low", "formulas")
+PROGRESS_POLL_INTERVAL = 1.0
+MAX_FINISHED_JOBS = 20
+
+_TARGETS_SQL = """
+    SELECT c.relname AS index_name, t.relname AS table_name, am.amname AS method,
+           pg_get_indexdef(i.indexrelid) AS indexdef,
+           pg_get_expr(i.indpred, i.indrelid) AS predicate,
+           t.reltuples::bigint AS est_rows
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_am am ON am.oid = c.relam
+    WHERE am.amname IN ('hnsw', 'ivfflat') AND i.indisvalid AND t.relname = ANY($1::text[])
+    ORDER BY t.relname, c.relname
+"""
+
+_PROGRESS_SQL = """
+    SELECT phase, blocks_total, blocks_done, tuples_total, tuples_done
+    FROM pg_stat_progress_create_index WHERE pid = $1
+"""
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def index_columns(indexdef: str) -> str:
+    """从 pg_get_indexdef 输出中取 "USING method (...)" 括号内的列/操作符类(支持嵌套括号的表达式列)"""
+    m = re.search(r"\sUSING\s+\w+\s+\(", indexdef)
+    if not m:
+        raise ValueError(f"unrecognized index definition: {indexdef}")
+    depth, start = 1, m.end()
+    for pos in range(start, len(indexdef)):
+        ch = indexdef[pos]
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return indexdef[start:pos]
+    raise ValueError(f"unbalanced index definition: {indexdef}")
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector 建议: 100 万行以内 lists = rows / 1000,以上取 sqrt(rows)"""
+    rows = max(int(rows), 0)
+    if rows <= 1_000_000:
+        return max(10, rows // 1000)
+    return int(rows ** 0.5)
+
+
+def parse_mem(value: str) -> int:
+    """'512MB' / '1GB' / '65536kB' → 字节数"""
+    m = re.fullmatch(r"\s*(\d+)\s*(kB|KB|MB|GB|TB)?\s*", value or "")
+    if not m:
+        raise ValueError(f"invalid memory size: {value}")
+    unit = (m.group(2) or "kB").upper()
+    return int(m.group(1)) * {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}[unit]
+
+
+def estimate_hnsw_bytes(rows: int, dimension: int, m: int) -> int:
+    """HNSW 构建时图的内存估算: 每行向量 4*dim 字节 + 第 0 层 2m 个邻居、上层约 m 个(每个 ~8 字节)"""
+    return int(max(rows, 0) * (4 * dimension + 3 * m * 8 + 64))
+
+
+def build_index_sql(target: Dict[str, Any], index_name: str, params: Dict[str, int]) -> str:
+    """按目标索引的列/谓词与新参数生成 CREATE INDEX CONCURRENTLY 语句"""
+    method = target["method"]
+    with_clause = ", ".join(f"{k} = {int(v)}" for k, v in params.items())
+    sql = (
+        f"CREATE INDEX CONCURRENTLY {quote_ident(index_name)} "
+        f"ON {quote_ident(target['table_name'])} USING {method} ({index_columns(target['indexdef'])}) "
+        f"WITH ({with_clause})"
+    )
+    if target.get("predicate"):
+        sql += f" WHERE {target['predicate']}"
+    return sql
+
+
+def _partition_of(predicate: Optional[str]) -> Optional[Dict[str, str]]:
+    # 部分索引谓词形如 ((book_id)::text = 'doc-1'::text)
+    m = re.search(r"\(?(\w+)\)?(?:::\w+)?\s*=\s*'((?:[^']|'')*)'", predicate or "")
+    if not m:
+        return None
+    return {"column": m.group(1), "value": m.group(2).replace("''", "'")}
+
+
+class ReindexJob:
+    """单个索引维护任务: 保存事件历史,订阅者先回放历史再跟随新事件"""
+
+    def __init__(self, tables: List[str], mode: str, m: int, ef_construction: int,
+                 lists: Optional[int], vacuum: bool):
+        self.job_id = str(uuid.uuid4())
+        self.tables = tables
+        self.mode = mode
+        self.m = m
+        self.ef_construction = ef_construction
+        self.lists = lists
+        self.vacuum = vacuum
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.results: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def emit(self, event: str, **data):
+        self.events.append({"event": event, "data": {"job_id": self.job_id, **data}})
+        self._changed.set()
+
+    async def stream(self) -> AsyncGenerator[Dict[str, str], None]:
+        """SSE 事件流(data 为 JSON 字符串)"""
+        sent = 0
+        while True:
+            while sent < len(self.events):
+                evt = self.events[sent]
+                sent += 1
+                yield {"event": evt["event"], "data": json.dumps(evt["data"], ensure_ascii=False)}
+            if self.done:
+                return
+            self._changed.clear()
+            if sent == len(self.events):
+                await self._changed.wait()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "mode": self.mode,
+            "tables": self.tables,
+            "error": self.error,
+            "results": self.results,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IndexMaintenanceService:
+    """向量索引维护任务管理"""
+
+    def __init__(self):
+        self.jobs: Dict[str, ReindexJob] = {}
+
+    def running_job(self) -> Optional[ReindexJob]:
+        return next((j for j in self.jobs.values() if not j.done), None)
+
+    def get_job(self, job_id: str) -> Optional[ReindexJob]:
+        return self.jobs.get(job_id)
+
+    def start_reindex(self, tables: Optional[List[str]] = None, mode: str = "reindex",
+                      m: Optional[int] = None, ef_construction: Optional[int] = None,
+                      lists: Optional[int] = None, vacuum: bool = True) -> ReindexJob:
+        """创建并在后台启动维护任务;已有任务运行时抛出 RuntimeError"""
+        if mode not in ("reindex", "rebuild"):
+            raise ValueError(f"unknown mode: {mode}")
+        tables = list(tables or ("documents", "paragraphs"))
+        unknown = [t for t in tables if t not in MAINTAINABLE_TABLES]
+        if unknown:
+            raise ValueError(f"unsupported tables: {', '.join(unknown)}")
+        if self.running_job():
+            raise RuntimeError("an index maintenance job is already running")
+
+        db = settings.database
+        job = ReindexJob(
+            tables, mode,
+            m=m or db.hnsw_m,
+            ef_construction=ef_construction or db.hnsw_ef_construction,
+            lists=lists,
+            vacuum=vacuum,
+        )
+        self._prune()
+        self.jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def _prune(self):
+        finished = sorted((j for j in self.jobs.values() if j.done), key=lambda j: j.finished_at or 0)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS + 1)]:
+            del self.jobs[job.job_id]
+
+    async def _run(self, job: ReindexJob):
+        from services.pg_pool import get_pg_pool
+
+        job.status = "running"
+        job.emit("started", mode=job.mode, tables=job.tables)
+        try:
+            pg = await get_pg_pool()
+            targets = await pg.fetch_all(_TARGETS_SQL, job.tables)
+            job.emit("targets", indexes=[t["index_name"] for t in targets])
+            for i, target in enumerate(targets):
+                job.emit("index_started", index=target["index_name"], table=target["table_name"],
+                         position=i + 1, total=len(targets))
+                result = await self._maintain_index(pg, job, target)
+                job.results.append(result)
+                job.emit("index_done", **result)
+            if job.vacuum:
+                await self._vacuum(pg, job)
+            job.status = "completed"
+            job.emit("complete", results=job.results)
+        except Exception as e:
+            logger.error(f"Index maintenance job {job.job_id} failed: {str(e)}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+            job.emit("error", code=DomainError.MAINTENANCE_ERROR.value, message=str(e))
+        finally:
+            job.finished_at = time.time()
+
+    async def _prepare_build_connection(self, conn, job: ReindexJob, target: Dict[str, Any]):
+        """会话级构建参数;估算 HNSW 图是否放得进 maintenance_work_mem"""
+        db = settings.database
+        await conn.execute(
+            "SELECT set_config('maintenance_work_mem', $1, false), "
+            "set_config('max_parallel_maintenance_workers', $2, false)",
+            db.index_maintenance_work_mem, str(db.index_build_parallel_workers),
+        )
+        if target["method"] == "hnsw":
+            need = estimate_hnsw_bytes(target["est_rows"], db.vector_dimension, job.m)
+            have = parse_mem(db.index_maintenance_work_mem)
+            if need > have:
+                job.emit("warning", index=target["index_name"],
+                         message=f"estimated HNSW graph {need >> 20}MB exceeds maintenance_work_mem "
+                                 f"{have >> 20}MB; build will spill and run slower")
+
+        def on_notice(_conn, message):
+            job.emit("notice", index=target["index_name"], message=str(message.message))
+        conn.add_log_listener(on_notice)
+        return on_notice
+
+    async def _maintain_index(self, pg, job: ReindexJob, target: Dict[str, Any]) -> Dict[str, Any]:
+        name = target["index_name"]
+        started = time.time()
+        if job.mode == "rebuild":
+            if target["method"] == "hnsw":
+                params = {"m": job.m, "ef_construction": job.ef_construction}
+            else:
+                params = {"lists": job.lists or ivfflat_lists(target["est_rows"])}
+            temp_name = f"{name[:50]}_rebuild"
+            sql = build_index_sql(target, temp_name, params)
+        else:
+            params = _current_params(target["indexdef"])
+            temp_name = None
+            sql = f"REINDEX INDEX CONCURRENTLY {quote_ident(name)}"
+
+        async with pg.acquire() as conn:
+            listener = await self._prepare_build_connection(conn, job, target)
+            pid = await conn.fetchval("SELECT pg_backend_pid()")
+            try:
+                if temp_name:
+                    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(temp_name)}")
+                build = asyncio.create_task(conn.execute(sql))
+                await self._follow_progress(pg, job, name, pid, build)
+                if temp_name:
+                    # 新索引就绪后再删旧索引,替换期间始终有可用索引
+                    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(name)}")
+                    await conn.execute(f"ALTER INDEX {quote_ident(temp_name)} RENAME TO {quote_ident(name)}")
+            except Exception:
+                if temp_name:
+                    try:
+                        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(temp_name)}")
+                    except Exception as e:
+                        logger.warning(f"Failed to drop partial rebuild {temp_name}: {str(e)}")
+                else:
+                    await self._drop_reindex_leftovers(conn, job, target)
+                raise
+            finally:
+                conn.remove_log_listener(listener)
+            await self._record(conn, target, params)
+
+        return {
+            "index": name,
+            "table": target["table_name"],
+            "method": target["method"],
+            "params": params,
+            "seconds": round(time.time() - started, 2),
+        }
+
+    async def _drop_reindex_leftovers(self, conn, job: ReindexJob, target: Dict[str, Any]):
+        """REINDEX CONCURRENTLY 失败会留下 INVALID 的 <name>_ccnew(交换阶段失败时为 _ccold)索引,
+        它不参与查询却照常随写入维护,这里删掉;删不掉时推送事件点名残留索引"""
+        name = target["index_name"]
+        # PostgreSQL 生成名字时截断原名使总长不超过 63 字节,重名时追加数字
+        prefix = name[:63 - len("_ccnew")]
+        try:
+            rows = await conn.fetch(
+                """
+                SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = $1::regclass AND NOT i.indisvalid
+                  AND left(c.relname, $2) = $3 AND substr(c.relname, $2 + 1) ~ '^_cc(new|old)[0-9]*$'
+                """,
+                target["table_name"], len(prefix), prefix,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to look up REINDEX leftovers for {name}: {str(e)}")
+            rows = [{"relname": f"{prefix}_ccnew"}]
+        for row in rows:
+            leftover = row["relname"]
+            try:
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(leftover)}")
+                logger.info(f"Dropped invalid index {leftover} left by failed REINDEX of {name}")
+            except Exception as e:
+                logger.warning(f"Failed to drop invalid index {leftover}: {str(e)}")
+                job.emit("warning", index=name, leftover_index=leftover,
+                         message=f"REINDEX left invalid index {leftover}; drop it manually")
+
+    async def _follow_progress(self, pg, job: ReindexJob, name: str, pid: int, build: asyncio.Task):
+        """构建进行中每隔 PROGRESS_POLL_INTERVAL 秒读取一次 pg_stat_progress_create_index"""
+        last = None
+        while not build.done():
+            await asyncio.wait({build}, timeout=PROGRESS_POLL_INTERVAL)
+            if build.done():
+                break
+            try:
+                row = await pg.fetch_one(_PROGRESS_SQL, pid)
+            except Exception as e:
+                logger.debug(f"Progress poll failed: {e}")
+                continue
+            if not row or row == last:
+                continue
+            last = row
+            total = row["tuples_total"] or row["blocks_total"] or 0
+            done = row["tuples_done"] if row["tuples_total"] else row["blocks_done"]
+            job.emit("progress", index=name, phase=row["phase"],
+                     blocks_total=row["blocks_total"], blocks_done=row["blocks_done"],
+                     tuples_total=row["tuples_total"], tuples_done=row["tuples_done"],
+                     percent=round(done * 100 / total, 1) if total else None)
+        await build
+
+    async def _record(self, conn, target: Dict[str, Any], params: Dict[str, int]):
+        """新参数写回 vector_indexes: 旧记录置为失效,插入新记录(保留部分索引的分区信息)"""
+        name = target["index_name"]
+        partition = _partition_of(target.get("predicate"))
+        index_params: Dict[str, Any] = {**params, "index_name": name, "rebuilt_at": int(time.time())}
+        if partition:
+            index_params["partition"] = partition
+        column = re.search(r"\w+", index_columns(target["indexdef"])).group(0)
+        async with conn.transaction():
+            await conn.execute(
+                """
+                UPDATE vector_indexes SET is_active = false
+                WHERE table_name = $1 AND is_active = true AND (
+                    index_params->>'index_name' = $2
+                    OR ($3::boolean AND index_params->>'index_name' IS NULL AND NOT index_params ? 'partition')
+                )
+                """,
+                target["table_name"], name, partition is None,
+            )
+            await conn.execute(
+                """
+                INSERT INTO vector_indexes (table_name, column_name, index_type, index_params, dimension, distance_metric)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                """,
+                target["table_name"], column, target["method"], index_params,
+                settings.database.vector_dimension, _metric_of(target["indexdef"]),
+            )
+        if partition:
+            register_partition_index(target["table_name"], partition["column"], partition["value"])
+
+    async def _vacuum(self, pg, job: ReindexJob):
+        # VACUUM 不能在事务块中执行;asyncpg 连接不显式开启事务即为自动提交
+        async with pg.acquire() as conn:
+            for table in job.tables:
+                job.emit("vacuum_started", table=table)
+                started = time.time()
+                await conn.execute(f"VACUUM (ANALYZE) {quote_ident(table)}")
+                job.emit("vacuum_done", table=table, seconds=round(time.time() - started, 2))
+
+
+def _current_params(indexdef: str) -> Dict[str, int]:
+    m = re.search(r"\sWITH \(([^)]*)\)", indexdef)
+    if not m:
+        return {}
+    params = {}
+    for part in m.group(1).split(","):
+        key, _, value = part.partition("=")
+        value = value.strip().strip("'")
+        if value.isdigit():
+            params[key.strip()] = int(value)
+    return params
+
+
+def _metric_of(indexdef: str) -> str:
+    ops = index_columns(indexdef)
+    if "cosine_ops" in ops:
+        return "cosine"
+    if "ip_ops" in ops:
+        return "inner_product"
+    return "l2"
+
+
+_maintenance_service: Optional[IndexMaintenanceService] = None
+
+
+def get_index_maintenance_service() -> IndexMaintenanceService:
+    global _maintenance_service
+    if _maintenance_service is None:
+        _maintenance_service = IndexMaintenanceService()
+    return _maintenance_service
@@ -9,15 +9,57 @@ JSON 修复与解析工具
 - 去除末尾多余逗号
 
 提供统一接口: repair_and_load(text) -> object
+
+分级解析: 先用严格解析(orjson 可用时优先,否则标准库 json),
+仅在严格解析失败时才进入修复流程; 各级命中次数见 get_json_decode_stats()
+
+异步调用方使用 repair_and_load_async: 较长文本的修复在 CPU 进程池中执行,不阻塞事件循环
 """
 
 import json
 import re
 import logging
-from typing import Any, Optional
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# 解析计数: strict=严格解析成功, repaired=需要修复, failed=修复后仍失败
+_decode_stats: Dict[str, int] = {"strict": 0, "repaired": 0, "failed": 0}
+
+
+def _strict_loads(text: str) -> Any:
+    """严格解析(不做任何修复),失败时抛出 ValueError"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # orjson 不接受 NaN/Infinity 等标准库可解析的扩展写法
+            pass
+    return json.loads(text)
+
+
+def get_json_decode_stats() -> Dict[str, Any]:
+    """返回分级解析计数"""
+    total = sum(_decode_stats.values())
+    return {
+        **_decode_stats,
+        "total": total,
+        "repair_rate": round((_decode_stats["repaired"] + _decode_stats["failed"]) / total, 4) if total else 0.0,
+        "backend": "orjson" if ORJSON_AVAILABLE else "json",
+    }
+
+
+def reset_json_decode_stats():
+    for key in _decode_stats:
+        _decode_stats[key] = 0
+
 def _fallback_repair(text: str) -> str:
     """内置简易修复策略"""
     # 去除 BOM
@@ -52,8 +94,9 @@ def _fallback_repair(text: str) -> str:
 
 def repair_and_load(text: str, default_value: Optional[Any] = None) -> Any:
     """
-    使用 json-repair 修复损坏的JSON字符串
-    - 优先使用 json_repair.repair_json + ensure_ascii=False 保留中文
+    解析JSON字符串,必要时修复
+    - 先严格解析,合法JSON不经过修复流程
+    - 修复优先使用 json_repair.repair_json + ensure_ascii=False 保留中文
     - 回退策略使用内置简易修复
     - 支持异常捕获,确保程序稳定运行
     
@@ -67,29 +110,72 @@ def repair_and_load(text: str, default_value: Optional[Any] = None) -> Any:
     if not text or not isinstance(text, str):
         return default_value if default_value is not None else {}
     
+    try:
+        result = _strict_loads(text)
+        _decode_stats["strict"] += 1
+        return result
+    except ValueError:
+        pass
+    
+    return _repair_and_load(text, default_value)
+
+
+def _repair_and_load(text: str, default_value: Optional[Any] = None) -> Any:
+    """修复流程(严格解析失败后调用)"""
+    result, outcome = _repair(text, default_value)
+    _decode_stats[outcome] += 1
+    return result
+
+
+def _repair(text: str, default_value: Optional[Any] = None) -> Tuple[Any, str]:
+    """修复并解析,返回 (结果, "repaired" | "failed");不修改计数,可在子进程中执行"""
     try:
         from json_repair import repair_json  # type: ignore
         # 保留非拉丁字符(中文)
         repaired = repair_json(text, ensure_ascii=False)
         # repair_json 可能返回已解析对象或字符串
         if isinstance(repaired, str):
-            return json.loads(repaired)
-        return repaired
+            repaired = json.loads(repaired)
+        return repaired, "repaired"
     except ImportError:
         # json-repair 未安装,使用回退策略
         logger.warning("json-repair库未安装，使用内置修复策略")
         repaired = _fallback_repair(text)
-        return json.loads(repaired)
+        result = json.loads(repaired)
+        return result, "repaired"
     except Exception as e:
         # 修复失败,尝试回退策略
         logger.warning(f"json-repair修复失败: {e}，尝试回退策略")
         try:
             repaired = _fallback_repair(text)
-            return json.loads(repaired)
+            result = json.loads(repaired)
+            return result, "repaired"
         except Exception as e2:
             # 彻底失败,返回默认值避免崩溃
             logger.error(f"JSON修复完全失败: {e2}")
-            return default_value if default_value is not None else {}
+            return (default_value if default_value is not None else {}), "failed"
+
+
+# 超过该长度的文本在 CPU 进程池中修复;短文本进程间传输的开销大于修复本身
+OFFLOAD_MIN_CHARS = 4096
+
+
+async def repair_and_load_async(text: str, default_value: Optional[Any] = None) -> Any:
+    """repair_and_load 的异步版本: 严格解析在当前线程执行,长文本的修复交给 CPU 进程池"""
+    if not text or not isinstance(text, str) or len(text) < OFFLOAD_MIN_CHARS:
+        return repair_and_load(text, default_value)
+    try:
+        result = _strict_loads(text)
+        _decode_stats["strict"] += 1
+        return result
+    except ValueError:
+        pass
+
+    # 延迟导入: cpu_executor 依赖配置模块,本模块保持无配置依赖
+    from services.cpu_executor import run_cpu
+    result, outcome = await run_cpu(_repair, text, default_value)
+    _decode_stats[outcome] += 1
+    return result
 
 
 def safe_json_loads(text: str, default_value: Optional[Any] = None) -> Any:
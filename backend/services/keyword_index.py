@@ -0,0 +1,328 @@
+"""
+关键词倒排索引 - 常驻内存 + 磁盘持久化
+功能:
+1. 词项驻留(term -> int id),倒排表为有序 int64 数组(CSR: offsets + postings)
+2. 增量维护: 新段落写入 delta 缓冲,保存时合并回 CSR
+3. 持久化: 每本书一个目录(terms.json / offsets.npy / postings.npy / meta.json),
+   加载时 postings 以 mmap 方式打开,并按 synced_id 水位从数据库追平;
+   常驻索引每隔 KEYWORD_INDEX_REFRESH_TTL 秒再追平一次(其他 worker 的写入)
+4. 稀疏激活: 倒排表求交集,交集不足时按命中关键词数补足
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import jieba.analyse
+import numpy as np
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INDEX_FORMAT_VERSION = 1
+ALL_BOOKS_KEY = "__all__"
+# 已加载索引按 synced_id 水位从数据库追平的间隔(秒): 其他 worker 入库的段落在此时间内可见
+KEYWORD_INDEX_REFRESH_TTL = 30
+
+
+def extract_keywords(text: str, top_k: int = 10) -> List[str]:
+    """TF-IDF 关键词(过滤单字),入库与查询使用同一口径"""
+    keywords = jieba.analyse.extract_tags(text, topK=top_k, withWeight=False)
+    return [kw for kw in keywords if len(kw) > 1]
+
+
+def _index_key(book_id: Optional[str]) -> str:
+    """book_id -> 索引目录名(book_id 可能含任意字符,取哈希保证文件名安全)"""
+    if book_id is None:
+        return ALL_BOOKS_KEY
+    return "book_" + hashlib.md5(str(book_id).encode("utf-8")).hexdigest()[:16]
+
+
+class KeywordIndex:
+    """单本书(或全库)的关键词倒排索引"""
+
+    def __init__(self, book_id: Optional[str] = None):
+        self.book_id = book_id
+        self.term_ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+        # 已压实部分: 第 t 个词项的倒排表为 postings[offsets[t]:offsets[t+1]]
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.empty(0, dtype=np.int64)
+        # 增量部分: term_id -> 追加的段落ID
+        self._delta: Dict[int, List[int]] = {}
+        self.max_id = 0
+        # 已从数据库追平到的段落ID水位;本进程增量加入的段落不推进它,
+        # 以免跳过其他 worker 先写入的较小ID(重复读入的段落在倒排表中去重)
+        self.synced_id = 0
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _intern(self, term: str) -> int:
+        tid = self.term_ids.get(term)
+        if tid is None:
+            tid = len(self.terms)
+            self.term_ids[term] = tid
+            self.terms.append(term)
+        return tid
+
+    def add(self, paragraph_id: int, keywords: Optional[Iterable[str]]):
+        """增量加入一个段落"""
+        if not keywords:
+            return
+        pid = int(paragraph_id)
+        for kw in set(keywords):
+            if not kw:
+                continue
+            self._delta.setdefault(self._intern(kw), []).append(pid)
+        self.max_id = max(self.max_id, pid)
+        self.dirty = True
+
+    def add_many(self, rows: Iterable[Tuple[int, Optional[Sequence[str]]]]):
+        for pid, keywords in rows:
+            self.add(pid, keywords)
+
+    def _base_postings(self, tid: int) -> np.ndarray:
+        if tid + 1 < len(self._offsets):
+            return self._postings[self._offsets[tid]:self._offsets[tid + 1]]
+        return self._postings[:0]
+
+    def _postings_by_id(self, tid: int) -> np.ndarray:
+        base = self._base_postings(tid)
+        delta = self._delta.get(tid)
+        if not delta:
+            return base
+        return np.unique(np.concatenate([base, np.asarray(delta, dtype=np.int64)]))
+
+    def postings(self, term: str) -> np.ndarray:
+        """词项的有序倒排表"""
+        tid = self.term_ids.get(term)
+        if tid is None:
+            return np.empty(0, dtype=np.int64)
+        return self._postings_by_id(tid)
+
+    def activate(self, terms: Iterable[str], top_k: int = 20) -> List[int]:
+        """
+        稀疏激活: 返回命中查询关键词最多的段落ID
+
+        先按倒排表长度从短到长求交集(全部关键词都命中的段落);
+        交集不足 top_k 时,再按命中关键词数降序补足.
+        """
+        lists = [self.postings(t) for t in dict.fromkeys(terms)]
+        lists = [p for p in lists if p.size]
+        if not lists:
+            return []
+        lists.sort(key=len)
+
+        inter = lists[0]
+        for p in lists[1:]:
+            inter = np.intersect1d(inter, p, assume_unique=True)
+            if not inter.size:
+                break
+        if len(lists) == 1 or inter.size >= top_k:
+            return inter[:top_k].tolist()
+
+        ids, counts = np.unique(np.concatenate(lists), return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        return ids[order[:top_k]].tolist()
+
+    def compact(self):
+        """把 delta 合并回 CSR 数组"""
+        if not self._delta and len(self._offsets) == len(self.terms) + 1:
+            return
+        chunks = [self._postings_by_id(tid) for tid in range(len(self.terms))]
+        lengths = np.fromiter((c.size for c in chunks), dtype=np.int64, count=len(chunks))
+        self._offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._postings = np.concatenate(chunks).astype(np.int64) if chunks else np.empty(0, dtype=np.int64)
+        self._delta = {}
+
+    def save(self, path: Path):
+        """持久化到目录(先写临时文件再替换,meta.json 最后写入作为完成标记)"""
+        self.compact()
+        path.mkdir(parents=True, exist_ok=True)
+
+        def _replace(name: str, write):
+            # 每次保存用唯一的临时文件,多个 worker 同时刷写同一本书时互不覆盖
+            with tempfile.NamedTemporaryFile(dir=path, prefix=f".{name}.", suffix=".tmp", delete=False) as f:
+                tmp = Path(f.name)
+            try:
+                write(tmp)
+                os.replace(tmp, path / name)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+
+        def _write_npy(arr):
+            def write(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, arr)
+            return write
+
+        def _write_json(obj):
+            def write(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(obj, f, ensure_ascii=False)
+            return write
+
+        _replace("terms.json", _write_json(self.terms))
+        _replace("offsets.npy", _write_npy(self._offsets))
+        _replace("postings.npy", _write_npy(self._postings))
+        _replace("meta.json", _write_json({
+            "version": INDEX_FORMAT_VERSION,
+            "book_id": self.book_id,
+            "max_id": self.max_id,
+            "synced_id": self.synced_id,
+            "num_terms": len(self.terms),
+            "num_postings": int(self._postings.size),
+        }))
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> Optional["KeywordIndex"]:
+        """从目录加载;格式不符或文件缺失时返回 None"""
+        try:
+            with open(path / "meta.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_FORMAT_VERSION:
+                return None
+            with open(path / "terms.json", "r", encoding="utf-8") as f:
+                terms = json.load(f)
+            offsets = np.load(path / "offsets.npy")
+            postings = np.load(path / "postings.npy", mmap_mode="r" if mmap else None)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Keyword index load failed at {path}: {str(e)}")
+            return None
+        if len(offsets) != len(terms) + 1 or int(offsets[-1]) != postings.size:
+            logger.warning(f"Keyword index at {path} is inconsistent, ignoring")
+            return None
+
+        index = cls(meta.get("book_id"))
+        index.terms = terms
+        index.term_ids = {t: i for i, t in enumerate(terms)}
+        index._offsets = offsets
+        index._postings = postings
+        index.max_id = int(meta.get("max_id", 0))
+        index.synced_id = int(meta.get("synced_id", index.max_id))
+        return index
+
+
+class KeywordIndexRegistry:
+    """进程内的倒排索引注册表: 每本书构建一次,之后只做增量更新"""
+
+    def __init__(self, index_dir: Optional[Path] = None):
+        self.index_dir = Path(index_dir) if index_dir else settings.workspace_dir / "keyword_index"
+        self._indexes: Dict[str, KeywordIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._synced_at: Dict[str, float] = {}
+
+    def loaded(self, book_id: Optional[str] = None) -> Optional[KeywordIndex]:
+        return self._indexes.get(_index_key(book_id))
+
+    def _stale(self, key: str) -> bool:
+        return time.monotonic() - self._synced_at.get(key, 0.0) >= KEYWORD_INDEX_REFRESH_TTL
+
+    async def get(self, book_id: Optional[str] = None) -> KeywordIndex:
+        """获取索引: 内存(超过 TTL 时按水位追平) -> 磁盘(按水位追平) -> 全量构建"""
+        key = _index_key(book_id)
+        index = self._indexes.get(key)
+        if index is not None and not self._stale(key):
+            return index
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                if self._stale(key):
+                    # 多 worker 部署时,其他进程入库的段落只能从数据库追平
+                    try:
+                        caught_up = await self._catch_up(index, book_id)
+                        if caught_up:
+                            logger.debug(f"Keyword index refreshed: book={book_id or '*'} new_rows={caught_up}")
+                    except Exception as e:
+                        logger.warning(f"Keyword index refresh failed for book={book_id or '*'}: {str(e)}")
+                    self._synced_at[key] = time.monotonic()
+                return index
+
+            index = KeywordIndex.load(self.index_dir / key)
+            if index is None:
+                index = KeywordIndex(book_id)
+            caught_up = await self._catch_up(index, book_id)
+            if caught_up or not (self.index_dir / key / "meta.json").exists():
+                self._save(key, index)
+            logger.info(f"Keyword index ready: book={book_id or '*'} terms={len(index)} new_rows={caught_up}")
+            self._indexes[key] = index
+            self._synced_at[key] = time.monotonic()
+            return index
+
+    async def _catch_up(self, index: KeywordIndex, book_id: Optional[str]) -> int:
+        """从数据库读取 id > synced_id 的段落关键词"""
+        from services.pg_pool import get_pg_pool
+
+        pg = await get_pg_pool()
+        if book_id is not None:
+            rows = await pg.fetch_all(
+                "SELECT id, keywords FROM paragraphs "
+                "WHERE book_id = $1 AND id > $2 AND keywords IS NOT NULL ORDER BY id",
+                book_id, index.synced_id
+            )
+        else:
+            rows = await pg.fetch_all(
+                "SELECT id, keywords FROM paragraphs "
+                "WHERE id > $1 AND keywords IS NOT NULL ORDER BY id",
+                index.synced_id
+            )
+        index.add_many((r["id"], r["keywords"]) for r in rows)
+        if rows:
+            index.synced_id = max(index.synced_id, int(rows[-1]["id"]))
+        return len(rows)
+
+    def add_paragraphs(self, book_id: Optional[str], rows: Iterable[Tuple[int, Optional[Sequence[str]]]]):
+        """新段落入库后增量更新已加载的索引(本书 + 全库)"""
+        rows = [(pid, kws) for pid, kws in rows if kws]
+        if not rows:
+            return
+        targets = [self._indexes.get(ALL_BOOKS_KEY)]
+        if book_id is not None:
+            targets.append(self._indexes.get(_index_key(book_id)))
+        for index in targets:
+            if index is not None:
+                index.add_many(rows)
+
+    def _save(self, key: str, index: KeywordIndex):
+        try:
+            index.save(self.index_dir / key)
+        except OSError as e:
+            logger.warning(f"Keyword index save failed for {key}: {str(e)}")
+
+    def flush(self):
+        """保存所有有增量的索引"""
+        for key, index in self._indexes.items():
+            if index.dirty:
+                self._save(key, index)
+
+
+# 全局注册表实例
+_registry: Optional[KeywordIndexRegistry] = None
+
+
+def get_keyword_index_registry() -> KeywordIndexRegistry:
+    """获取全局倒排索引注册表"""
+    global _registry
+    if _registry is None:
+        _registry = KeywordIndexRegistry()
+    return _registry
+
+
+def flush_keyword_indexes():
+    """保存有增量的索引(应用关闭时调用)"""
+    if _registry is not None:
+        _registry.flush()
@@ -1,25 +1,105 @@
 """
 关键词RAG - 稀疏激活检索
 功能:
-1. 关键词倒排索引构建
+1. 关键词倒排索引(常驻内存,按书构建一次并增量维护,见 keyword_index)
 2. 稀疏激活(快速粗筛)
 3. 向量精排(密集计算)
 4. 混合检索策略
 """
 
-import jieba.analyse
-from typing import List, Dict, Any, Optional, Set
+import logging
+from typing import List, Dict, Any, Optional
 import numpy as np
 from services.db_service import get_db_service
+from services.keyword_index import KeywordIndex, extract_keywords, get_keyword_index_registry
+from services.paragraph_enhancer import BIAS_FEATURE_DIM, enhanced_cosine
+
+logger = logging.getLogger(__name__)
+
+
+def _as_float32_vector(value) -> np.ndarray:
+    """数据库向量(ndarray / list / '[..]' 文本)统一转为 float32 数组"""
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def batch_rerank_scores(
+    query_matrix: np.ndarray,
+    cand_matrix: np.ndarray,
+    weights: np.ndarray,
+    top_n: int,
+    candidate_mask: Optional[np.ndarray] = None
+):
+    """
+    批量余弦精排
+    
+    候选矩阵与查询矩阵各归一化一次,一次矩阵乘得到全部相似度,
+    综合得分 = 相似度 × 0.7 + (权重 / 2) × 0.3,argpartition 取 top-n 后再对这 n 个排序.
+    
+    Args:
+        query_matrix: (Q, D) 查询向量
+        cand_matrix: (N, D) 候选向量
+        weights: (N,) 序列权重
+        top_n: 每个查询保留数量
+        candidate_mask: (Q, N) 可选,False 的位置不参与该查询排序(得分记为 -inf)
+    
+    Returns:
+        (top_idx, similarities, combined),形状均为 (Q, k),k = min(top_n, N),按综合得分降序
+    """
+    queries = np.ascontiguousarray(query_matrix, dtype=np.float32)
+    cands = np.ascontiguousarray(cand_matrix, dtype=np.float32)
+    queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-10)
+    cands = cands / (np.linalg.norm(cands, axis=1, keepdims=True) + 1e-10)
+    return rank_similarities(queries @ cands.T, weights, top_n, candidate_mask)
+
+
+def rank_similarities(
+    sims: np.ndarray,
+    weights: np.ndarray,
+    top_n: int,
+    candidate_mask: Optional[np.ndarray] = None
+):
+    """
+    由 (Q, N) 相似度矩阵按综合得分取 top-n,返回值同 batch_rerank_scores
+    
+    增强向量打分(enhanced_cosine)与普通余弦共用此排序步骤.
+    """
+    combined = sims * 0.7 + (np.asarray(weights, dtype=np.float32) / 2.0) * 0.3
+    if candidate_mask is not None:
+        combined = np.where(candidate_mask, combined, -np.inf)
+    
+    n_queries, n_cands = sims.shape
+    k = min(top_n, n_cands)
+    if k <= 0:
+        empty = np.empty((n_queries, 0))
+        return empty.astype(np.int64), empty, empty
+    if k < n_cands:
+        part = np.argpartition(-combined, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(n_cands), (n_queries, 1))
+    part_scores = np.take_along_axis(combined, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    top_idx = np.take_along_axis(part, order, axis=1)
+    return (
+        top_idx,
+        np.take_along_axis(sims, top_idx, axis=1),
+        np.take_along_axis(combined, top_idx, axis=1),
+    )
 
 
 class KeywordRAG:
     """关键词检索增强生成"""
     
     def __init__(self):
-        self.inverted_index: Dict[str, Set[str]] = {}
+        self.index: Optional[KeywordIndex] = None
         self.db = None
     
+    @property
+    def inverted_index(self) -> Optional[KeywordIndex]:
+        """当前使用的倒排索引(len() 为关键词数)"""
+        return self.index
+    
     async def initialize(self):
         """初始化"""
         if not self.db:
@@ -27,34 +107,16 @@ class KeywordRAG:
     
     async def build_inverted_index(self, book_id: Optional[str] = None):
         """
-        构建关键词倒排索引
+        获取关键词倒排索引
+        
+        索引由全局注册表持有: 每本书首次使用时从磁盘加载(或全量构建),
+        之后只随新段落增量更新,重复调用几乎无开销.
         
         Args:
             book_id: 书籍ID(可选,不指定则索引所有段落)
         """
         await self.initialize()
-        
-        # 查询所有段落的关键词
-        if book_id:
-            query = "SELECT id, keywords FROM paragraphs WHERE book_id = $1 AND keywords IS NOT NULL"
-            paragraphs = await self.db.fetch_all(query, book_id)
-        else:
-            query = "SELECT id, keywords FROM paragraphs WHERE keywords IS NOT NULL"
-            paragraphs = await self.db.fetch_all(query)
-        
-        # 构建倒排索引
-        self.inverted_index = {}
-        for para in paragraphs:
-            para_id = str(para["id"])
-            keywords = para.get("keywords", [])
-            
-            if keywords:
-                for keyword in keywords:
-                    if keyword not in self.inverted_index:
-                        self.inverted_index[keyword] = set()
-                    self.inverted_index[keyword].add(para_id)
-        
-        print(f"倒排索引构建完成: {len(self.inverted_index)} 个关键词")
+        self.index = await get_keyword_index_registry().get(book_id)
     
     def extract_query_keywords(self, query: str, topK: int = 10) -> List[str]:
         """
@@ -67,15 +129,13 @@ class KeywordRAG:
         Returns:
             关键词列表
         """
-        keywords = jieba.analyse.extract_tags(query, topK=topK, withWeight=False)
-        # 过滤单字
-        return [kw for kw in keywords if len(kw) > 1]
+        return extract_keywords(query, top_k=topK)
     
     def keyword_activate(
         self,
         query: str,
         top_k: int = 20
-    ) -> List[str]:
+    ) -> List[int]:
         """
         稀疏激活:通过关键词倒排快速定位候选段落
         
@@ -84,36 +144,21 @@ class KeywordRAG:
             top_k: 返回前K个段落ID
         
         Returns:
-            激活的段落ID列表
+            激活的段落ID列表(按命中关键词数降序)
         """
+        if self.index is None:
+            return []
+        
         # 提取查询关键词
         query_keywords = self.extract_query_keywords(query, topK=10)
         
-        # 倒排检索
-        activated_pids = set()
-        keyword_scores = {}
-        
-        for kw in query_keywords:
-            if kw in self.inverted_index:
-                pids = self.inverted_index[kw]
-                activated_pids.update(pids)
-                
-                # 记录命中关键词数(用于排序)
-                for pid in pids:
-                    keyword_scores[pid] = keyword_scores.get(pid, 0) + 1
-        
-        # 按关键词命中数排序
-        sorted_pids = sorted(
-            keyword_scores.items(),
-            key=lambda x: -x[1]
-        )
-        
-        return [pid for pid, _ in sorted_pids[:top_k]]
+        # 倒排表求交集,不足时按命中关键词数补足
+        return self.index.activate(query_keywords, top_k=top_k)
     
     async def vector_rerank(
         self,
         query_embedding: List[float],
-        candidate_pids: List[str],
+        candidate_pids: List[int],
         top_n: int = 5,
         use_enhanced_embedding: bool = True
     ) -> List[Dict[str, Any]]:
@@ -129,54 +174,99 @@ class KeywordRAG:
         Returns:
             排序后的段落列表
         """
-        await self.initialize()
+        results = await self.vector_rerank_batch(
+            [query_embedding],
+            [candidate_pids],
+            top_n=top_n,
+            use_enhanced_embedding=use_enhanced_embedding
+        )
+        return results[0]
+    
+    async def vector_rerank_batch(
+        self,
+        query_embeddings: List[List[float]],
+        candidate_pids: List[List[int]],
+        top_n: int = 5,
+        use_enhanced_embedding: bool = True
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量向量精排:多个查询共用一次候选加载与一次矩阵乘
         
-        if not candidate_pids:
-            return []
+        增强向量 embedding × sequence_weight + bias 不落库,由 embedding、sequence_weight
+        与 13 维 bias_features 在查询时精确算出余弦(见 paragraph_enhancer.enhanced_cosine)
         
-        # 选择向量字段
-        vector_field = "enhanced_embedding" if use_enhanced_embedding else "embedding"
+        Args:
+            query_embeddings: 查询向量列表
+            candidate_pids: 每个查询的候选段落ID列表(与 query_embeddings 一一对应)
+            top_n: 每个查询返回前N个结果
+            use_enhanced_embedding: 是否使用增强向量
         
-        # 查询候选段落
-        placeholders = ','.join(f'${i+1}' for i in range(len(candidate_pids)))
-        query = f"""
-            SELECT id, content, {vector_field}, sequence_weight, keywords
-            FROM paragraphs 
-            WHERE id IN ({placeholders})
-            AND {vector_field} IS NOT NULL
+        Returns:
+            每个查询的排序后段落列表
         """
+        await self.initialize()
         
-        paragraphs = await self.db.fetch_all(query, *candidate_pids)
-        
-        # 计算相似度
-        query_vec = np.array(query_embedding)
-        candidates = []
+        all_pids = sorted({int(pid) for pids in candidate_pids for pid in pids})
+        if not query_embeddings or not all_pids:
+            return [[] for _ in query_embeddings]
         
-        for para in paragraphs:
-            para_vec = np.array(para[vector_field])
-            
-            # 余弦相似度
-            similarity = np.dot(query_vec, para_vec) / (
-                np.linalg.norm(query_vec) * np.linalg.norm(para_vec) + 1e-10
+        # 一次查询加载所有查询的候选并集
+        bias_field = ", bias_features" if use_enhanced_embedding else ""
+        query = f"""
+            SELECT id, content, embedding, sequence_weight, keywords{bias_field}
+            FROM paragraphs 
+            WHERE id = ANY($1::int[])
+            AND embedding IS NOT NULL
+        """
+        paragraphs = await self.db.fetch_all(query, all_pids)
+        if not paragraphs:
+            return [[] for _ in query_embeddings]
+        
+        cand_matrix = np.stack([_as_float32_vector(p["embedding"]) for p in paragraphs])
+        weights = np.array(
+            [p.get("sequence_weight") if p.get("sequence_weight") is not None else 1.0 for p in paragraphs],
+            dtype=np.float32
+        )
+        row_of = {p["id"]: i for i, p in enumerate(paragraphs)}
+        
+        # 每个查询只在自己的候选集合内排序
+        mask = np.zeros((len(query_embeddings), len(paragraphs)), dtype=bool)
+        for qi, pids in enumerate(candidate_pids):
+            rows = [row_of[int(pid)] for pid in pids if int(pid) in row_of]
+            mask[qi, rows] = True
+        
+        query_matrix = np.stack([_as_float32_vector(q) for q in query_embeddings])
+        if use_enhanced_embedding:
+            # 缺失偏置参数的段落按零偏置处理(增强向量退化为 embedding × weight)
+            features = np.stack([
+                _as_float32_vector(p["bias_features"]) if p.get("bias_features") is not None
+                else np.zeros(BIAS_FEATURE_DIM, dtype=np.float32)
+                for p in paragraphs
+            ])
+            sims = enhanced_cosine(query_matrix, cand_matrix, weights, features)
+            top_idx, similarities, combined = rank_similarities(sims, weights, top_n, candidate_mask=mask)
+        else:
+            top_idx, similarities, combined = batch_rerank_scores(
+                query_matrix, cand_matrix, weights, top_n, candidate_mask=mask
             )
-            
-            # 综合得分:相似度 × 0.7 + 权重 × 0.3
-            weight = para.get("sequence_weight", 1.0)
-            combined_score = similarity * 0.7 + (weight / 2.0) * 0.3
-            
-            candidates.append({
-                "id": para["id"],
-                "content": para["content"],
-                "similarity": float(similarity),
-                "weight": float(weight),
-                "combined_score": float(combined_score),
-                "keywords": para.get("keywords", [])
-            })
-        
-        # 按综合得分排序
-        candidates.sort(key=lambda x: -x["combined_score"])
         
-        return candidates[:top_n]
+        results: List[List[Dict[str, Any]]] = []
+        for qi in range(len(query_embeddings)):
+            ranked = []
+            for rank, ci in enumerate(top_idx[qi]):
+                if not mask[qi, ci]:
+                    break
+                para = paragraphs[ci]
+                ranked.append({
+                    "id": para["id"],
+                    "content": para["content"],
+                    "similarity": float(similarities[qi, rank]),
+                    "weight": float(weights[ci]),
+                    "combined_score": float(combined[qi, rank]),
+                    "keywords": para.get("keywords") or []
+                })
+            results.append(ranked)
+        return results
     
     async def hybrid_retrieve(
         self,
@@ -199,290 +289,61 @@ class KeywordRAG:
         Returns:
             最终结果列表
         """
-        # 确保倒排索引已构建
-        if not self.inverted_index:
-            await self.build_inverted_index()
-        
-        # 阶段1: 稀疏激活
-        activated_pids = self.keyword_activate(query, top_k=top_k_sparse)
-        
-        if not activated_pids:
-            print("稀疏激活未找到候选段落,降级为全局向量搜索")
-            # 降级策略:直接向量搜索
-            return await self._fallback_vector_search(query_embedding, top_n_dense)
-        
-        # 阶段2: 向量精排
-        results = await self.vector_rerank(
-            query_embedding,
-            activated_pids,
-            top_n=top_n_dense,
-            use_enhanced_embedding=use_enhanced
-        )
-        
-        return results
-    
-    async def _fallback_vector_search(
-        self,
-        query_embedding: List[float],
-        top_n: int = 5
-    ) -> List[Dict[str, Any]]:
-        """降级策略:全局向量搜索"""
-        # 使用pgvector的向量搜索
-        results = await self.db.vector_search_paragraphs(
-            query_embedding,
-            limit=top_n,
-            threshold=0.5
-        )
-        
-        return [{
-            "id": r["id"],
-            "content": r["content"],
-            "similarity": r.get("similarity", 0.5),
-            "weight": r.get("meta", {}).get("sequence_weight", 1.0),
-            "combined_score": r.get("similarity", 0.5),
-            "keywords": r.get("keywords", [])
-        } for r in results]
-
-
-# 便捷函数
-async def keyword_rag_search(
-    query: str,
-    query_embedding: List[float],
-    top_n: int = 5
-) -> List[Dict[str, Any]]:
-    """
-    便捷函数:关键词RAG检索
-    
-    Args:
-        query: 查询文本
-        query_embedding: 查询向量
-        top_n: 返回数量
-    
-    Returns:
-        检索结果
-    """
-    rag = KeywordRAG()
-    return await rag.hybrid_retrieve(query, query_embedding, top_n_dense=top_n)
-"""
-关键词RAG - 稀疏激活检索
-功能:
-1. 关键词倒排索引构建
-2. 稀疏激活(快速粗筛)
-3. 向量精排(密集计算)
-4. 混合检索策略
-"""
-
-import jieba.analyse
-from typing import List, Dict, Any, Optional, Set
-import numpy as np
-from services.db_service import get_db_service
-
-
-class KeywordRAG:
-    """关键词检索增强生成"""
-    
-    def __init__(self):
-        self.inverted_index: Dict[str, Set[str]] = {}
-        self.db = None
-    
-    async def initialize(self):
-        """初始化"""
-        if not self.db:
-            self.db = await get_db_service()
-    
-    async def build_inverted_index(self, book_id: Optional[str] = None):
-        """
-        构建关键词倒排索引
-        
-        Args:
-            book_id: 书籍ID(可选,不指定则索引所有段落)
-        """
-        await self.initialize()
-        
-        # 查询所有段落的关键词
-        if book_id:
-            query = "SELECT id, keywords FROM paragraphs WHERE book_id = $1 AND keywords IS NOT NULL"
-            paragraphs = await self.db.fetch_all(query, book_id)
-        else:
-            query = "SELECT id, keywords FROM paragraphs WHERE keywords IS NOT NULL"
-            paragraphs = await self.db.fetch_all(query)
-        
-        # 构建倒排索引
-        self.inverted_index = {}
-        for para in paragraphs:
-            para_id = str(para["id"])
-            keywords = para.get("keywords", [])
-            
-            if keywords:
-                for keyword in keywords:
-                    if keyword not in self.inverted_index:
-                        self.inverted_index[keyword] = set()
-                    self.inverted_index[keyword].add(para_id)
-        
-        print(f"倒排索引构建完成: {len(self.inverted_index)} 个关键词")
-    
-    def extract_query_keywords(self, query: str, topK: int = 10) -> List[str]:
-        """
-        提取查询关键词
-        
-        Args:
-            query: 查询文本
-            topK: 返回前K个关键词
-        
-        Returns:
-            关键词列表
-        """
-        keywords = jieba.analyse.extract_tags(query, topK=topK, withWeight=False)
-        # 过滤单字
-        return [kw for kw in keywords if len(kw) > 1]
-    
-    def keyword_activate(
-        self,
-        query: str,
-        top_k: int = 20
-    ) -> List[str]:
-        """
-        稀疏激活:通过关键词倒排快速定位候选段落
-        
-        Args:
-            query: 查询文本
-            top_k: 返回前K个段落ID
-        
-        Returns:
-            激活的段落ID列表
-        """
-        # 提取查询关键词
-        query_keywords = self.extract_query_keywords(query, topK=10)
-        
-        # 倒排检索
-        activated_pids = set()
-        keyword_scores = {}
-        
-        for kw in query_keywords:
-            if kw in self.inverted_index:
-                pids = self.inverted_index[kw]
-                activated_pids.update(pids)
-                
-                # 记录命中关键词数(用于排序)
-                for pid in pids:
-                    keyword_scores[pid] = keyword_scores.get(pid, 0) + 1
-        
-        # 按关键词命中数排序
-        sorted_pids = sorted(
-            keyword_scores.items(),
-            key=lambda x: -x[1]
+        results = await self.hybrid_retrieve_batch(
+            [query],
+            [query_embedding],
+            top_k_sparse=top_k_sparse,
+            top_n_dense=top_n_dense,
+            use_enhanced=use_enhanced
         )
-        
-        return [pid for pid, _ in sorted_pids[:top_k]]
-    
-    async def vector_rerank(
-        self,
-        query_embedding: List[float],
-        candidate_pids: List[str],
-        top_n: int = 5,
-        use_enhanced_embedding: bool = True
-    ) -> List[Dict[str, Any]]:
-        """
-        向量精排:在激活集合内计算精确相似度
-        
-        Args:
-            query_embedding: 查询向量
-            candidate_pids: 候选段落ID列表
-            top_n: 返回前N个结果
-            use_enhanced_embedding: 是否使用增强向量
-        
-        Returns:
-            排序后的段落列表
-        """
-        await self.initialize()
-        
-        if not candidate_pids:
-            return []
-        
-        # 选择向量字段
-        vector_field = "enhanced_embedding" if use_enhanced_embedding else "embedding"
-        
-        # 查询候选段落
-        placeholders = ','.join(f'${i+1}' for i in range(len(candidate_pids)))
-        query = f"""
-            SELECT id, content, {vector_field}, sequence_weight, keywords
-            FROM paragraphs 
-            WHERE id IN ({placeholders})
-            AND {vector_field} IS NOT NULL
-        """
-        
-        paragraphs = await self.db.fetch_all(query, *candidate_pids)
-        
-        # 计算相似度
-        query_vec = np.array(query_embedding)
-        candidates = []
-        
-        for para in paragraphs:
-            para_vec = np.array(para[vector_field])
-            
-            # 余弦相似度
-            similarity = np.dot(query_vec, para_vec) / (
-                np.linalg.norm(query_vec) * np.linalg.norm(para_vec) + 1e-10
-            )
-            
-            # 综合得分:相似度 × 0.7 + 权重 × 0.3
-            weight = para.get("sequence_weight", 1.0)
-            combined_score = similarity * 0.7 + (weight / 2.0) * 0.3
-            
-            candidates.append({
-                "id": para["id"],
-                "content": para["content"],
-                "similarity": float(similarity),
-                "weight": float(weight),
-                "combined_score": float(combined_score),
-                "keywords": para.get("keywords", [])
-            })
-        
-        # 按综合得分排序
-        candidates.sort(key=lambda x: -x["combined_score"])
-        
-        return candidates[:top_n]
+        return results[0]
     
-    async def hybrid_retrieve(
+    async def hybrid_retrieve_batch(
         self,
-        query: str,
-        query_embedding: List[float],
+        queries: List[str],
+        query_embeddings: List[List[float]],
         top_k_sparse: int = 20,
         top_n_dense: int = 5,
         use_enhanced: bool = True
-    ) -> List[Dict[str, Any]]:
+    ) -> List[List[Dict[str, Any]]]:
         """
-        混合检索:稀疏激活 + 向量精排
+        批量混合检索:各查询分别稀疏激活,再合并为一次批量向量精排
         
         Args:
-            query: 查询文本
-            query_embedding: 查询向量
+            queries: 查询文本列表
+            query_embeddings: 查询向量列表(与 queries 一一对应)
             top_k_sparse: 稀疏激活返回数量
             top_n_dense: 密集精排返回数量
             use_enhanced: 是否使用增强向量
         
         Returns:
-            最终结果列表
+            每个查询的结果列表
         """
-        # 确保倒排索引已构建
-        if not self.inverted_index:
+        # 确保倒排索引已加载
+        if self.index is None:
             await self.build_inverted_index()
         
         # 阶段1: 稀疏激活
-        activated_pids = self.keyword_activate(query, top_k=top_k_sparse)
-        
-        if not activated_pids:
-            print("稀疏激活未找到候选段落,降级为全局向量搜索")
-            # 降级策略:直接向量搜索
-            return await self._fallback_vector_search(query_embedding, top_n_dense)
-        
-        # 阶段2: 向量精排
-        results = await self.vector_rerank(
-            query_embedding,
-            activated_pids,
-            top_n=top_n_dense,
-            use_enhanced_embedding=use_enhanced
-        )
+        activated = [self.keyword_activate(q, top_k=top_k_sparse) for q in queries]
+        
+        # 阶段2: 有候选的查询合并精排
+        dense_idx = [i for i, pids in enumerate(activated) if pids]
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if dense_idx:
+            reranked = await self.vector_rerank_batch(
+                [query_embeddings[i] for i in dense_idx],
+                [activated[i] for i in dense_idx],
+                top_n=top_n_dense,
+                use_enhanced_embedding=use_enhanced
+            )
+            for i, ranked in zip(dense_idx, reranked):
+                results[i] = ranked
+        
+        for i, pids in enumerate(activated):
+            if not pids:
+                logger.info("稀疏激活未找到候选段落,降级为全局向量搜索")
+                # 降级策略:直接向量搜索
+                results[i] = await self._fallback_vector_search(query_embeddings[i], top_n_dense)
         
         return results
     
@@ -3,7 +3,7 @@
 - 段落拆分:以语义为单位进行分割(空行、标点、长度阈值综合规则)
 - 向量化:调用 AIService.get_embeddings(默认 text-embedding-3-small / 1536 维)
 - 入库:调用 DatabaseService.insert_paragraphs 存储到 pgvector 段落库
-- Redis缓存:使用混合缓存策略优化重复向量计算
+- 向量缓存:按内容哈希寻址,批量 MGET/管线写入,向量以 float32 字节存储
 """
 
 import re
@@ -11,13 +11,14 @@ import math
 import asyncio
 import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterable, AsyncIterator
 
-from services.ai_service import AIService, ModelConfig
+from services.ai_service import get_ai_service, ModelConfig
 from services.db_service import get_db_service
-from services.cache_service import get_cache
+from services.embedding_cache import get_embedding_cache, embedding_dim_for
 from config import get_settings
 from services.classify_service import classify_paragraphs
+from services.cpu_executor import run_cpu
 
 logger = logging.getLogger(__name__)
 
@@ -205,49 +206,56 @@ def split_into_semantic_paragraphs(text: str, min_len: int = 40, max_len: int =
     return cleaned
 
 
+async def split_paragraphs_stream(chunks: AsyncIterable[str], min_len: int = 40,
+                                  max_len: int = 600) -> AsyncIterator[str]:
+    """流式语义段落拆分
+    - 输入为以段落边界结尾的文本块(见 file_parser_service.open_text_stream),逐块在 CPU 进程池中拆分后逐段产出
+    - 跨块去重只保留段落摘要,内存不随全文长度增长
+    """
+    seen = set()
+    async for chunk in chunks:
+        paragraphs = await run_cpu(split_into_semantic_paragraphs, chunk, min_len, max_len)
+        for para in paragraphs:
+            digest = hashlib.blake2b(para.encode("utf-8"), digest_size=16).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            yield para
+
+
 async def embed_paragraphs(paragraphs: List[str], embedding_model: str = "text-embedding-3-small") -> List[List[float]]:
-    """Batch paragraph embedding with Redis cache optimization
-    - Cache key: md5(paragraph_text + model_name)
-    - Cache TTL: 7 days (embeddings are static)
+    """Batch paragraph embedding with content-addressed cache
+    - Cache key: sha1(paragraph_text) namespaced by model and dimension
+    - One MGET per batch for lookups, one pipelined write per batch for new vectors
+    - Vectors stored as raw float32 bytes (optionally float16/int8)
     - Fallback to direct API call if cache miss
     """
     batch_size = 64
     vectors: List[List[float]] = []
-    cache = await get_cache()
+    cache = get_embedding_cache()
+    dim = embedding_dim_for(embedding_model)
     
-    async with AIService() as ai:
-        for i in range(0, len(paragraphs), batch_size):
-            batch = paragraphs[i: i + batch_size]
-            batch_vectors = []
-            uncached_texts = []
-            uncached_indices = []
-            
-            # Check cache for each paragraph
-            for j, text in enumerate(batch):
-                cache_key = f"embed:{embedding_model}:{hashlib.md5(text.encode()).hexdigest()}"
-                cached_vec = await cache.get(cache_key)
-                
-                if cached_vec:
-                    batch_vectors.append(cached_vec)
-                    logger.debug(f"Cache hit for paragraph {i+j}")
-                else:
-                    batch_vectors.append(None)  # Placeholder
-                    uncached_texts.append(text)
-                    uncached_indices.append(j)
+    ai = await get_ai_service()
+    for i in range(0, len(paragraphs), batch_size):
+        batch = paragraphs[i: i + batch_size]
+        cached = await cache.get_many(batch, embedding_model, dim)
+        batch_vectors: List[Optional[List[float]]] = [
+            vec.tolist() if vec is not None else None for vec in cached
+        ]
+        uncached_indices = [j for j, vec in enumerate(cached) if vec is None]
             
-            # Batch compute uncached embeddings
-            if uncached_texts:
-                logger.info(f"Computing {len(uncached_texts)}/{len(batch)} uncached embeddings")
-                new_vecs = await ai.get_embeddings(uncached_texts, model_id=embedding_model)
+        # Batch compute uncached embeddings
+        if uncached_indices:
+            uncached_texts = [batch[j] for j in uncached_indices]
+            logger.info(f"Computing {len(uncached_texts)}/{len(batch)} uncached embeddings")
+            new_vecs = await ai.get_embeddings(uncached_texts, model_id=embedding_model)
                 
-                # Store to cache and fill placeholders
-                for idx, vec in zip(uncached_indices, new_vecs):
-                    batch_vectors[idx] = vec
-                    text = batch[idx]
-                    cache_key = f"embed:{embedding_model}:{hashlib.md5(text.encode()).hexdigest()}"
-                    await cache.set(cache_key, vec, ttl=7 * 24 * 3600)  # 7 days
+            # Fill placeholders and store to cache in one round-trip
+            for idx, vec in zip(uncached_indices, new_vecs):
+                batch_vectors[idx] = vec
+            await cache.set_many(uncached_texts, new_vecs, embedding_model, dim)
             
-            vectors.extend(batch_vectors)
+        vectors.extend(batch_vectors)
     
     return vectors
 
@@ -0,0 +1,205 @@
+"""
+文件解析结果缓存 - 内容寻址 + 磁盘持久化(多 worker 共享)
+功能:
+1. 键: md5(文件内容) + 输出格式 + 编码覆盖 + 缓存格式版本,与上传路径/文件名无关
+2. 值: zlib 压缩的 {"text", "meta", "created_at"} JSON,按键前两位分目录存放;
+   先写临时文件再原子替换,同机多个 uvicorn worker 可安全共享同一目录
+3. 过期: 超过 file_extraction.cache_ttl 的条目视为未命中
+4. 容量: 目录总大小超过 parse_cache_max_bytes 时按最近访问时间(命中时刷新 mtime)淘汰
+5. 未命中时解析在 CPU 进程池中执行;同一进程内对同一键的并发请求只解析一次
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import get_settings
+from services.cpu_executor import run_cpu
+from services.file_parser_service import parse_file
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PARSE_CACHE_VERSION = 1
+_SUFFIX = ".pz"
+
+
+def file_md5(path: str) -> str:
+    """分块计算文件 md5"""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        while True:
+            b = f.read(1024 * 1024)
+            if not b:
+                break
+            h.update(b)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """磁盘解析缓存"""
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[int] = None):
+        fe = settings.file_extraction
+        self.cache_dir = Path(cache_dir) if cache_dir else (
+            Path(fe.parse_cache_dir) if fe.parse_cache_dir else settings.workspace_dir / "parse_cache"
+        )
+        self.max_bytes = max_bytes if max_bytes is not None else fe.parse_cache_max_bytes
+        self.ttl = ttl if ttl is not None else fe.cache_ttl
+        # 目录总大小的估计值: 首次写入时扫描,之后累加;超限时重新扫描(其它 worker 也在写)
+        self._size: Optional[int] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(md5_hex: str, format: str = "text", encoding_override: Optional[str] = None) -> str:
+        raw = f"v{PARSE_CACHE_VERSION}:{md5_hex}:{format}:{encoding_override or ''}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{_SUFFIX}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取并解压;不存在、过期或损坏时返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                payload = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"Parse cache entry {key} unreadable, dropping: {str(e)}")
+            self._remove(path)
+            return None
+        if self.ttl and time.time() - payload.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # 刷新访问时间,供 LRU 淘汰
+        except OSError:
+            pass
+        return {"text": payload.get("text", ""), "meta": payload.get("meta", {})}
+
+    def put(self, key: str, parsed: Dict[str, Any]):
+        """压缩写入(临时文件 + 原子替换),随后按容量淘汰"""
+        path = self._path(key)
+        data = zlib.compress(json.dumps({
+            "text": parsed.get("text", ""),
+            "meta": parsed.get("meta", {}),
+            "created_at": time.time(),
+        }, ensure_ascii=False).encode("utf-8"), 6)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{key}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Parse cache write failed for {key}: {str(e)}")
+            return
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._scan())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        entries: List[Tuple[float, int, Path]] = []
+        if not self.cache_dir.exists():
+            return entries
+        for path in self.cache_dir.glob(f"*/*{_SUFFIX}"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self):
+        """按 mtime 从旧到新删除,直到总大小回落到上限的 90%"""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                self.evictions += 1
+        self._size = total
+
+    @staticmethod
+    def _remove(path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except OSError:
+            return False
+
+    async def get_or_parse(self, path: str, format: str = "text",
+                           encoding_override: Optional[str] = None) -> Dict[str, Any]:
+        """命中缓存直接返回;否则在进程池中解析并写入缓存(空文本结果不缓存)"""
+        md5_hex = await asyncio.to_thread(file_md5, path)
+        key = self.key_for(md5_hex, format, encoding_override)
+
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            self.hits += 1
+            cached["meta"] = {**cached["meta"], "source_path": path}
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            parsed = await run_cpu(parse_file, path, format, encoding_override)
+            if parsed.get("text", "").strip():
+                await asyncio.to_thread(self.put, key, parsed)
+            future.set_result(parsed)
+            return parsed
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其它等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "dir": str(self.cache_dir),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# 全局解析缓存实例(单例)
+_parse_cache: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> ParseCache:
+    """获取解析缓存实例(单例模式)"""
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache()
+    return _parse_cache
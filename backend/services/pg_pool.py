@@ -0,0 +1,212 @@
+"""
+进程级共享 asyncpg 连接池
+由 main.py 的 lifespan 创建与关闭; DatabaseService / ChapterService / RL 优化器 /
+KeywordRAG / 公式还原等需要直接执行 $n 参数化 SQL 的服务统一借用这一个池,
+连接数只随池大小增长,不随服务数量增长.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import asyncpg
+    ASYNCPG_AVAILABLE = True
+except ImportError:
+    asyncpg = None
+    ASYNCPG_AVAILABLE = False
+    logging.warning("asyncpg not available. Install: pip install asyncpg")
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# 建池失败后的重试退避(秒): 数据库不可用时不让每个请求都去等连接超时
+INIT_RETRY_BACKOFF_MIN = 1.0
+INIT_RETRY_BACKOFF_MAX = 30.0
+
+
+def _encode_vector_binary(value, dtype: str = ">f4") -> bytes:
+    """按 pgvector 二进制线格式编码: int16 维度 + int16 保留位 + 大端 float4 数组"""
+    if isinstance(value, str):
+        body = value.strip().strip("[]")
+        value = [float(x) for x in body.split(",")] if body else []
+    arr = np.asarray(value, dtype=dtype)
+    return struct.pack(">HH", arr.shape[0], 0) + arr.tobytes()
+
+
+def _decode_vector_binary(data: bytes, dtype: str = ">f4") -> np.ndarray:
+    """解码 pgvector 二进制线格式"""
+    dim, _ = struct.unpack_from(">HH", data)
+    return np.frombuffer(data, dtype=dtype, count=dim, offset=4).astype(np.float32)
+
+
+def _encode_halfvec_binary(value) -> bytes:
+    """halfvec 线格式同 vector,元素为大端 float2"""
+    return _encode_vector_binary(value, ">f2")
+
+
+def _decode_halfvec_binary(data: bytes) -> np.ndarray:
+    return _decode_vector_binary(data, ">f2")
+
+
+def _encode_json(value) -> str:
+    # 兼容调用方已自行 json.dumps 的情况,避免二次编码
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+class PgPool:
+    """共享 asyncpg 连接池及常用查询助手"""
+
+    def __init__(self):
+        self._pool = None
+        self._init_lock = asyncio.Lock()
+        self._retry_at = 0.0
+        self._backoff = INIT_RETRY_BACKOFF_MIN
+
+    @property
+    def available(self) -> bool:
+        return self._pool is not None
+
+    @property
+    def pool(self):
+        """底层 asyncpg.Pool"""
+        return self._pool
+
+    async def initialize(self) -> bool:
+        """创建连接池(重复/并发调用安全;失败后按指数退避,退避期内直接返回 False)"""
+        if self._pool is not None:
+            return True
+        if not ASYNCPG_AVAILABLE:
+            logger.error("asyncpg not available, shared pool disabled")
+            return False
+
+        async with self._init_lock:
+            if self._pool is not None:
+                return True
+            if time.monotonic() < self._retry_at:
+                return False
+            return await self._create_pool()
+
+    async def _create_pool(self) -> bool:
+        db_settings = settings.database
+        try:
+            self._pool = await asyncpg.create_pool(
+                db_settings.url,
+                min_size=db_settings.raw_pool_min_size,
+                max_size=db_settings.raw_pool_max_size,
+                max_inactive_connection_lifetime=db_settings.pool_recycle,
+                statement_cache_size=db_settings.statement_cache_size,
+                init=self._init_connection,
+            )
+            logger.info(
+                f"Shared asyncpg pool ready (min={db_settings.raw_pool_min_size}, "
+                f"max={db_settings.raw_pool_max_size})"
+            )
+            self._retry_at = 0.0
+            self._backoff = INIT_RETRY_BACKOFF_MIN
+            return True
+        except Exception as e:
+            logger.error(f"Shared asyncpg pool init failed, retrying in {self._backoff:.0f}s: {str(e)}")
+            self._pool = None
+            self._retry_at = time.monotonic() + self._backoff
+            self._backoff = min(INIT_RETRY_BACKOFF_MAX, self._backoff * 2)
+            return False
+
+    @staticmethod
+    async def _init_connection(conn):
+        """每条新连接注册 json/jsonb 与 pgvector 编解码器"""
+        for typename in ("json", "jsonb"):
+            await conn.set_type_codec(
+                typename, schema="pg_catalog",
+                encoder=_encode_json, decoder=json.loads, format="text",
+            )
+        # halfvec 需 pgvector >= 0.7,旧版本没有该类型时跳过
+        rows = await conn.fetch(
+            "SELECT typname, typnamespace::regnamespace::text AS schema FROM pg_type "
+            "WHERE typname IN ('vector', 'halfvec')"
+        )
+        codecs = {
+            "vector": (_encode_vector_binary, _decode_vector_binary),
+            "halfvec": (_encode_halfvec_binary, _decode_halfvec_binary),
+        }
+        for row in rows:
+            encoder, decoder = codecs[row["typname"]]
+            await conn.set_type_codec(
+                row["typname"], schema=row["schema"],
+                encoder=encoder, decoder=decoder, format="binary",
+            )
+
+    def _require_pool(self):
+        if self._pool is None:
+            raise RuntimeError("Shared asyncpg pool is not initialized")
+        return self._pool
+
+    def acquire(self):
+        """借出连接: async with pg.acquire() as conn"""
+        return self._require_pool().acquire()
+
+    async def fetch_all(self, query: str, *args) -> List[Dict[str, Any]]:
+        rows = await self._require_pool().fetch(query, *args)
+        return [dict(r) for r in rows]
+
+    async def fetch_one(self, query: str, *args) -> Optional[Dict[str, Any]]:
+        row = await self._require_pool().fetchrow(query, *args)
+        return dict(row) if row is not None else None
+
+    async def fetchrow(self, query: str, *args):
+        return await self._require_pool().fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args):
+        return await self._require_pool().fetchval(query, *args)
+
+    async def execute(self, query: str, *args) -> str:
+        return await self._require_pool().execute(query, *args)
+
+    async def executemany(self, query: str, args: Iterable[Sequence[Any]]) -> None:
+        await self._require_pool().executemany(query, args)
+
+    def get_stats(self) -> Dict[str, Any]:
+        if self._pool is None:
+            return {"available": False}
+        return {
+            "available": True,
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+        }
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            logger.info("Shared asyncpg pool closed")
+
+
+# 全局共享池实例
+_pg_pool: Optional[PgPool] = None
+
+
+async def get_pg_pool() -> PgPool:
+    """获取共享连接池(首次调用时惰性创建,正常情况下由 lifespan 预先创建)"""
+    global _pg_pool
+    if _pg_pool is None:
+        _pg_pool = PgPool()
+    if not _pg_pool.available:
+        await _pg_pool.initialize()
+    return _pg_pool
+
+
+async def close_pg_pool():
+    """关闭共享连接池"""
+    global _pg_pool
+    if _pg_pool:
+        await _pg_pool.close()
+        _pg_pool = None
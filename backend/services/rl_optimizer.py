@@ -10,8 +10,9 @@
 5. 生成内容入库: 高质量生成内容自动入库,形成正向反馈循环
 
 技术原理:
-- Q值表: 记录段落在不同查询类下的表现(存储在meta.q_values)
-- 查询聚类: K-Means(50个簇),映射无限查询空间到有限状态空间
+- Q值表: 记录段落在不同查询类下的表现(存储在 rl_q_values 表,键为 段落×查询簇)
+- 查询聚类: K-Means(50个簇),映射无限查询空间到有限状态空间;
+  质心持久化为带版本的 .npy,启动时直接加载,离线用 TABLESAMPLE + MiniBatchKMeans 重训
 - UCB公式: score = Q + c × sqrt(ln(total_visits) / visit_count)
 - 奖励函数: reward = 0.7 × LLM_score + 0.3 × user_feedback
 - 更新公式: Q_new = Q_old + α × (reward - Q_old)
@@ -24,29 +25,41 @@ import asyncio
 import logging
 from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
 import json
 from datetime import datetime
+from pathlib import Path
 import math
 
+from config import get_settings
+from services.cpu_executor import run_cpu
+from services.keyword_index import extract_keywords, get_keyword_index_registry
+from services.text_search import build_lexemes, text_search_config, tsvector_literal
+
 logger = logging.getLogger(__name__)
 
+# 默认向量维度(text-embedding-3-small)
+DEFAULT_EMBEDDING_DIM = 1536
+
 
 class ReinforcementLearningOptimizer:
     """强化学习优化器"""
     
-    def __init__(self, db_pool, num_clusters: int = 50):
+    def __init__(self, db_pool, num_clusters: int = 50, model_dir: Optional[Path] = None):
         """
         初始化RL优化器
         
         Args:
             db_pool: 数据库连接池
             num_clusters: 查询聚类数量(默认50)
+            model_dir: 质心文件目录(默认 workspace/rl)
         """
         self.db_pool = db_pool
         self.num_clusters = num_clusters
-        self.kmeans_model: Optional[KMeans] = None
+        self.model_dir = Path(model_dir) if model_dir else get_settings().workspace_dir / "rl"
+        # 归一化后的质心矩阵 (K, D),按余弦最近邻分配查询簇
         self.cluster_centers: Optional[np.ndarray] = None
+        self.centroid_version: int = 0
         
         # Q-Learning超参数
         self.alpha = 0.1  # 学习率
@@ -62,618 +75,240 @@ class ReinforcementLearningOptimizer:
         self.duplicate_threshold = 0.95
     
     
-    async def initialize_query_clusters(self, sample_size: int = 1000):
-        """
-        初始化查询聚类模型
-        从历史查询中采样,训练K-Means模型
-        
-        Args:
-            sample_size: 采样数量
-        """
-        logger.info(f"Initializing query clusters (K={self.num_clusters})...")
-        
-        async with self.db_pool.acquire() as conn:
-            # 从历史段落中随机采样embedding
-            query = """
-                SELECT embedding 
-                FROM paragraphs 
-                WHERE embedding IS NOT NULL 
-                ORDER BY RANDOM() 
-                LIMIT $1
-            """
-            rows = await conn.fetch(query, sample_size)
-        
-        if not rows:
-            logger.warning("No embeddings found, using default clusters")
-            # 创建默认聚类中心(随机初始化)
-            self.cluster_centers = np.random.randn(self.num_clusters, 1536) * 0.1
-            self.kmeans_model = KMeans(n_clusters=self.num_clusters, random_state=42)
-            self.kmeans_model.cluster_centers_ = self.cluster_centers
-            return
-        
-        # 提取向量
-        embeddings = np.array([row['embedding'] for row in rows])
-        
-        # 训练K-Means
-        self.kmeans_model = KMeans(n_clusters=self.num_clusters, random_state=42)
-        self.kmeans_model.fit(embeddings)
-        self.cluster_centers = self.kmeans_model.cluster_centers_
-        
-        logger.info(f"Query clusters initialized with {len(embeddings)} samples")
-    
-    
-    def get_query_cluster(self, query_vec: np.ndarray) -> str:
-        """
-        将查询向量映射到查询簇
-        
-        Args:
-            query_vec: 查询向量(1536维)
-        
-        Returns:
-            查询簇ID, 格式: "query_cluster_0" ~ "query_cluster_49"
-        """
-        if self.kmeans_model is None:
-            raise RuntimeError("Query clusters not initialized. Call initialize_query_clusters() first.")
-        
-        cluster_id = self.kmeans_model.predict([query_vec])[0]
-        return f"query_cluster_{cluster_id}"
+    @property
+    def _centroid_meta_path(self) -> Path:
+        return self.model_dir / "query_centroids.json"
     
+    def _set_centroids(self, centers: np.ndarray, version: int):
+        centers = np.asarray(centers, dtype=np.float32)
+        self.cluster_centers = np.ascontiguousarray(
+            centers / (np.linalg.norm(centers, axis=1, keepdims=True) + 1e-10)
+        )
+        self.centroid_version = version
     
-    async def get_paragraph_q_value(
-        self, 
-        paragraph_id: str, 
-        query_cluster: str
-    ) -> Tuple[float, int]:
+    def load_centroids(self) -> bool:
         """
-        获取段落在特定查询簇下的Q值和访问次数
-        
-        Args:
-            paragraph_id: 段落ID
-            query_cluster: 查询簇ID
+        从磁盘加载最新版本的质心
         
         Returns:
-            (Q值, 访问次数)
+            是否加载成功
         """
-        async with self.db_pool.acquire() as conn:
-            query = """
-                SELECT meta 
-                FROM paragraphs 
-                WHERE id = $1
-            """
-            row = await conn.fetchrow(query, paragraph_id)
-        
-        if not row or not row['meta']:
-            return 0.5, 0  # 默认Q值0.5,未访问
-        
-        meta = row['meta']
-        q_values = meta.get('q_values', {})
-        visit_count = meta.get('visit_count', {})
+        try:
+            with open(self._centroid_meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            centers = np.load(self.model_dir / meta["file"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.info(f"No saved query centroids: {e}")
+            return False
         
-        q_value = q_values.get(query_cluster, 0.5)
-        visits = visit_count.get(query_cluster, 0)
+        if centers.ndim != 2 or centers.shape[0] != self.num_clusters:
+            logger.warning(f"Saved centroids shape {centers.shape} does not match K={self.num_clusters}, ignoring")
+            return False
         
-        return q_value, visits
+        self._set_centroids(centers, int(meta.get("version", 1)))
+        logger.info(f"Query centroids loaded: version={self.centroid_version} shape={centers.shape}")
+        return True
     
-    
-    async def calculate_ucb_score(
-        self,
-        paragraph_id: str,
-        query_cluster: str,
-        total_visits_all_paragraphs: int
-    ) -> float:
+    def save_centroids(self, centers: np.ndarray, sample_count: int) -> int:
         """
-        计算UCB (Upper Confidence Bound) 分数
-        公式: UCB = Q + c × sqrt(ln(N) / n)
-        
-        Args:
-            paragraph_id: 段落ID
-            query_cluster: 查询簇ID
-            total_visits_all_paragraphs: 所有段落的总访问次数
+        保存新版本质心(每个版本一个 .npy,json 指向当前版本,写入后原子替换)
         
         Returns:
-            UCB分数
-        """
-        q_value, visit_count = await self.get_paragraph_q_value(paragraph_id, query_cluster)
-        
-        if visit_count == 0:
-            # 未访问段落给予极高UCB,鼓励探索
-            return float('inf')
-        
-        # UCB公式
-        exploration_bonus = self.ucb_constant * math.sqrt(
-            math.log(total_visits_all_paragraphs + 1) / visit_count
-        )
-        
-        ucb_score = q_value + exploration_bonus
-        return ucb_score
-    
+            新版本号
+        """
+        version = self.centroid_version + 1
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        file_name = f"query_centroids_v{version}.npy"
+        np.save(self.model_dir / file_name, np.asarray(centers, dtype=np.float32))
+        
+        tmp = self._centroid_meta_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": version,
+                "file": file_name,
+                "num_clusters": int(centers.shape[0]),
+                "dim": int(centers.shape[1]),
+                "sample_count": sample_count,
+                "created_at": datetime.utcnow().isoformat(),
+            }, f)
+        tmp.replace(self._centroid_meta_path)
+        return version
     
-    async def select_paragraphs_with_rl(
-        self,
-        candidate_paragraphs: List[Dict[str, Any]],
-        query_vec: np.ndarray,
-        top_k: int = 5
-    ) -> List[Dict[str, Any]]:
+    async def initialize_query_clusters(self, sample_size: int = 1000):
         """
-        使用强化学习策略选择段落
-        结合Q值和UCB探索奖励,选择最优段落
+        初始化查询聚类模型
+        优先加载已保存的质心;不存在时才从段落向量采样训练并保存
         
         Args:
-            candidate_paragraphs: 候选段落列表(已通过向量检索筛选)
-            query_vec: 查询向量
-            top_k: 选择数量
-        
-        Returns:
-            优化后的段落列表
+            sample_size: 采样数量
         """
-        if not candidate_paragraphs:
-            return []
-        
-        # 获取查询簇
-        query_cluster = self.get_query_cluster(query_vec)
-        
-        # 计算总访问次数(用于UCB)
-        total_visits = 0
-        for para in candidate_paragraphs:
-            _, visits = await self.get_paragraph_q_value(para['id'], query_cluster)
-            total_visits += visits
-        
-        # Epsilon-greedy策略
-        if np.random.random() < self.epsilon:
-            # 探索:随机选择
-            np.random.shuffle(candidate_paragraphs)
-            selected = candidate_paragraphs[:top_k]
-            logger.debug(f"RL: Exploration mode (random selection)")
-        else:
-            # 利用:基于UCB选择
-            paragraph_scores = []
-            for para in candidate_paragraphs:
-                ucb_score = await self.calculate_ucb_score(
-                    para['id'], 
-                    query_cluster, 
-                    total_visits
-                )
-                paragraph_scores.append({
-                    'paragraph': para,
-                    'ucb_score': ucb_score,
-                    'q_value': await self.get_paragraph_q_value(para['id'], query_cluster)
-                })
-            
-            # 按UCB分数排序
-            paragraph_scores.sort(key=lambda x: x['ucb_score'], reverse=True)
-            selected = [item['paragraph'] for item in paragraph_scores[:top_k]]
-            
-            logger.debug(f"RL: Exploitation mode (UCB selection)")
-            logger.debug(f"Top UCB scores: {[round(item['ucb_score'], 3) for item in paragraph_scores[:top_k]]}")
-        
-        # 添加RL元信息
-        for para in selected:
-            q_value, visits = await self.get_paragraph_q_value(para['id'], query_cluster)
-            para['rl_info'] = {
-                'query_cluster': query_cluster,
-                'q_value': q_value,
-                'visit_count': visits
-            }
+        if self.load_centroids():
+            return
         
-        return selected
-    
+        logger.info(f"Initializing query clusters (K={self.num_clusters})...")
+        if not await self.refit_query_clusters(sample_size=sample_size):
+            logger.warning("No embeddings found, using default clusters")
+            # 创建默认聚类中心(随机初始化,不持久化,待有数据后重训)
+            self._set_centroids(
+                np.random.default_rng(42).standard_normal((self.num_clusters, DEFAULT_EMBEDDING_DIM)),
+                0
+            )
     
-    async def update_q_values(
-        self,
-        paragraph_ids: List[str],
-        query_vec: np.ndarray,
-        reward: float
-    ):
+    async def _sample_embeddings(self, sample_size: int) -> np.ndarray:
         """
-        更新段落的Q值
-        Q-Learning更新公式: Q_new = Q_old + α × (reward - Q_old)
-        
-        Args:
-            paragraph_ids: 段落ID列表
-            query_vec: 查询向量
-            reward: 奖励值(0-1之间)
+        按页采样段落向量: TABLESAMPLE SYSTEM 只读取部分数据页,
+        避免 ORDER BY RANDOM() 的全表扫描 + 排序
         """
-        query_cluster = self.get_query_cluster(query_vec)
-        
         async with self.db_pool.acquire() as conn:
-            for pid in paragraph_ids:
-                # 获取当前Q值和访问次数
-                q_old, visit_count = await self.get_paragraph_q_value(pid, query_cluster)
-                
-                # Q-Learning更新
-                q_new = q_old + self.alpha * (reward - q_old)
-                q_new = max(0.0, min(1.0, q_new))  # 限制在[0, 1]
-                
-                # 更新meta字段
-                update_query = """
-                    UPDATE paragraphs
-                    SET meta = jsonb_set(
-                        jsonb_set(
-                            COALESCE(meta, '{}'::jsonb),
-                            ARRAY['q_values', $2],
-                            to_jsonb($3::float)
-                        ),
-                        ARRAY['visit_count', $2],
-                        to_jsonb($4::int)
-                    ),
-                    updated_at = CURRENT_TIMESTAMP
-                    WHERE id = $1
+            est_rows = await conn.fetchval(
+                "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'paragraphs'::regclass"
+            )
+            # 采样比例留 2 倍余量(部分行 embedding 为空);小表或统计缺失时直接全表
+            percent = 100.0 if not est_rows else min(100.0, sample_size * 2 * 100.0 / est_rows)
+            rows = await conn.fetch(
                 """
-                await conn.execute(
-                    update_query,
-                    pid,
-                    query_cluster,
-                    q_new,
-                    visit_count + 1
-                )
-                
-                logger.debug(f"Updated Q-value: {pid} | {query_cluster} | {q_old:.3f} → {q_new:.3f}")
-        
-        logger.info(f"Q-values updated for {len(paragraph_ids)} paragraphs (reward={reward:.3f})")
-    
+                SELECT embedding
+                FROM paragraphs TABLESAMPLE SYSTEM ($1)
+                WHERE embedding IS NOT NULL
+                LIMIT $2
+                """,
+                percent,
+                sample_size
+            )
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([np.asarray(row['embedding'], dtype=np.float32) for row in rows])
+    
+    def _fit_centroids(self, embeddings: np.ndarray, batch_size: int) -> np.ndarray:
+        """MiniBatchKMeans 训练(在归一化向量上,与余弦分配一致)"""
+        embeddings = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-10)
+        model = MiniBatchKMeans(
+            n_clusters=self.num_clusters,
+            batch_size=batch_size,
+            n_init=3,
+            random_state=42
+        )
+        model.fit(embeddings)
+        centers = model.cluster_centers_.astype(np.float32)
+        return self._align_to_previous(centers)
     
-    async def calculate_reward(
-        self,
-        spliced_content: str,
-        contexts: List[str],
-        llm_score: Optional[float] = None,
-        user_feedback: Optional[str] = None
-    ) -> float:
+    def _align_to_previous(self, centers: np.ndarray) -> np.ndarray:
         """
-        计算综合奖励
-        reward = 0.7 × LLM_score + 0.3 × user_feedback_score
-        
-        Args:
-            spliced_content: 拼接内容
-            contexts: 上下文段落列表
-            llm_score: LLM评分(0-1),若为None则不使用
-            user_feedback: 用户反馈("thumbs_up"/"thumbs_down"/None)
-        
-        Returns:
-            综合奖励(0-1之间)
+        将新质心与当前质心做一一匹配并按旧编号重排,
+        使重训后 query_cluster_i 仍指向相近的查询区域,Q值表无需迁移
         """
-        reward = 0.0
-        
-        # LLM评分部分(权重0.7)
-        if llm_score is not None:
-            reward += 0.7 * llm_score
-        else:
-            # 默认中等分数
-            reward += 0.7 * 0.5
+        if self.cluster_centers is None or self.centroid_version == 0 \
+                or self.cluster_centers.shape != centers.shape:
+            return centers
+        from scipy.optimize import linear_sum_assignment
         
-        # 用户反馈部分(权重0.3)
-        if user_feedback == "thumbs_up":
-            reward += 0.3 * 1.0
-        elif user_feedback == "thumbs_down":
-            reward += 0.3 * 0.0
-        else:
-            # 无反馈,默认中等
-            reward += 0.3 * 0.5
-        
-        return min(1.0, max(0.0, reward))
-    
+        normed = centers / (np.linalg.norm(centers, axis=1, keepdims=True) + 1e-10)
+        cost = -(self.cluster_centers @ normed.T)
+        old_idx, new_idx = linear_sum_assignment(cost)
+        aligned = np.empty_like(centers)
+        aligned[old_idx] = centers[new_idx]
+        return aligned
     
-    async def should_store_generated_content(
-        self,
-        reward: float,
-        spliced_content: str
-    ) -> Tuple[bool, str]:
+    async def refit_query_clusters(self, sample_size: int = 20000, batch_size: int = 1024) -> bool:
         """
-        判断是否应将生成内容入库
+        离线/后台重训查询聚类: TABLESAMPLE 采样 + MiniBatchKMeans,
+        训练在线程中执行,完成后保存新版本并原子切换
         
         Args:
-            reward: 奖励分数
-            spliced_content: 生成内容
+            sample_size: 采样数量
+            batch_size: MiniBatchKMeans 批大小
         
         Returns:
-            (是否入库, 质量标签)
+            是否完成重训(样本不足时返回 False)
         """
-        # 质量检查
-        if reward >= self.high_quality_threshold:
-            quality_tag = "high"
-            should_store = True
-        elif reward >= self.medium_quality_threshold:
-            quality_tag = "medium"
-            should_store = False  # 中等质量暂不入库
-        else:
-            quality_tag = "low"
-            should_store = False
+        embeddings = await self._sample_embeddings(sample_size)
+        if embeddings.shape[0] < self.num_clusters:
+            logger.warning(f"Not enough embeddings to fit {self.num_clusters} clusters: {embeddings.shape[0]}")
+            return False
         
-        # 去重检查(简化:检查长度,实际应检查语义相似度)
-        if should_store and len(spliced_content) < 50:
-            should_store = False
-            logger.debug("Content too short, skip storing")
+        centers = await asyncio.to_thread(self._fit_centroids, embeddings, batch_size)
+        version = self.save_centroids(centers, sample_count=int(embeddings.shape[0]))
+        self._set_centroids(centers, version)
         
-        return should_store, quality_tag
-    
+        logger.info(f"Query clusters refit with {embeddings.shape[0]} samples, version={version}")
+        return True
     
-    async def store_generated_paragraph(
-        self,
-        content: str,
-        embedding: np.ndarray,
-        source_paragraph_ids: List[str],
-        query_vec: np.ndarray,
-        reward: float,
-        book_id: str
-    ) -> Optional[str]:
+    def assign_clusters(self, query_vecs: np.ndarray) -> np.ndarray:
         """
-        将生成内容作为新段落入库
-        继承源段落的Q值,加速冷启动
+        批量分配查询簇: 归一化查询后与预归一化质心矩阵做一次矩阵乘,取最大余弦
         
         Args:
-            content: 生成内容
-            embedding: 内容向量
-            source_paragraph_ids: 源段落ID列表
-            query_vec: 查询向量
-            reward: 奖励分数
-            book_id: 书籍ID
+            query_vecs: (N, D) 或 (D,) 查询向量
         
         Returns:
-            新段落ID,若入库失败则返回None
+            (N,) 簇编号
         """
-        # 判断是否应入库
-        should_store, quality_tag = await self.should_store_generated_content(reward, content)
-        
-        if not should_store:
-            logger.debug(f"Skip storing: quality={quality_tag}, reward={reward:.3f}")
-            return None
-        
-        # 计算源段落的平均Q值(继承机制)
-        query_cluster = self.get_query_cluster(query_vec)
-        avg_q_value = 0.0
-        for pid in source_paragraph_ids:
-            q_value, _ = await self.get_paragraph_q_value(pid, query_cluster)
-            avg_q_value += q_value
-        avg_q_value /= len(source_paragraph_ids) if source_paragraph_ids else 1.0
-        
-        # 构造meta字段
-        meta = {
-            "is_generated": True,
-            "generation_source": source_paragraph_ids,
-            "generation_time": datetime.utcnow().isoformat(),
-            "quality": quality_tag,
-            "generation_reward": reward,
-            "q_values": {query_cluster: avg_q_value},
-            "visit_count": {query_cluster: 0},
-            "avg_reward": reward,
-            "total_visits": 0
-        }
-        
-        # 插入数据库
-        async with self.db_pool.acquire() as conn:
-            query = """
-                INSERT INTO paragraphs (
-                    book_id, content, embedding, enhanced_embedding,
-                    meta, sequence_weight, is_active
-                )
-                VALUES ($1, $2, $3, $4, $5, $6, TRUE)
-                RETURNING id
-            """
-            row = await conn.fetchrow(
-                query,
-                book_id,
-                content,
-                embedding.tolist(),
-                embedding.tolist(),  # 初始增强向量=原始向量
-                json.dumps(meta),
-                1.0  # 初始权重1.0
-            )
-            new_paragraph_id = row['id']
-        
-        logger.info(f"Stored generated paragraph: {new_paragraph_id} | quality={quality_tag} | reward={reward:.3f}")
+        if self.cluster_centers is None:
+            raise RuntimeError("Query clusters not initialized. Call initialize_query_clusters() first.")
         
-        return new_paragraph_id
+        queries = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-10)
+        return np.argmax(queries @ self.cluster_centers.T, axis=1)
     
+    def get_query_clusters(self, query_vecs: np.ndarray) -> List[str]:
+        """批量将查询向量映射到查询簇ID"""
+        return [f"query_cluster_{int(c)}" for c in self.assign_clusters(query_vecs)]
     
-    async def async_evaluate_and_optimize(
-        self,
-        spliced_content: str,
-        paragraphs: List[Dict[str, Any]],
-        query_vec: np.ndarray,
-        query_text: str,
-        llm_score: Optional[float] = None,
-        user_feedback: Optional[str] = None,
-        store_generated: bool = False,
-        book_id: Optional[str] = None
-    ):
+    def get_query_cluster(self, query_vec: np.ndarray) -> str:
         """
-        异步评估与优化(后台任务,不阻塞用户响应)
-        
-        流程:
-        1. 计算综合奖励
-        2. 更新Q值
-        3. (可选)将高质量内容入库
+        将查询向量映射到查询簇
         
         Args:
-            spliced_content: 拼接内容
-            paragraphs: 使用的段落列表
-            query_vec: 查询向量
-            query_text: 查询文本
-            llm_score: LLM评分(可选)
-            user_feedback: 用户反馈(可选)
-            store_generated: 是否入库
-            book_id: 书籍ID(入库时必需)
-        """
-        try:
-            # 1. 计算奖励
-            contexts = [p['content'] for p in paragraphs]
-            reward = await self.calculate_reward(
-                spliced_content, 
-                contexts, 
-                llm_score, 
-                user_feedback
-            )
-            
-            # 2. 更新Q值
-            paragraph_ids = [p['id'] for p in paragraphs]
-            await self.update_q_values(paragraph_ids, query_vec, reward)
-            
-            # 3. 高质量内容入库
-            if store_generated and book_id:
-                # 生成embedding(简化:使用查询向量作为近似)
-                # 实际应调用OpenAI API生成真实embedding
-                embedding = query_vec
-                
-                new_pid = await self.store_generated_paragraph(
-                    content=spliced_content,
-                    embedding=embedding,
-                    source_paragraph_ids=paragraph_ids,
-                    query_vec=query_vec,
-                    reward=reward,
-                    book_id=book_id
-                )
-                
-                if new_pid:
-                    logger.info(f"Generated content stored: {new_pid}")
-            
-            logger.info(f"RL optimization completed: query='{query_text[:50]}...' | reward={reward:.3f}")
-        
-        except Exception as e:
-            logger.error(f"RL optimization failed: {e}", exc_info=True)
-            # 静默失败,不影响用户体验
-
-
-# 全局实例(懒加载)
-_rl_optimizer_instance: Optional[ReinforcementLearningOptimizer] = None
-
-
-async def get_rl_optimizer(db_pool) -> ReinforcementLearningOptimizer:
-    """
-    获取全局RL优化器实例(单例模式)
-    
-    Args:
-        db_pool: 数据库连接池
-    
-    Returns:
-        ReinforcementLearningOptimizer实例
-    """
-    global _rl_optimizer_instance
-    
-    if _rl_optimizer_instance is None:
-        _rl_optimizer_instance = ReinforcementLearningOptimizer(db_pool)
-        # 初始化查询聚类(异步)
-        await _rl_optimizer_instance.initialize_query_clusters()
-    
-    return _rl_optimizer_instance
-"""
-强化学习优化器 (Reinforcement Learning Optimizer)
-实现生成→入库→再生成→更准确的闭环学习机制
-
-核心功能:
-1. Q-Learning算法: 为每个段落维护在不同查询下的预期质量Q值
-2. 查询聚类: 使用K-Means将相似查询分组,降低状态空间复杂度
-3. UCB探索策略: 平衡探索(exploration)与利用(exploitation)
-4. 段落选择优化: 基于Q值和UCB分数选择最优段落组合
-5. 生成内容入库: 高质量生成内容自动入库,形成正向反馈循环
-
-技术原理:
-- Q值表: 记录段落在不同查询类下的表现(存储在meta.q_values)
-- 查询聚类: K-Means(50个簇),映射无限查询空间到有限状态空间
-- UCB公式: score = Q + c × sqrt(ln(total_visits) / visit_count)
-- 奖励函数: reward = 0.7 × LLM_score + 0.3 × user_feedback
-- 更新公式: Q_new = Q_old + α × (reward - Q_old)
-
-作者: AI Assistant
-日期: 2024-01-15
-"""
-
-import asyncio
-import logging
-from typing import List, Dict, Any, Optional, Tuple
-import numpy as np
-from sklearn.cluster import KMeans
-import json
-from datetime import datetime
-import math
-
-logger = logging.getLogger(__name__)
-
-
-class ReinforcementLearningOptimizer:
-    """强化学习优化器"""
-    
-    def __init__(self, db_pool, num_clusters: int = 50):
-        """
-        初始化RL优化器
+            query_vec: 查询向量(1536维)
         
-        Args:
-            db_pool: 数据库连接池
-            num_clusters: 查询聚类数量(默认50)
+        Returns:
+            查询簇ID, 格式: "query_cluster_0" ~ "query_cluster_49"
         """
-        self.db_pool = db_pool
-        self.num_clusters = num_clusters
-        self.kmeans_model: Optional[KMeans] = None
-        self.cluster_centers: Optional[np.ndarray] = None
-        
-        # Q-Learning超参数
-        self.alpha = 0.1  # 学习率
-        self.gamma = 0.9  # 折扣因子(暂未使用,单步任务简化为0)
-        self.epsilon = 0.1  # Epsilon-greedy探索率
-        self.ucb_constant = 2.0  # UCB探索常数
-        
-        # 入库质量阈值
-        self.high_quality_threshold = 0.8
-        self.medium_quality_threshold = 0.6
-        
-        # 去重相似度阈值
-        self.duplicate_threshold = 0.95
+        return self.get_query_clusters(query_vec)[0]
     
     
-    async def initialize_query_clusters(self, sample_size: int = 1000):
+    async def get_q_values_batch(
+        self,
+        paragraph_ids: List[Any],
+        query_cluster: str
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        初始化查询聚类模型
-        从历史查询中采样,训练K-Means模型
+        批量获取段落在特定查询簇下的Q值和访问次数(一次 WHERE id = ANY($1) 查询)
         
         Args:
-            sample_size: 采样数量
+            paragraph_ids: 段落ID列表
+            query_cluster: 查询簇ID
+        
+        Returns:
+            (Q值数组, 访问次数数组),与 paragraph_ids 顺序一致;
+            无记录的段落为默认Q值0.5、访问0次
         """
-        logger.info(f"Initializing query clusters (K={self.num_clusters})...")
+        ids = [int(pid) for pid in paragraph_ids]
+        q_values = np.full(len(ids), 0.5, dtype=np.float64)
+        visits = np.zeros(len(ids), dtype=np.int64)
+        if not ids:
+            return q_values, visits
         
         async with self.db_pool.acquire() as conn:
-            # 从历史段落中随机采样embedding
             query = """
-                SELECT embedding 
-                FROM paragraphs 
-                WHERE embedding IS NOT NULL 
-                ORDER BY RANDOM() 
-                LIMIT $1
+                SELECT paragraph_id, q_value, visit_count
+                FROM rl_q_values
+                WHERE query_cluster = $2
+                AND paragraph_id = ANY($1::int[])
             """
-            rows = await conn.fetch(query, sample_size)
-        
-        if not rows:
-            logger.warning("No embeddings found, using default clusters")
-            # 创建默认聚类中心(随机初始化)
-            self.cluster_centers = np.random.randn(self.num_clusters, 1536) * 0.1
-            self.kmeans_model = KMeans(n_clusters=self.num_clusters, random_state=42)
-            self.kmeans_model.cluster_centers_ = self.cluster_centers
-            return
-        
-        # 提取向量
-        embeddings = np.array([row['embedding'] for row in rows])
-        
-        # 训练K-Means
-        self.kmeans_model = KMeans(n_clusters=self.num_clusters, random_state=42)
-        self.kmeans_model.fit(embeddings)
-        self.cluster_centers = self.kmeans_model.cluster_centers_
-        
-        logger.info(f"Query clusters initialized with {len(embeddings)} samples")
-    
-    
-    def get_query_cluster(self, query_vec: np.ndarray) -> str:
-        """
-        将查询向量映射到查询簇
+            rows = await conn.fetch(query, list(set(ids)), query_cluster)
         
-        Args:
-            query_vec: 查询向量(1536维)
+        found = {row['paragraph_id']: row for row in rows}
+        for i, pid in enumerate(ids):
+            row = found.get(pid)
+            if row is None:
+                continue
+            if row['q_value'] is not None:
+                q_values[i] = row['q_value']
+            if row['visit_count'] is not None:
+                visits[i] = row['visit_count']
         
-        Returns:
-            查询簇ID, 格式: "query_cluster_0" ~ "query_cluster_49"
-        """
-        if self.kmeans_model is None:
-            raise RuntimeError("Query clusters not initialized. Call initialize_query_clusters() first.")
-        
-        cluster_id = self.kmeans_model.predict([query_vec])[0]
-        return f"query_cluster_{cluster_id}"
+        return q_values, visits
     
     
     async def get_paragraph_q_value(
@@ -691,25 +326,36 @@ class ReinforcementLearningOptimizer:
         Returns:
             (Q值, 访问次数)
         """
-        async with self.db_pool.acquire() as conn:
-            query = """
-                SELECT meta 
-                FROM paragraphs 
-                WHERE id = $1
-            """
-            row = await conn.fetchrow(query, paragraph_id)
-        
-        if not row or not row['meta']:
-            return 0.5, 0  # 默认Q值0.5,未访问
-        
-        meta = row['meta']
-        q_values = meta.get('q_values', {})
-        visit_count = meta.get('visit_count', {})
+        q_values, visits = await self.get_q_values_batch([paragraph_id], query_cluster)
+        return float(q_values[0]), int(visits[0])
+    
+    
+    def compute_ucb_scores(
+        self,
+        q_values: np.ndarray,
+        visit_counts: np.ndarray,
+        total_visits: int
+    ) -> np.ndarray:
+        """
+        批量计算UCB分数
+        公式: UCB = Q + c × sqrt(ln(N + 1) / n),未访问段落(n=0)为 +inf 以鼓励探索
         
-        q_value = q_values.get(query_cluster, 0.5)
-        visits = visit_count.get(query_cluster, 0)
+        Args:
+            q_values: Q值数组
+            visit_counts: 访问次数数组
+            total_visits: 候选集合的总访问次数
         
-        return q_value, visits
+        Returns:
+            UCB分数数组
+        """
+        q_values = np.asarray(q_values, dtype=np.float64)
+        visit_counts = np.asarray(visit_counts, dtype=np.float64)
+        scores = np.full(q_values.shape, np.inf)
+        visited = visit_counts > 0
+        scores[visited] = q_values[visited] + self.ucb_constant * np.sqrt(
+            math.log(total_visits + 1) / visit_counts[visited]
+        )
+        return scores
     
     
     async def calculate_ucb_score(
@@ -731,18 +377,10 @@ class ReinforcementLearningOptimizer:
             UCB分数
         """
         q_value, visit_count = await self.get_paragraph_q_value(paragraph_id, query_cluster)
-        
-        if visit_count == 0:
-            # 未访问段落给予极高UCB,鼓励探索
-            return float('inf')
-        
-        # UCB公式
-        exploration_bonus = self.ucb_constant * math.sqrt(
-            math.log(total_visits_all_paragraphs + 1) / visit_count
+        scores = self.compute_ucb_scores(
+            np.array([q_value]), np.array([visit_count]), total_visits_all_paragraphs
         )
-        
-        ucb_score = q_value + exploration_bonus
-        return ucb_score
+        return float(scores[0])
     
     
     async def select_paragraphs_with_rl(
@@ -769,48 +407,37 @@ class ReinforcementLearningOptimizer:
         # 获取查询簇
         query_cluster = self.get_query_cluster(query_vec)
         
+        # 一次查询取回全部候选的Q值与访问次数
+        q_values, visits = await self.get_q_values_batch(
+            [para['id'] for para in candidate_paragraphs], query_cluster
+        )
+        
         # 计算总访问次数(用于UCB)
-        total_visits = 0
-        for para in candidate_paragraphs:
-            _, visits = await self.get_paragraph_q_value(para['id'], query_cluster)
-            total_visits += visits
+        total_visits = int(visits.sum())
         
         # Epsilon-greedy策略
         if np.random.random() < self.epsilon:
             # 探索:随机选择
-            np.random.shuffle(candidate_paragraphs)
-            selected = candidate_paragraphs[:top_k]
+            order = np.random.permutation(len(candidate_paragraphs))[:top_k]
             logger.debug(f"RL: Exploration mode (random selection)")
         else:
-            # 利用:基于UCB选择
-            paragraph_scores = []
-            for para in candidate_paragraphs:
-                ucb_score = await self.calculate_ucb_score(
-                    para['id'], 
-                    query_cluster, 
-                    total_visits
-                )
-                paragraph_scores.append({
-                    'paragraph': para,
-                    'ucb_score': ucb_score,
-                    'q_value': await self.get_paragraph_q_value(para['id'], query_cluster)
-                })
-            
-            # 按UCB分数排序
-            paragraph_scores.sort(key=lambda x: x['ucb_score'], reverse=True)
-            selected = [item['paragraph'] for item in paragraph_scores[:top_k]]
+            # 利用:基于UCB选择(稳定排序,同分保持候选原有顺序)
+            ucb_scores = self.compute_ucb_scores(q_values, visits, total_visits)
+            order = np.argsort(-ucb_scores, kind="stable")[:top_k]
             
             logger.debug(f"RL: Exploitation mode (UCB selection)")
-            logger.debug(f"Top UCB scores: {[round(item['ucb_score'], 3) for item in paragraph_scores[:top_k]]}")
+            logger.debug(f"Top UCB scores: {[round(float(ucb_scores[i]), 3) for i in order]}")
         
         # 添加RL元信息
-        for para in selected:
-            q_value, visits = await self.get_paragraph_q_value(para['id'], query_cluster)
+        selected = []
+        for i in order:
+            para = candidate_paragraphs[i]
             para['rl_info'] = {
                 'query_cluster': query_cluster,
-                'q_value': q_value,
-                'visit_count': visits
+                'q_value': float(q_values[i]),
+                'visit_count': int(visits[i])
             }
+            selected.append(para)
         
         return selected
     
@@ -831,40 +458,27 @@ class ReinforcementLearningOptimizer:
             reward: 奖励值(0-1之间)
         """
         query_cluster = self.get_query_cluster(query_vec)
+        ids = list(dict.fromkeys(int(pid) for pid in paragraph_ids))
+        if not ids:
+            return
         
+        # 单条语句完成整批更新: Q值在库内按当前值计算,并发反馈之间不会互相覆盖
+        # 无记录的段落以默认Q值0.5为起点
+        upsert_query = """
+            INSERT INTO rl_q_values AS t (paragraph_id, query_cluster, q_value, visit_count, updated_at)
+            SELECT u.pid, $2, LEAST(1.0, GREATEST(0.0, 0.5 + $3::float8 * ($4::float8 - 0.5))), 1, NOW()
+            FROM unnest($1::int[]) AS u(pid)
+            ON CONFLICT (paragraph_id, query_cluster) DO UPDATE
+            SET q_value = LEAST(1.0, GREATEST(0.0, t.q_value + $3::float8 * ($4::float8 - t.q_value))),
+                visit_count = t.visit_count + 1,
+                updated_at = NOW()
+            RETURNING paragraph_id, q_value
+        """
         async with self.db_pool.acquire() as conn:
-            for pid in paragraph_ids:
-                # 获取当前Q值和访问次数
-                q_old, visit_count = await self.get_paragraph_q_value(pid, query_cluster)
-                
-                # Q-Learning更新
-                q_new = q_old + self.alpha * (reward - q_old)
-                q_new = max(0.0, min(1.0, q_new))  # 限制在[0, 1]
-                
-                # 更新meta字段
-                update_query = """
-                    UPDATE paragraphs
-                    SET meta = jsonb_set(
-                        jsonb_set(
-                            COALESCE(meta, '{}'::jsonb),
-                            ARRAY['q_values', $2],
-                            to_jsonb($3::float)
-                        ),
-                        ARRAY['visit_count', $2],
-                        to_jsonb($4::int)
-                    ),
-                    updated_at = CURRENT_TIMESTAMP
-                    WHERE id = $1
-                """
-                await conn.execute(
-                    update_query,
-                    pid,
-                    query_cluster,
-                    q_new,
-                    visit_count + 1
-                )
-                
-                logger.debug(f"Updated Q-value: {pid} | {query_cluster} | {q_old:.3f} → {q_new:.3f}")
+            rows = await conn.fetch(upsert_query, ids, query_cluster, self.alpha, float(reward))
+        
+        for row in rows:
+            logger.debug(f"Updated Q-value: {row['paragraph_id']} | {query_cluster} | → {row['q_value']:.3f}")
         
         logger.info(f"Q-values updated for {len(paragraph_ids)} paragraphs (reward={reward:.3f})")
     
@@ -978,10 +592,9 @@ class ReinforcementLearningOptimizer:
         # 计算源段落的平均Q值(继承机制)
         query_cluster = self.get_query_cluster(query_vec)
         avg_q_value = 0.0
-        for pid in source_paragraph_ids:
-            q_value, _ = await self.get_paragraph_q_value(pid, query_cluster)
-            avg_q_value += q_value
-        avg_q_value /= len(source_paragraph_ids) if source_paragraph_ids else 1.0
+        if source_paragraph_ids:
+            q_values, _ = await self.get_q_values_batch(source_paragraph_ids, query_cluster)
+            avg_q_value = float(q_values.mean())
         
         # 构造meta字段
         meta = {
@@ -990,32 +603,55 @@ class ReinforcementLearningOptimizer:
             "generation_time": datetime.utcnow().isoformat(),
             "quality": quality_tag,
             "generation_reward": reward,
-            "q_values": {query_cluster: avg_q_value},
-            "visit_count": {query_cluster: 0},
             "avg_reward": reward,
             "total_visits": 0
         }
         
+        # 关键词用于稀疏激活,与查询侧同一提取口径
+        # (jieba 分词为 CPU 密集操作,放到进程池中执行,不阻塞事件循环)
+        keywords = await run_cpu(extract_keywords, content)
+        # 全文检索词位(jieba 模式由应用写入;配置模式由触发器计算,此处传 NULL)
+        search_tsv = None
+        if text_search_config() is None:
+            search_tsv = tsvector_literal(await run_cpu(build_lexemes, content))
+        
         # 插入数据库
         async with self.db_pool.acquire() as conn:
             query = """
                 INSERT INTO paragraphs (
-                    book_id, content, embedding, enhanced_embedding,
-                    meta, sequence_weight, is_active
+                    book_id, content, embedding,
+                    meta, sequence_weight, keywords, search_tsv, is_active
                 )
-                VALUES ($1, $2, $3, $4, $5, $6, TRUE)
+                VALUES ($1, $2, $3, $4, $5, $6, $7::tsvector, TRUE)
                 RETURNING id
             """
+            # 初始增强向量=原始向量: 权重 1.0、偏置参数为空(零偏置),检索时按需计算,不再物化
             row = await conn.fetchrow(
                 query,
                 book_id,
                 content,
                 embedding.tolist(),
-                embedding.tolist(),  # 初始增强向量=原始向量
                 json.dumps(meta),
-                1.0  # 初始权重1.0
+                1.0,  # 初始权重1.0
+                keywords or None,
+                search_tsv
             )
             new_paragraph_id = row['id']
+            
+            # 继承的Q值写入Q值表(访问次数从0开始)
+            await conn.execute(
+                """
+                INSERT INTO rl_q_values (paragraph_id, query_cluster, q_value, visit_count)
+                VALUES ($1, $2, $3, 0)
+                ON CONFLICT (paragraph_id, query_cluster) DO NOTHING
+                """,
+                new_paragraph_id,
+                query_cluster,
+                avg_q_value
+            )
+        
+        # 增量更新已加载的倒排索引,无需重建
+        get_keyword_index_registry().add_paragraphs(book_id, [(new_paragraph_id, keywords)])
         
         logger.info(f"Stored generated paragraph: {new_paragraph_id} | quality={quality_tag} | reward={reward:.3f}")
         
@@ -1,49 +1,70 @@
 import os
 import json
+import math
 import time
-import hashlib
 import asyncio
 from typing import AsyncGenerator, Dict, Any, List, Optional
 
-from functools import lru_cache
-
-from services.file_parser_service import parse_file
-from services.paragraph_service import split_into_semantic_paragraphs, embed_paragraphs
-from services.classify_service import classify_paragraphs
+from services.file_parser_service import open_text_stream, STREAM_EXTENSIONS
+from services.parse_cache import get_parse_cache
+from services.cpu_executor import run_cpu
+from services.paragraph_service import split_into_semantic_paragraphs, split_paragraphs_stream, embed_paragraphs
+from services.classify_service import classify_paragraphs_cached
 from services.db_service import get_db_service
 from errors import DomainError, sse_error_event
+from config import get_settings
 
+# 分类/向量化批大小(段落数)
+BATCH_SIZE = 100
+# 流式入库时 documents.content 只保留正文前缀(与全文检索 search_tsv 的截断长度一致),全文在段落表中
+STREAM_DOC_CONTENT_CHARS = 300000
+
+
+async def _with_retry(call, attempts: int = 3):
+    """指数退避重试(1s, 2s, ...),最后一次失败时抛出"""
+    for attempt in range(1, attempts + 1):
+        try:
+            return await call()
+        except Exception:
+            if attempt == attempts:
+                raise
+            await asyncio.sleep(2 ** (attempt - 1))
 
-def _md5_file(path: str) -> str:
-    h = hashlib.md5()
-    with open(path, "rb") as f:
-        while True:
-            b = f.read(1024 * 1024)
-            if not b:
-                break
-            h.update(b)
-    return h.hexdigest()
 
+def _batch_error_event(batch_idx: int, e: Exception) -> Dict[str, Any]:
+    ts = time.strftime("%Y-%m-%d %H:%M:%S")
+    return {"event": "batch_error", "data": json.dumps({
+        "batchIndex": batch_idx + 1,
+        "message": str(e),
+        "error": f"{ts} 第{batch_idx + 1}批 {str(e)}"
+    })}
 
-@lru_cache(maxsize=500)
-def _cached_parse(bucket: int, md5_hex: str, format: str, ext: str, path: str, encoding_override: Optional[str]) -> Dict[str, Any]:
-    # 使用 7 天"时间桶"实现近似 TTL:桶变化时缓存键失效
-    return parse_file(path, format=format, encoding_override=encoding_override)
+
+def _should_stream(path: str, ext: str, format: str) -> bool:
+    """超过 file_extraction.max_file_size 的 TXT/MD/EPUB 走流式分块(markdown 输出需要整文件转换,不流式)"""
+    if format != "text" or ext not in STREAM_EXTENSIONS:
+        return False
+    return os.path.getsize(path) > get_settings().file_extraction.max_file_size
 
 
 async def ingest_file_stream(path: str, model_id: str = "text-embedding-3-small", format: str = "text", encoding: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
     """
     统一文本接入管线(SSE 生成器):
     - 解析(带缓存)→ 段落拆分 → 批处理(分类+向量化) → 入库
-    - 事件:parsed/progress/batch_error/complete/error
+    - 分类先批量查询分类缓存,仅未命中的段落调用模型
+    - 事件:parsed/progress/batch_error/classified/complete/error
     - parsed 事件携带 encoding/confidence 与 2KB preview
+    - 大文件(见 _should_stream)按段落边界分块流式处理,每批处理完即入库
     """
     try:
         ext = os.path.splitext(path)[1].lower()
-        bucket = int(time.time() // (7 * 24 * 3600))  # 7 天桶
-        md5_hex = _md5_file(path)
+        if _should_stream(path, ext, format):
+            async for evt in _ingest_streamed(path, model_id, encoding):
+                yield evt
+            return
 
-        parsed = _cached_parse(bucket, md5_hex, format, ext, path, encoding)
+        # 解析结果按文件内容缓存在磁盘上(多 worker 共享),未命中时在进程池中解析
+        parsed = await get_parse_cache().get_or_parse(path, format=format, encoding_override=encoding)
         meta = parsed.get("meta", {})
         text_full = parsed.get("text", "")
         preview = text_full[:2048] if text_full else ""
@@ -60,17 +81,17 @@ async def ingest_file_stream(path: str, model_id: str = "text-embedding-3-small"
             yield sse_error_event(DomainError.EMPTY_TEXT, "无法从文件中提取文本")
             return
 
-        paragraphs = split_into_semantic_paragraphs(text)
+        paragraphs = await run_cpu(split_into_semantic_paragraphs, text)
 
         if not paragraphs:
             yield sse_error_event(DomainError.NO_PARAGRAPHS, "未能拆分得到有效段落")
             return
 
         # 批处理:按段落分批(100 段/批),仅输出 batch 级进度与错误
-        BATCH_SIZE = 100
         total_batches = (len(paragraphs) + BATCH_SIZE - 1) // BATCH_SIZE
         all_metas: List[Dict[str, Any]] = []
         all_vectors: List[List[float]] = []
+        classify_cache_hits = 0
         for batch_idx in range(total_batches):
             start = batch_idx * BATCH_SIZE
             end = min(start + BATCH_SIZE, len(paragraphs))
@@ -86,45 +107,24 @@ async def ingest_file_stream(path: str, model_id: str = "text-embedding-3-small"
 
             # 分类(指数退避)
             try:
-                metas: List[Dict[str, Any]] = []
-                for attempt in (1, 2, 3):
-                    try:
-                        metas = await classify_paragraphs(part)
-                        break
-                    except Exception as e:
-                        if attempt == 3:
-                            raise e
-                        await asyncio.sleep(2 ** (attempt - 1))
+                metas, hits = await _with_retry(lambda: classify_paragraphs_cached(part))
+                classify_cache_hits += hits
                 all_metas.extend(metas)
             except Exception as e:
-                ts = time.strftime("%Y-%m-%d %H:%M:%S")
-                summary = f"{ts} 第{batch_idx + 1}批 {str(e)}"
-                yield {"event": "batch_error", "data": json.dumps({
-                    "batchIndex": batch_idx + 1,
-                    "message": str(e),
-                    "error": summary
-                })}
+                yield _batch_error_event(batch_idx, e)
 
             # 向量化(指数退避)
             try:
-                vectors: List[List[float]] = []
-                for attempt in (1, 2, 3):
-                    try:
-                        vectors = await embed_paragraphs(part, embedding_model=model_id)
-                        break
-                    except Exception as e:
-                        if attempt == 3:
-                            raise e
-                        await asyncio.sleep(2 ** (attempt - 1))
+                vectors = await _with_retry(lambda: embed_paragraphs(part, embedding_model=model_id))
                 all_vectors.extend(vectors)
             except Exception as e:
-                ts = time.strftime("%Y-%m-%d %H:%M:%S")
-                summary = f"{ts} 第{batch_idx + 1}批 {str(e)}"
-                yield {"event": "batch_error", "data": json.dumps({
-                    "batchIndex": batch_idx + 1,
-                    "message": str(e),
-                    "error": summary
-                })}
+                yield _batch_error_event(batch_idx, e)
+
+        yield {"event": "classified", "data": json.dumps({
+            "count": len(all_metas),
+            "cacheHits": classify_cache_hits,
+            "cacheHitRate": round(classify_cache_hits / len(paragraphs), 4),
+        })}
 
         # 入库
         db = await get_db_service()
@@ -153,7 +153,114 @@ async def ingest_file_stream(path: str, model_id: str = "text-embedding-3-small"
                 "embedding_model": model_id,
             })
         await db.insert_paragraphs(rows)
+        db.schedule_book_vector_index(book_id)
 
         yield {"event": "complete", "data": json.dumps({"docId": doc_id})}
     except Exception as e:
         yield sse_error_event(DomainError.INGEST_ERROR, str(e))
+
+
+async def _ingest_streamed(path: str, model_id: str, encoding: Optional[str]) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    流式接入: 文本块 -> 段落流 -> 每 BATCH_SIZE 段分类+向量化+入库
+    - 全文不驻留内存,进度按已读取字节估算(totalBatches 为估计值)
+    - 文档记录先于段落写入,content 只保存正文前缀
+    """
+    stream = open_text_stream(path, encoding_override=encoding)
+    meta = stream.meta
+    chunks = stream.__aiter__()
+    try:
+        head = await chunks.__anext__()
+    except StopAsyncIteration:
+        head = ""
+    yield {"event": "parsed", "data": json.dumps({
+        "path": path,
+        "encoding": meta.get("encoding"),
+        "confidence": meta.get("confidence"),
+        "meta": meta,
+        "preview": head[:2048],
+    })}
+    if not head.strip():
+        yield sse_error_event(DomainError.EMPTY_TEXT, "无法从文件中提取文本")
+        return
+
+    async def _chunks():
+        yield head
+        async for chunk in chunks:
+            yield chunk
+
+    paragraphs = split_paragraphs_stream(_chunks()).__aiter__()
+
+    async def _next_batch() -> List[str]:
+        part: List[str] = []
+        async for para in paragraphs:
+            part.append(para)
+            if len(part) >= BATCH_SIZE:
+                break
+        return part
+
+    part = await _next_batch()
+    if not part:
+        yield sse_error_event(DomainError.NO_PARAGRAPHS, "未能拆分得到有效段落")
+        return
+
+    db = await get_db_service()
+    doc_id = await db.insert_document(
+        title=meta.get("title") or os.path.basename(path),
+        content=head[:STREAM_DOC_CONTENT_CHARS],
+        embedding=None,
+        content_type="book",
+        source=path,
+        doc_metadata={**meta, "content_truncated": True},
+    )
+    book_id = f"doc-{doc_id}"
+
+    batch_idx = 0
+    total = 0
+    classified = 0
+    classify_cache_hits = 0
+    while part:
+        fraction = stream.bytes_read / stream.total_bytes if stream.total_bytes else 1.0
+        est_batches = max(batch_idx + 1, math.ceil((batch_idx + 1) / fraction) if fraction > 0 else batch_idx + 1)
+        yield {"event": "progress", "data": json.dumps({
+            "batchIndex": batch_idx + 1,
+            "totalBatches": est_batches,
+            "percent": min(99, int(fraction * 100)),
+        })}
+
+        metas: List[Dict[str, Any]] = []
+        try:
+            metas, hits = await _with_retry(lambda: classify_paragraphs_cached(part))
+            classify_cache_hits += hits
+            classified += len(metas)
+        except Exception as e:
+            yield _batch_error_event(batch_idx, e)
+
+        vectors: List[List[float]] = []
+        try:
+            vectors = await _with_retry(lambda: embed_paragraphs(part, embedding_model=model_id))
+        except Exception as e:
+            yield _batch_error_event(batch_idx, e)
+
+        await db.insert_paragraphs([{
+            "book_id": book_id,
+            "chapter_index": None,
+            "section_index": None,
+            "paragraph_index": total + i,
+            "content": content,
+            "meta": metas[i] if i < len(metas) else {},
+            "embedding": vectors[i] if i < len(vectors) else None,
+            "embedding_model": model_id,
+        } for i, content in enumerate(part)])
+
+        total += len(part)
+        batch_idx += 1
+        part = await _next_batch()
+
+    yield {"event": "classified", "data": json.dumps({
+        "count": classified,
+        "cacheHits": classify_cache_hits,
+        "cacheHitRate": round(classify_cache_hits / total, 4),
+    })}
+    db.schedule_book_vector_index(book_id)
+    yield {"event": "complete", "data": json.dumps({"docId": doc_id, "paragraphs": total})}
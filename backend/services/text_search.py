@@ -0,0 +1,311 @@
+"""
+全文检索与混合检索
+1. documents / paragraphs 新增存储列 search_tsv tsvector + GIN 索引,查询不再逐行计算 to_tsvector;
+   旧的 to_tsvector('english', ...) 切不开中文,且与向量条件 OR 在一起,任何索引都用不上
+2. 分词方式由 DatabaseSettings.text_search_config 决定:
+   - 留空(默认): 应用侧 jieba 搜索引擎模式分词,入库时直接写入词位与位置(COPY 走二进制编码);
+     查询同样由 jieba 分词后拼成 tsquery 文本,不经 PG 解析器,保证与入库词位一致
+   - PG 文本检索配置名(如 zhparser 建的 chinese): 由 BEFORE INSERT/UPDATE 触发器按该配置计算,
+     查询用 plainto_tsquery(配置, 词) 逐词 OR 组合
+3. 混合检索: 文本(GIN)与 ANN(HNSW/IVFFlat,见 ann_query)两路各自取候选、各自排名,
+   在同一条 SQL 内按加权 RRF(score = Σ w / (k + rank))或加权分数融合,一次往返返回结果
+"""
+
+import re
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import get_settings
+from services.ann_query import AnnQuery, _apply_search_params, is_partition_indexed, search_params
+
+settings = get_settings()
+
+TSV_COLUMN = "search_tsv"
+# 与旧表达式索引一致的截断,避免 tsvector 1MB 上限
+TEXT_MAX_CHARS = 300000
+# 各表参与全文检索的文本列
+TEXT_SEARCH_SOURCES: Dict[str, Tuple[str, ...]] = {
+    "documents": ("title", "content"),
+    "paragraphs": ("content",),
+}
+# jieba 模式的词标识,记录在列注释中;与当前配置不一致时清空重算
+JIEBA_MODE = "jieba"
+
+# tsvector 限制: 词位 < 2KB,每个词位最多 256 个位置,位置 < 16384
+MAX_LEXEME_BYTES = 2047
+MAX_POSITIONS = 256
+MAX_POSITION = 16383
+MAX_QUERY_TERMS = 32
+
+FUSION_MODES = ("rrf", "weighted")
+
+_TOKEN_RE = re.compile(r"\w+")
+_CONFIG_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+# 高频虚词不入索引也不参与查询(否则 OR 查询几乎命中全表)
+STOP_WORDS = frozenset(
+    "的 了 是 在 和 与 及 或 也 就 都 而 之 于 把 被 让 给 着 过 这 那 个 吗 呢 吧 啊 呀 "
+    "我 你 他 她 它 们 有 又 还 并 但 则 即 对 从 向 以 为 a an the of to and or in on is are".split()
+)
+
+Lexemes = List[Tuple[str, List[int]]]
+
+
+def text_search_config() -> Optional[str]:
+    """PG 文本检索配置名;None 表示应用侧 jieba 分词"""
+    name = (settings.database.text_search_config or "").strip()
+    if not name or name == JIEBA_MODE:
+        return None
+    if not _CONFIG_RE.match(name):
+        raise ValueError(f"invalid text search config: {name}")
+    return name
+
+
+def tsv_mode() -> str:
+    return text_search_config() or JIEBA_MODE
+
+
+def source_text(table: str, row: Dict[str, Any]) -> str:
+    return " ".join(str(row.get(c) or "") for c in TEXT_SEARCH_SOURCES[table])[:TEXT_MAX_CHARS]
+
+
+def _tokens(text: str) -> Iterable[str]:
+    if not text:
+        return
+    import jieba
+
+    for token in jieba.cut_for_search(text):
+        token = token.strip().lower()
+        if (token and token not in STOP_WORDS and _TOKEN_RE.fullmatch(token)
+                and len(token.encode("utf-8")) <= MAX_LEXEME_BYTES):
+            yield token
+
+
+def build_lexemes(text: str) -> Lexemes:
+    """jieba 分词 → [(词位, [位置...])],位置从 1 开始按词序递增,超出上限的出现只计词位"""
+    positions: Dict[str, List[int]] = {}
+    for pos, token in enumerate(_tokens((text or "")[:TEXT_MAX_CHARS]), start=1):
+        slots = positions.setdefault(token, [])
+        if pos <= MAX_POSITION and len(slots) < MAX_POSITIONS:
+            slots.append(pos)
+    return list(positions.items())
+
+
+def build_lexemes_batch(texts: List[str]) -> List[Lexemes]:
+    """批量分词(供 cpu_executor.map_cpu 分片调用)"""
+    return [build_lexemes(t) for t in texts]
+
+
+def _quote(term: str) -> str:
+    return "'" + term.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def tsvector_literal(lexemes: Lexemes) -> str:
+    """tsvector 文本形式,用于 CAST(:tsv AS tsvector)
+
+    无词位时为空 tsvector 而非 NULL: search_tsv IS NULL 只表示尚未计算(待回填)
+    """
+    return " ".join(
+        _quote(lex) + (":" + ",".join(map(str, pos)) if pos else "") for lex, pos in lexemes
+    )
+
+
+def encode_tsvector_binary(value: Lexemes) -> bytes:
+    """tsvector 二进制线格式(tsvectorrecv): int32 词位数,每个词位为 \\0 结尾字符串 + uint16 位置数 + uint16 位置"""
+    parts = [struct.pack(">i", len(value))]
+    for lexeme, positions in value:
+        parts.append(lexeme.encode("utf-8") + b"\0")
+        parts.append(struct.pack(f">H{len(positions)}H", len(positions), *positions))
+    return b"".join(parts)
+
+
+def decode_tsvector_binary(data: bytes) -> Lexemes:
+    (count,), offset = struct.unpack_from(">i", data), 4
+    lexemes: Lexemes = []
+    for _ in range(count):
+        end = data.index(b"\0", offset)
+        lexeme = data[offset:end].decode("utf-8")
+        (npos,) = struct.unpack_from(">H", data, end + 1)
+        positions = list(struct.unpack_from(f">{npos}H", data, end + 3))
+        lexemes.append((lexeme, [p & MAX_POSITION for p in positions]))
+        offset = end + 3 + 2 * npos
+    return lexemes
+
+
+def query_terms(text: str) -> List[str]:
+    """查询分词(去重保序,最多 MAX_QUERY_TERMS 个)"""
+    return list(dict.fromkeys(_tokens(text)))[:MAX_QUERY_TERMS]
+
+
+def query_param(text: str) -> Any:
+    """tsquery 参数值: jieba 模式为 tsquery 文本('a' | 'b'),配置模式为词数组;无有效词时为 None"""
+    terms = query_terms(text)
+    if not terms:
+        return None
+    if text_search_config():
+        return terms
+    return " | ".join(_quote(t) for t in terms)
+
+
+def tsquery_expression(param: str) -> str:
+    """由 query_param 的占位符构造 tsquery 表达式"""
+    config = text_search_config()
+    if config is None:
+        return f"{param}::tsquery"
+    tsq = f"plainto_tsquery('{config}'::regconfig, term)"
+    return (
+        f"(SELECT string_agg({tsq}::text, ' | ') FROM unnest({param}::text[]) AS term "
+        f"WHERE numnode({tsq}) > 0)::tsquery"
+    )
+
+
+def _source_expression(table: str, prefix: str = "") -> str:
+    joined = " || ' ' || ".join(f"coalesce({prefix}{c}, '')" for c in TEXT_SEARCH_SOURCES[table])
+    return f"left({joined}, {TEXT_MAX_CHARS})"
+
+
+def ddl_statements(table: str) -> List[str]:
+    """search_tsv 列、GIN 索引与(配置模式下的)维护触发器"""
+    config = text_search_config()
+    function = f"{table}_search_tsv_update"
+    trigger = f"{table}_search_tsv_trigger"
+    statements = [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {TSV_COLUMN} tsvector",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_{TSV_COLUMN} ON {table} USING gin ({TSV_COLUMN})",
+        f"DROP TRIGGER IF EXISTS {trigger} ON {table}",
+    ]
+    if config is not None:
+        columns = ", ".join(TEXT_SEARCH_SOURCES[table])
+        statements += [
+            f"""
+            CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+            BEGIN
+                NEW.{TSV_COLUMN} := to_tsvector('{config}'::regconfig, {_source_expression(table, "NEW.")});
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            f"CREATE TRIGGER {trigger} BEFORE INSERT OR UPDATE OF {columns} ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+        ]
+    else:
+        statements.append(f"DROP FUNCTION IF EXISTS {function}()")
+    return statements
+
+
+def refresh_statement(table: str) -> str:
+    """配置模式下回填一批 search_tsv 为空的行($1 为批大小;jieba 模式由应用分词后写入)"""
+    return (
+        f"UPDATE {table} SET {TSV_COLUMN} = to_tsvector('{text_search_config()}'::regconfig, "
+        f"{_source_expression(table)}) WHERE id IN ("
+        f"SELECT id FROM {table} WHERE {TSV_COLUMN} IS NULL ORDER BY id LIMIT $1)"
+    )
+
+
+class HybridQuery:
+    """
+    混合检索查询构造器
+
+    用法:
+        q = HybridQuery("paragraphs", ["id", "content", "meta"]).where("is_active = true")
+        q.partition("book_id", book_id)
+        sql, params = q.build(query_text, query_vec, limit=10)
+
+    两路共用 where() 过滤条件;ANN 路由 AnnQuery 构造(含分区索引路由与二值预筛),
+    文本路走 search_tsv GIN 索引,各取 candidate_count(limit) 个候选后按排名融合
+    """
+
+    def __init__(self, table: str, columns: Sequence[str]):
+        if table not in TEXT_SEARCH_SOURCES:
+            raise ValueError(f"unsupported hybrid search table: {table}")
+        self.table = table
+        self.columns = list(columns)
+        self.ann = AnnQuery(table, ["id"])
+        self._filters: List[Tuple[str, Tuple[Any, ...]]] = []
+
+    def where(self, clause: str, *values) -> "HybridQuery":
+        self.ann.where(clause, *values)
+        self._filters.append((clause, values))
+        return self
+
+    def partition(self, column: str, value: Any) -> "HybridQuery":
+        self.ann.partition(column, value)
+        self._filters.append((f"{column} = {{}}", (value,)))
+        return self
+
+    def build(self, query_text: str, query_vec: Any, limit: int, text_weight: float = 0.3,
+              vector_weight: float = 0.7, fusion: str = "rrf", rrf_k: Optional[int] = None,
+              partition_indexed: bool = False) -> Tuple[str, List[Any]]:
+        """生成 ($n 参数化 SQL, 参数列表)"""
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"fusion must be one of {FUSION_MODES}")
+        # 两路候选数均为 limit × overfetch;ANN 路无阈值,内层不再二次放大
+        candidates = self.ann.candidate_count(limit)
+        ann_sql, params = self.ann.build(query_vec, candidates, overfetch=1.0,
+                                         partition_indexed=partition_indexed)
+
+        def next_param(value: Any) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        filters = [f"t.{TSV_COLUMN} @@ q.query"]
+        for clause, values in self._filters:
+            for value in values:
+                clause = clause.replace("{}", next_param(value), 1)
+            filters.append(clause)
+        tsquery = tsquery_expression(next_param(query_param(query_text)))
+        text_limit = next_param(candidates)
+        tw = next_param(float(text_weight)) + "::float8"
+        vw = next_param(float(vector_weight)) + "::float8"
+        if fusion == "rrf":
+            k = next_param(int(rrf_k if rrf_k is not None else settings.database.hybrid_rrf_k)) + "::int"
+            score = (f"coalesce({tw} / ({k} + f.text_rank), 0) + "
+                     f"coalesce({vw} / ({k} + f.vector_rank), 0)")
+        else:
+            # ts_rank 无上界,按本次文本路最高分归一化后与余弦相似度加权
+            score = (f"coalesce({tw} * f.text_score / nullif(max(f.text_score) OVER (), 0), 0) + "
+                     f"coalesce({vw} * f.vector_score, 0)")
+        columns = ", ".join(f"d.{c}" for c in self.columns)
+        sql = (
+            f"WITH ann AS (\n{ann_sql}\n),\n"
+            f"ann_ranked AS (\n"
+            f"    SELECT id, similarity, row_number() OVER (ORDER BY distance) AS vector_rank FROM ann\n"
+            f"),\n"
+            f"text_hits AS (\n"
+            f"    SELECT t.id, ts_rank(t.{TSV_COLUMN}, q.query) AS text_score,\n"
+            f"           row_number() OVER (ORDER BY ts_rank(t.{TSV_COLUMN}, q.query) DESC, t.id) AS text_rank\n"
+            f"    FROM {self.table} AS t CROSS JOIN (SELECT {tsquery} AS query) AS q\n"
+            f"    WHERE {' AND '.join(filters)}\n"
+            f"    ORDER BY text_rank\n"
+            f"    LIMIT {text_limit}\n"
+            f"),\n"
+            f"fused AS (\n"
+            f"    SELECT id, th.text_score, a.similarity AS vector_score, th.text_rank, a.vector_rank\n"
+            f"    FROM text_hits AS th FULL OUTER JOIN ann_ranked AS a USING (id)\n"
+            f")\n"
+            f"SELECT {columns}, f.text_score, f.vector_score, f.text_rank, f.vector_rank,\n"
+            f"       {score} AS combined_score\n"
+            f"FROM fused AS f JOIN {self.table} AS d ON d.id = f.id\n"
+            f"ORDER BY combined_score DESC, f.id\n"
+            f"LIMIT {next_param(limit)}"
+        )
+        return sql, params
+
+
+async def fetch_hybrid(query: HybridQuery, query_text: str, query_vec: Any, limit: int,
+                       text_weight: float = 0.3, vector_weight: float = 0.7, fusion: str = "rrf",
+                       rrf_k: Optional[int] = None, ef_search: Optional[int] = None,
+                       probes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """在共享连接池上执行混合检索(与 fetch_ann 相同,事务内设置本次 ANN 参数)"""
+    from services.pg_pool import get_pg_pool
+
+    indexed = await is_partition_indexed(query.ann)
+    sql, params = query.build(query_text, query_vec, limit, text_weight, vector_weight,
+                              fusion, rrf_k, partition_indexed=indexed)
+    candidates = query.ann.candidate_count(limit)
+    ef, n_probes = search_params(query.ann.index_candidates(candidates, 1.0, indexed), ef_search, probes)
+    pg = await get_pg_pool()
+    async with pg.acquire() as conn:
+        async with conn.transaction():
+            await _apply_search_params(conn, ef, n_probes)
+            rows = await conn.fetch(sql, *params)
+    return [dict(r) for r in rows]
@@ -0,0 +1,113 @@
+"""
+按表的向量存储模式
+- vector: float32(默认),1536 维约 6KB/列
+- halfvec: float16(pgvector >= 0.7),体积与索引减半,余弦检索召回损失通常可忽略
+- "+bit": 另建 binary_quantize(embedding)::bit(N) 表达式 HNSW 索引,检索时先按汉明距离预筛
+  较多候选,再用全精度(vector/halfvec)距离重排;不新增列,写入路径不变
+
+配置见 DatabaseSettings.vector_storage;列类型与索引的转换由 migrations/migrate_vector_storage.py
+按 migration_statements() 生成的语句执行
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+from config import get_settings
+
+settings = get_settings()
+
+# 各表的向量列;第一列为检索列(二值预筛索引只建在检索列上)
+VECTOR_COLUMNS: Dict[str, Sequence[str]] = {
+    "documents": ("embedding",),
+    "paragraphs": ("embedding", "paragraph_bias", "enhanced_embedding"),
+    "memory_high": ("embedding", "centroid_embedding"),
+    "memory_low": ("embedding", "centroid_embedding"),
+}
+
+PRECISIONS = ("vector", "halfvec")
+
+_OPCLASS_RE = re.compile(r"\b(?:vector|halfvec)_(cosine|l2|ip)_ops\b")
+
+
+@dataclass(frozen=True)
+class StorageMode:
+    precision: str = "vector"
+    binary: bool = False
+
+    @classmethod
+    def parse(cls, value: str) -> "StorageMode":
+        """'vector' / 'halfvec' / 'halfvec+bit' / 'vector+bit'"""
+        parts = [p.strip() for p in (value or "vector").lower().split("+")]
+        precision, flags = parts[0], set(parts[1:])
+        if precision not in PRECISIONS or not flags <= {"bit"}:
+            raise ValueError(f"invalid vector storage mode: {value}")
+        return cls(precision, "bit" in flags)
+
+    def column_type(self, dimension: int) -> str:
+        return f"{self.precision}({dimension})"
+
+    @property
+    def opclass(self) -> str:
+        return f"{self.precision}_cosine_ops"
+
+    def __str__(self) -> str:
+        return self.precision + ("+bit" if self.binary else "")
+
+
+def storage_mode(table: str) -> StorageMode:
+    return StorageMode.parse(settings.database.vector_storage.get(table, "vector"))
+
+
+def bit_expression(column: str, dimension: int) -> str:
+    """二值量化表达式,查询中的 ORDER BY 必须与索引表达式一致才能走索引"""
+    return f"(binary_quantize({column})::bit({dimension}))"
+
+
+def binary_index_name(table: str, column: str = "embedding") -> str:
+    return f"idx_{table}_{column}_bq_hnsw"
+
+
+def migration_statements(table: str, mode: StorageMode, column_types: Dict[str, str],
+                         indexes: Sequence[Dict[str, str]], dimension: int) -> List[str]:
+    """生成把表转换到目标存储模式的 DDL
+
+    Args:
+        column_types: {列名: 当前 udt_name},不存在的列不处理
+        indexes: 表上现有索引 [{index_name, column, indexdef}],column 为索引首列
+        dimension: 向量维度
+
+    转换列类型前先删掉该列上的向量索引(操作符类与类型绑定),转换后按原定义换用新操作符类重建
+    """
+    statements: List[str] = []
+    columns = [c for c in VECTOR_COLUMNS.get(table, ()) if c in column_types]
+    bq_name = binary_index_name(table)
+    for column in columns:
+        if column_types[column] == mode.precision:
+            continue
+        rebuild = [
+            ix for ix in indexes
+            if ix["column"] == column and _OPCLASS_RE.search(ix["indexdef"]) and ix["index_name"] != bq_name
+        ]
+        for ix in rebuild:
+            statements.append(f"DROP INDEX IF EXISTS {ix['index_name']}")
+        statements.append(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {mode.column_type(dimension)} "
+            f"USING {column}::{mode.column_type(dimension)}"
+        )
+        for ix in rebuild:
+            statements.append(_OPCLASS_RE.sub(lambda m: f"{mode.precision}_{m.group(1)}_ops", ix["indexdef"]))
+
+    search_column = VECTOR_COLUMNS.get(table, ("embedding",))[0]
+    has_bq = any(ix["index_name"] == bq_name for ix in indexes)
+    retype = search_column in columns and column_types[search_column] != mode.precision
+    if has_bq and (not mode.binary or retype):
+        # 列类型变化时表达式索引随列一起失效,重建
+        statements.insert(0, f"DROP INDEX IF EXISTS {bq_name}")
+        has_bq = False
+    if mode.binary and not has_bq and search_column in column_types:
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {bq_name} ON {table} "
+            f"USING hnsw ({bit_expression(search_column, dimension)} bit_hamming_ops)"
+        )
+    return statements
@@ -0,0 +1,31 @@
+import asyncio
+
+from services.ai_service import AIService, close_shared_session, get_http_client_stats
+
+
+def test_ai_services_borrow_one_shared_session():
+    async def run():
+        first, second = AIService(), AIService()
+        session = await first._get_session()
+        assert await second._get_session() is session
+        # async with 不再关闭共享会话
+        async with AIService() as ai:
+            assert await ai._get_session() is session
+        assert not session.closed
+        assert get_http_client_stats()["session_open"]
+
+        await close_shared_session()
+        assert session.closed
+        assert not get_http_client_stats()["session_open"]
+
+    asyncio.run(run())
+
+
+def test_shared_session_is_recreated_for_a_new_event_loop():
+    async def grab():
+        return await AIService()._get_session()
+
+    first = asyncio.run(grab())
+    second = asyncio.run(grab())
+    assert first is not second
+    asyncio.run(close_shared_session())
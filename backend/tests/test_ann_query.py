@@ -0,0 +1,141 @@
+import asyncio
+import os
+
+import pytest
+
+import services.ann_query as aq
+from services.ann_query import AnnQuery, MAX_EF_SEARCH, explain_ann, search_params
+from services.pg_pool import PgPool
+from services.vector_storage import StorageMode
+
+
+def _inner(sql):
+    return sql.split("FROM (", 1)[1].split(") AS candidates", 1)[0]
+
+
+def test_threshold_is_applied_outside_the_ann_subquery():
+    query = AnnQuery("paragraphs", ["id", "content", "meta"]).where("is_active = true")
+    query.where("book_id = {}", "book-1")
+    sql, params = query.build([0.1, 0.2, 0.3], limit=10, threshold=0.8, overfetch=4)
+
+    inner = _inner(sql)
+    inner_where = inner.split("WHERE", 1)[1].split("ORDER BY", 1)[0]
+    # 内层 WHERE 不含距离谓词,只有普通过滤
+    assert "<=>" not in inner_where
+    assert "book_id = $2" in inner_where
+    assert "ORDER BY embedding <=> $1::vector" in inner
+    assert "LIMIT $3" in inner
+    assert "1 - candidates.distance >= $4" in sql
+    assert sql.rstrip().endswith("LIMIT $5")
+    assert params == [[0.1, 0.2, 0.3], "book-1", 40, 0.8, 10]
+
+
+def test_without_threshold_skips_outer_filter():
+    sql, params = AnnQuery("documents", ["id"]).build([0.0], limit=5, overfetch=1)
+    assert "candidates.distance >=" not in sql
+    assert params == [[0.0], 5, 5]
+
+
+def test_candidate_count_and_ef_search_bounds():
+    query = AnnQuery("documents", ["id"])
+    assert query.candidate_count(10, overfetch=0.5) == 10
+    assert query.candidate_count(10, overfetch=4) == 40
+    big = query.candidate_count(5000, overfetch=4)
+    assert big == 5000  # 不少于 limit
+
+    assert search_params(40, ef_search=16, probes=3) == (40, 3)
+    assert search_params(10, ef_search=200, probes=0) == (200, 1)
+    assert search_params(5000)[0] == MAX_EF_SEARCH
+
+
+def test_halfvec_storage_casts_query_vector():
+    sql, _ = AnnQuery("paragraphs", ["id"], storage=StorageMode("halfvec")).build([0.0], limit=5)
+    assert "embedding <=> $1::halfvec" in sql
+    assert "::vector" not in sql
+
+
+def test_binary_prefilter_reranks_with_full_precision():
+    query = AnnQuery("paragraphs", ["id", "content"], storage=StorageMode("halfvec", True))
+    query.where("book_id = {}", "doc-1")
+    sql, params = query.build([0.1], limit=10, threshold=0.5, overfetch=4)
+
+    prefilter = sql.split("AS prefiltered", 1)[0]
+    assert "ORDER BY (binary_quantize(embedding)::bit(1536)) <~> binary_quantize($1::halfvec)::bit(1536)" in prefilter
+    assert "SELECT id, content, embedding\n" in prefilter
+    rerank = sql.split("AS prefiltered", 1)[1]
+    assert "ORDER BY embedding <=> $1::halfvec" in rerank
+    # $2 过滤值, $3 预筛数, $4 重排候选数, $5 阈值, $6 limit
+    assert params == [[0.1], "doc-1", 160, 40, 0.5, 10]
+    assert query.index_candidates(10, overfetch=4) == 160
+
+    # 有专属部分索引的书不经二值预筛
+    query.partition("book_id", "doc-2")
+    sql, _ = query.build([0.1], limit=10, partition_indexed=True)
+    assert "prefiltered" not in sql
+    assert query.index_candidates(10, partition_indexed=True) == 40
+
+
+def test_where_rejects_mismatched_placeholders():
+    with pytest.raises(ValueError):
+        AnnQuery("documents", ["id"]).where("book_id = {}")
+
+
+def test_partition_value_is_inlined_only_when_indexed():
+    query = AnnQuery("paragraphs", ["id"]).where("is_active = true").partition("book_id", "o'neil")
+
+    sql, params = query.build([0.0], limit=10, partition_indexed=True)
+    assert "book_id = 'o''neil'" in _inner(sql)
+    assert params == [[0.0], 40, 10]
+
+    sql, params = query.build([0.0], limit=10)
+    assert "book_id = $2" in _inner(sql)
+    assert params == [[0.0], "o'neil", 40, 10]
+
+
+def test_partition_registry_routes_from_vector_indexes(monkeypatch):
+    class _Conn:
+        async def fetch(self, sql):
+            return [
+                {"table_name": "paragraphs", "index_params": {"m": 16, "partition": {"column": "book_id", "value": "doc-1"}}},
+                {"table_name": "paragraphs", "index_params": '{"partition": {"column": "book_id", "value": "doc-2"}}'},
+            ]
+
+    monkeypatch.setattr(aq, "_partition_cache", {})
+    monkeypatch.setattr(aq, "_partition_loaded_at", 0.0)
+    conn = _Conn()
+    big = AnnQuery("paragraphs", ["id"]).partition("book_id", "doc-2")
+    small = AnnQuery("paragraphs", ["id"]).partition("book_id", "doc-3")
+
+    assert asyncio.run(aq.is_partition_indexed(big, conn))
+    assert not asyncio.run(aq.is_partition_indexed(small, conn))
+    assert not asyncio.run(aq.is_partition_indexed(AnnQuery("paragraphs", ["id"]), conn))
+
+    aq.register_partition_index("paragraphs", "book_id", "doc-3")
+    assert asyncio.run(aq.is_partition_indexed(small, conn))
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL not set")
+def test_explain_uses_hnsw_index():
+    asyncpg = pytest.importorskip("asyncpg")
+
+    async def run():
+        conn = await asyncpg.connect(os.environ["TEST_DATABASE_URL"])
+        try:
+            await conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+            await PgPool._init_connection(conn)
+            await conn.execute("CREATE TEMP TABLE ann_probe (id serial PRIMARY KEY, embedding vector(3))")
+            # 不关闭 seqscan: 表足够大时顺序扫描 + 排序的代价更高,计划器应自行选择 HNSW 索引
+            await conn.execute(
+                "INSERT INTO ann_probe (embedding) "
+                "SELECT ARRAY[random(), random(), random()]::vector FROM generate_series(1, 50000)"
+            )
+            await conn.execute("CREATE INDEX ON ann_probe USING hnsw (embedding vector_cosine_ops)")
+            await conn.execute("ANALYZE ann_probe")
+            query = AnnQuery("ann_probe", ["id"])
+            return await explain_ann(conn, query, [0.1, 0.2, 0.3], limit=10, threshold=0.5)
+        finally:
+            await conn.close()
+
+    plan = asyncio.run(run())
+    assert "ann_probe_embedding_idx" in plan
+    assert "Seq Scan" not in plan
@@ -0,0 +1,167 @@
+import asyncio
+
+from services import batch_ingest_service as bis
+
+
+class _FakeAI:
+    def __init__(self, log):
+        self.log = log
+
+    async def get_embeddings(self, texts, model_id=None):
+        self.log.append(("embed_start", texts[0]))
+        await asyncio.sleep(0.01)
+        return [[float(len(t))] for t in texts]
+
+
+class _FakeDB:
+    def __init__(self, log, fail_on=None):
+        self.rows = []
+        self.log = log
+        self.fail_on = fail_on
+
+    async def insert_document(self, **kwargs):
+        return 7
+
+    async def insert_paragraphs(self, rows):
+        await asyncio.sleep(0.01)
+        if self.fail_on is not None and any(r["paragraph_index"] == self.fail_on for r in rows):
+            raise RuntimeError("insert failed")
+        self.rows.extend(rows)
+        self.log.append(("inserted", rows[0]["content"]))
+
+    def schedule_book_vector_index(self, book_id):
+        self.log.append(("book_index", book_id))
+
+
+def _patch(monkeypatch, paragraphs, db, log):
+    async def classify(batch, **kwargs):
+        log.append(("classify_start", batch[0]))
+        await asyncio.sleep(0.01)
+        # 偶数段视为缓存命中
+        hits = sum(1 for p in batch if int(p[2:]) % 2 == 0)
+        return [{"category": "narrative"} for _ in batch], hits
+
+    async def get_db():
+        return db
+
+    async def get_ai():
+        return _FakeAI(log)
+
+    class _FakeParseCache:
+        async def get_or_parse(self, path, **kwargs):
+            return {"text": "\n".join(paragraphs), "meta": {"title": "t"}}
+
+    async def run_inline(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(bis, "get_parse_cache", lambda: _FakeParseCache())
+    monkeypatch.setattr(bis, "run_cpu", run_inline)
+    monkeypatch.setattr(bis, "split_into_semantic_paragraphs", lambda text: list(paragraphs))
+    monkeypatch.setattr(bis, "classify_paragraphs_cached", classify)
+    monkeypatch.setattr(bis, "get_db_service", get_db)
+    monkeypatch.setattr(bis, "get_ai_service", get_ai)
+
+
+def _run(task):
+    async def collect():
+        return [event async for event in task.execute()]
+    return asyncio.run(collect())
+
+
+def test_pipeline_inserts_every_batch_and_reports_progress(monkeypatch):
+    paragraphs = [f"段落{i}" for i in range(50)]
+    log = []
+    db = _FakeDB(log)
+    _patch(monkeypatch, paragraphs, db, log)
+    task = bis.BatchIngestTask("t1", "book.txt", batch_size=8, queue_size=2)
+
+    events = _run(task)
+    names = [e["event"] for e in events]
+
+    assert names[0] == "started"
+    assert names[-1] == "complete"
+    assert names.count("progress") == 7
+    classified = next(e for e in events if e["event"] == "classified")
+    assert classified["data"]["cache_hits"] == 25
+    assert classified["data"]["cache_hit_rate"] == 0.5
+    assert sorted(r["paragraph_index"] for r in db.rows) == list(range(50))
+    assert all(r["book_id"] == "doc-7" for r in db.rows)
+    assert events[-1]["data"]["processed_paragraphs"] == 50
+    assert log[-1] == ("book_index", "doc-7")
+    # 流水线: 首批入库完成前,后续批次已在分类
+    assert log.index(("classify_start", "段落24")) < log.index(("inserted", "段落0"))
+
+
+def test_pipeline_error_surfaces_as_error_event(monkeypatch):
+    paragraphs = [f"段落{i}" for i in range(20)]
+    log = []
+    db = _FakeDB(log, fail_on=9)
+    _patch(monkeypatch, paragraphs, db, log)
+    task = bis.BatchIngestTask("t2", "book.txt", batch_size=4)
+
+    events = _run(task)
+
+    assert events[-1]["event"] == "error"
+    assert task.progress.status == bis.TaskStatus.FAILED
+    assert "insert failed" in task.progress.error_message
+
+
+def test_cancel_stops_pipeline(monkeypatch):
+    paragraphs = [f"段落{i}" for i in range(200)]
+    log = []
+    db = _FakeDB(log)
+    _patch(monkeypatch, paragraphs, db, log)
+    task = bis.BatchIngestTask("t3", "book.txt", batch_size=4)
+
+    async def run():
+        events = []
+        async for event in task.execute():
+            events.append(event)
+            if event["event"] == "progress":
+                task.cancel()
+        return events
+
+    events = asyncio.run(run())
+
+    assert events[-1]["event"] == "cancelled"
+    assert task.progress.status == bis.TaskStatus.CANCELLED
+    assert len(db.rows) < 200
+
+
+def test_stage_failure_cancels_sibling_workers(monkeypatch):
+    paragraphs = [f"段落{i}" for i in range(40)]
+    log = []
+    db = _FakeDB(log)
+    _patch(monkeypatch, paragraphs, db, log)
+
+    async def embed(texts, model_id=None):
+        log.append(("embed_start", texts[0]))
+        if texts[0] == "段落4":
+            raise RuntimeError("embed failed")
+        await asyncio.sleep(0.05)
+        return [[float(len(t))] for t in texts]
+
+    async def get_ai():
+        ai = _FakeAI(log)
+        ai.get_embeddings = embed
+        return ai
+
+    monkeypatch.setattr(bis, "get_ai_service", get_ai)
+    task = bis.BatchIngestTask("t4", "book.txt", batch_size=4, queue_size=2)
+
+    async def run():
+        events = [event async for event in task.execute()]
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        embeds_at_failure = sum(1 for entry in log if entry[0] == "embed_start")
+        # 给残留的 worker 留出时间,确认没有后续调用
+        await asyncio.sleep(0.2)
+        embeds_after = sum(1 for entry in log if entry[0] == "embed_start")
+        return events, pending, embeds_at_failure, embeds_after
+
+    events, pending, embeds_at_failure, embeds_after = asyncio.run(run())
+
+    assert events[-1]["event"] == "error"
+    assert "embed failed" in task.progress.error_message
+    assert pending == []
+    assert embeds_after == embeds_at_failure
+    assert all(r["paragraph_index"] < 4 for r in db.rows)
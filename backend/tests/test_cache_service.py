@@ -0,0 +1,64 @@
+import time
+
+from services.cache_service import LocalCache
+
+
+def test_lru_evicts_least_recently_used_by_entry_count():
+    cache = LocalCache(max_entries=2, max_bytes=1 << 20)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # a 变为最近使用
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.evictions == 1
+
+
+def test_byte_budget_bounds_memory():
+    cache = LocalCache(max_entries=1000, max_bytes=4096)
+    for i in range(100):
+        cache.set(f"k{i}", "x" * 200)
+
+    assert cache.bytes_used <= 4096
+    assert 0 < len(cache) < 100
+    assert cache.evictions == 100 - len(cache)
+    # 单个值超过预算时不缓存
+    assert cache.set("huge", "y" * 10000) is False
+    assert cache.get("huge") is None
+
+
+def test_ttl_expiry_and_redis_style_ttl_codes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LocalCache(max_entries=10, max_bytes=1 << 20)
+    cache.set("short", "v", ttl=5)
+    cache.set("forever", "v")
+
+    assert cache.ttl("short") == 5
+    assert cache.ttl("forever") == -1
+    assert cache.ttl("missing") == -2
+
+    now[0] += 6
+    assert cache.get("short") is None
+    assert cache.expirations == 1
+    assert cache.get("forever") == "v"
+    assert cache.bytes_used == LocalCache._sizeof("forever", "v")
+
+
+def test_clear_pattern_and_stats():
+    cache = LocalCache(max_entries=10, max_bytes=1 << 20)
+    cache.set("model:a", "1")
+    cache.set("model:b", "2")
+    cache.set("file:x", "3")
+
+    assert cache.clear("model:*") == 2
+    assert cache.get("file:x") == "3"
+    assert cache.get("model:a") is None
+
+    stats = cache.get_stats()
+    assert stats["size"] == 1
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
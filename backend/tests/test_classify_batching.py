@@ -0,0 +1,143 @@
+import asyncio
+import json
+import re
+
+from api_framework import ApiException
+from services import classify_service as cs
+
+
+def test_pack_batches_respects_budget_and_item_cap():
+    paragraphs = ["字" * 300, "字" * 300, "字" * 300, "字" * 2000, "a" * 40, "a" * 40]
+    batches = cs.pack_batches(paragraphs, token_budget=700, max_items=2)
+    assert batches == [[0, 1], [2], [3], [4, 5]]
+    assert sorted(i for b in batches for i in b) == list(range(len(paragraphs)))
+
+
+def test_parse_batch_response_keeps_only_valid_items():
+    resp = json.dumps([
+        {"index": 0, "category": "描写", "labels": ["夜"]},
+        {"index": 0, "category": "对话"},      # 重复
+        {"index": 5, "category": "剧情"},      # 越界
+        {"index": 2, "labels": []},           # 缺 category
+        {"index": "1", "category": "对话", "isDialogue": True},
+    ], ensure_ascii=False)
+    parsed = cs.parse_batch_response(resp, 3)
+    assert set(parsed) == {0, 1}
+    assert parsed[0]["category"] == "描写"
+    assert parsed[1]["isDialogue"] is True
+    assert cs.parse_batch_response("不是JSON的说明文字", 3) == {}
+
+
+class _FakeAI:
+    """批量提示时漏掉最后一段;第一次调用返回 429"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def run_agent(self, prompt, model_id=None, parameters=None):
+        self.prompts.append(prompt)
+        if len(self.prompts) == 1:
+            raise ApiException(status_code=429, message="rate limited", details="0")
+        indices = [int(i) for i in re.findall(r"^\[(\d+)\] ", prompt, flags=re.M)]
+        if not indices:
+            return json.dumps({"category": "描写"}, ensure_ascii=False)
+        return json.dumps([{"index": i, "category": "剧情"} for i in indices[:-1]], ensure_ascii=False)
+
+
+def test_batched_classification_retries_missing_and_rate_limited(monkeypatch):
+    ai = _FakeAI()
+
+    async def get_ai():
+        return ai
+
+    monkeypatch.setattr(cs, "get_ai_service", get_ai)
+    paragraphs = [f"第{i}段 山风吹过" for i in range(6)]
+
+    metas = asyncio.run(cs.classify_paragraphs(paragraphs, model_id="fake-model", batched=True))
+
+    assert len(metas) == 6
+    assert all(m["category"] for m in metas)
+    # 429 重试 + 一次批量 + 漏掉的一段走单段提示
+    assert len(ai.prompts) == 3
+    assert [m["category"] for m in metas] == ["剧情"] * 5 + ["描写"]
+
+
+def test_request_errors_retry_once_without_splitting(monkeypatch):
+    prompts = []
+
+    class _DownAI:
+        async def run_agent(self, prompt, model_id=None, parameters=None):
+            prompts.append(prompt)
+            raise ApiException(status_code=503, message="unavailable")
+
+    async def get_ai():
+        return _DownAI()
+
+    monkeypatch.setattr(cs, "get_ai_service", get_ai)
+    paragraphs = [f"第{i}段 山风吹过" for i in range(8)]
+
+    metas = asyncio.run(cs.classify_paragraphs(paragraphs, model_id="down-model", batched=True))
+
+    # 一个批次: 首次请求 + 一次重试,不再对半拆分
+    assert len(prompts) == 1 + cs.REQUEST_ERROR_RETRIES
+    assert metas == [cs.default_meta() for _ in paragraphs]
+
+
+def test_adaptive_concurrency_halves_on_429_and_grows_on_success():
+    async def run():
+        limiter = cs.AdaptiveConcurrency(initial=4, max_limit=8, target_latency=1.0)
+        await limiter.acquire()
+        await limiter.release(rate_limited=True, retry_after=0)
+        assert limiter.limit == 2
+        for _ in range(2):
+            await limiter.acquire()
+            await limiter.release(latency=0.1)
+        assert limiter.limit == 3
+        await limiter.acquire()
+        await limiter.release(latency=5.0)
+        assert limiter.limit == 2
+        assert limiter.get_stats()["rate_limited"] == 1
+
+    asyncio.run(run())
+
+
+class _DictCache:
+    def __init__(self):
+        self.data = {}
+
+    async def get_many(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    async def set_many(self, items, ttl=None):
+        self.data.update(items)
+        return True
+
+
+def test_classification_cache_skips_llm_for_known_paragraphs(monkeypatch):
+    cache = _DictCache()
+    calls = []
+
+    async def get_cache():
+        return cache
+
+    async def classify(paragraphs, model_id=None, concurrency=None):
+        calls.append(list(paragraphs))
+        return [{"category": "描写"} if "失败" not in p else cs.default_meta() for p in paragraphs]
+
+    monkeypatch.setattr(cs, "get_cache", get_cache)
+    monkeypatch.setattr(cs, "classify_paragraphs", classify)
+
+    metas, hits = asyncio.run(cs.classify_paragraphs_cached(["甲", "乙", "失败段"], model_id="m"))
+    assert hits == 0
+    assert calls == [["甲", "乙", "失败段"]]
+    # 分类失败的默认 meta 不缓存
+    assert len(cache.data) == 2
+
+    metas, hits = asyncio.run(cs.classify_paragraphs_cached(["乙", "丙", "甲"], model_id="m"))
+    assert hits == 2
+    assert calls[-1] == ["丙"]
+    assert [m["category"] for m in metas] == ["描写"] * 3
+
+    # 模型或词典版本不同则不共用缓存
+    assert cs.classification_cache_key("甲", "m") != cs.classification_cache_key("甲", "other")
+    assert cs.dictionary_version() in cs.classification_cache_key("甲", "m")
@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+import services.cpu_executor as ce
+
+
+def test_run_cpu_executes_in_worker_process():
+    async def run():
+        try:
+            pid = await ce.run_cpu(os.getpid)
+            value = await ce.run_cpu(int, "ff", base=16)
+            return pid, value
+        finally:
+            ce.shutdown_cpu_executor()
+
+    pid, value = asyncio.run(run())
+    assert pid != os.getpid()
+    assert value == 255
+
+
+def test_map_cpu_preserves_order_across_chunks():
+    items = list(range(103))
+
+    async def run():
+        try:
+            return await ce.map_cpu(list, items, chunk_size=10)
+        finally:
+            ce.shutdown_cpu_executor()
+
+    assert asyncio.run(run()) == items
+    assert asyncio.run(ce.map_cpu(list, [])) == []
+
+
+def test_falls_back_to_threads_without_process_pool(monkeypatch):
+    monkeypatch.setattr(ce, "_executor", None)
+    monkeypatch.setattr(ce, "_disabled", True)
+    before = ce.get_cpu_executor_stats()["thread_fallbacks"]
+
+    assert asyncio.run(ce.run_cpu(sum, [1, 2, 3])) == 6
+    stats = ce.get_cpu_executor_stats()
+    assert stats["backend"] == "thread"
+    assert stats["thread_fallbacks"] == before + 1
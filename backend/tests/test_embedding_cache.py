@@ -0,0 +1,41 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.embedding_cache import EmbeddingCache, decode_vector, encode_vector
+
+
+@pytest.mark.parametrize("quantization, atol", [("float32", 0.0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_encode_decode_roundtrip(quantization, atol):
+    vec = np.random.default_rng(0).uniform(-1, 1, 1536).astype(np.float32)
+    payload = encode_vector(vec, quantization)
+    decoded = decode_vector(payload, 1536, quantization)
+    assert decoded is not None
+    np.testing.assert_allclose(decoded, vec, atol=atol)
+
+
+def test_payload_is_compact_and_dimension_checked():
+    vec = np.ones(1536, dtype=np.float32)
+    assert len(encode_vector(vec, "float32")) == 1536 * 4
+    assert len(encode_vector(vec, "float16")) == 1536 * 2
+    assert len(encode_vector(vec, "int8")) == 1536 + 4
+    # 维度不符视为未命中
+    assert decode_vector(encode_vector(vec), 3072) is None
+
+
+def test_local_cache_batch_lookup():
+    cache = EmbeddingCache(quantization="float32", ttl=60, local_max_entries=2)
+    cache._redis_enabled = False
+
+    async def run():
+        await cache.set_many(["a", "b", "c"], [[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]], "m", dim=2)
+        return await cache.get_many(["a", "b", "c"], "m", dim=2)
+
+    hits = asyncio.run(run())
+    # 容量为2,最早写入的 "a" 被淘汰
+    assert hits[0] is None
+    assert hits[1].tolist() == [0.0, 1.0]
+    assert hits[2].tolist() == [0.5, 0.5]
+    assert cache.get_stats()["hits"] == 2
+    assert cache.key_for("x", "m", 2) != cache.key_for("x", "m", 3)
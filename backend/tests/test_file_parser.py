@@ -114,3 +114,100 @@ def test_mojibake_fixtures_end_to_end():
     # format=markdown 开关存在但未安装插件时回退
     html_md = parse_file(str(files["html_bom"]), format="markdown")
     assert isinstance(html_md["text"], str)
+
+
+@pytest.mark.parametrize("kind", ["utf8", "gbk", "big5", "utf8_bom", "mixed"])
+def test_sampled_detection_matches_full_detection(tmp_path, kind):
+    from services.file_parser_service import _detect_and_decode, _detect_and_decode_full, _sample_windows
+    from tests.utils.fixture_factory import write_encoding_bench_fixtures
+
+    files = write_encoding_bench_fixtures(tmp_path, size_mb=1)
+    raw = files[kind].read_bytes()
+    # 样本只覆盖头/中/尾窗口
+    assert len(_sample_windows(raw)) < len(raw) // 2
+
+    text, enc, _ = _detect_and_decode(raw)
+    full_text, full_enc, _ = _detect_and_decode_full(raw)
+    assert text == full_text
+    if kind == "big5":
+        assert "山風從谷口灌進來" in text
+        assert enc in ("big5", "cp950")
+    elif kind != "mixed":
+        assert "山风从谷口灌进来" in text
+        assert enc == full_enc
+    if kind == "utf8_bom":
+        assert not text.startswith("\ufeff")
+
+
+def test_paragraph_chunks_cut_on_blank_lines_and_keep_crlf_pairs():
+    from services.file_parser_service import iter_paragraph_chunks, _normalize_text
+
+    full = "第一段第一行\r\n第一段第二行\r\n\r\n第二段\r\n\r\n第三段没有结尾空行"
+    # 片段边界刻意落在 \r 与 \n 之间
+    pieces = [full[i:i + 7] for i in range(0, len(full), 7)]
+    chunks = list(iter_paragraph_chunks(pieces, chunk_size=1024))
+
+    assert "".join(chunks) == _normalize_text(full)
+    assert all(c.endswith("\n\n") for c in chunks[:-1])
+    assert "\r" not in "".join(chunks)
+
+
+def test_paragraph_chunks_force_cut_without_blank_lines():
+    from services.file_parser_service import iter_paragraph_chunks
+
+    lines = ["行%03d" % i for i in range(200)]
+    chunks = list(iter_paragraph_chunks(["\n".join(lines)], chunk_size=100))
+    # 无空行时退化为按换行切分,单块不会无限增长
+    assert len(chunks) > 1
+    assert all(c.endswith("\n") for c in chunks[:-1])
+    assert "".join(chunks) == "\n".join(lines)
+
+
+@pytest.mark.parametrize("kind", ["utf8", "gbk", "big5"])
+def test_text_stream_matches_full_parse(tmp_path, kind):
+    import asyncio
+    from services.file_parser_service import open_text_stream
+    from tests.utils.fixture_factory import write_encoding_bench_fixtures
+
+    path = str(write_encoding_bench_fixtures(tmp_path, size_mb=1)[kind])
+    stream = open_text_stream(path, chunk_size=64 * 1024)
+    parsed = parse_file(path)
+    assert stream.meta["encoding"] == parsed["meta"]["encoding"]
+
+    async def collect():
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 4
+    assert "".join(chunks) == parsed["text"]
+    assert stream.bytes_read == stream.total_bytes
+
+
+def test_text_stream_epub_follows_spine_and_cleans_markup(tmp_path):
+    import zipfile
+    from services.file_parser_service import open_text_stream
+
+    path = tmp_path / "book.epub"
+    chapter = ('<html><head><title>目录标题</title><style>p {{ color: red; }}</style></head>'
+               '<body><script>var x = 1;</script><p>{}</p></body></html>')
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("mimetype", "application/epub+zip")
+        zf.writestr("META-INF/container.xml", (
+            '<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container"><rootfiles>'
+            '<rootfile full-path="OEBPS/content.opf"/></rootfiles></container>'
+        ))
+        # zip 顺序与 spine 顺序相反
+        zf.writestr("OEBPS/text/ch2.xhtml", chapter.format("第二章&nbsp;他说&#8220;走&amp;停&#8221;"))
+        zf.writestr("OEBPS/text/ch1.xhtml", chapter.format("第一章 开篇"))
+        zf.writestr("OEBPS/content.opf", (
+            '<package xmlns="http://www.idpf.org/2007/opf"><manifest>'
+            '<item id="c2" href="text/ch2.xhtml"/><item id="c1" href="text/ch1.xhtml"/>'
+            '</manifest><spine><itemref idref="c1"/><itemref idref="c2"/></spine></package>'
+        ))
+
+    text = "".join(open_text_stream(str(path)))
+
+    assert text.index("第一章") < text.index("第二章")
+    assert "他说“走&停”" in text
+    for leaked in ("&nbsp;", "&amp;", "&#8220;", "目录标题", "color", "var x"):
+        assert leaked not in text
@@ -0,0 +1,158 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+import services.index_maintenance as im
+import services.pg_pool as pg_pool
+
+HNSW_DEF = ("CREATE INDEX idx_paragraphs_embedding_hnsw_b_1 ON public.paragraphs "
+            "USING hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64') "
+            "WHERE ((book_id)::text = 'doc-1'::text)")
+
+
+def test_index_definition_helpers():
+    assert im.index_columns(HNSW_DEF) == "embedding vector_cosine_ops"
+    assert im.index_columns(
+        "CREATE INDEX i ON t USING hnsw (((embedding)::halfvec(1536)) halfvec_cosine_ops)"
+    ) == "((embedding)::halfvec(1536)) halfvec_cosine_ops"
+    assert im._current_params(HNSW_DEF) == {"m": 16, "ef_construction": 64}
+    assert im._partition_of("((book_id)::text = 'o''neil'::text)") == {"column": "book_id", "value": "o'neil"}
+    assert im.ivfflat_lists(50_000) == 50
+    assert im.ivfflat_lists(4_000_000) == 2000
+    assert im.parse_mem("1GB") == 1024 ** 3
+    assert im.parse_mem("65536kB") == 64 * 1024 ** 2
+
+    target = {"table_name": "paragraphs", "method": "hnsw", "indexdef": HNSW_DEF,
+              "predicate": "((book_id)::text = 'doc-1'::text)"}
+    sql = im.build_index_sql(target, "tmp_idx", {"m": 24, "ef_construction": 128})
+    assert sql == (
+        'CREATE INDEX CONCURRENTLY "tmp_idx" ON "paragraphs" USING hnsw (embedding vector_cosine_ops) '
+        "WITH (m = 24, ef_construction = 128) WHERE ((book_id)::text = 'doc-1'::text)"
+    )
+
+
+class _FakeConn:
+    def __init__(self, log):
+        self.log = log
+        self.in_tx = False
+
+    async def execute(self, sql, *args):
+        if sql.startswith("CREATE INDEX") or sql.startswith("REINDEX"):
+            await asyncio.sleep(0.05)
+        self.log.append((" ".join(sql.split())[:80], self.in_tx))
+
+    async def fetchval(self, sql):
+        return 4242
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.in_tx = True
+        try:
+            yield
+        finally:
+            self.in_tx = False
+
+    def add_log_listener(self, fn):
+        pass
+
+    def remove_log_listener(self, fn):
+        pass
+
+
+class _FakePool:
+    def __init__(self, log):
+        self.log = log
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield _FakeConn(self.log)
+
+    async def fetch_all(self, sql, *args):
+        return [{"index_name": "idx_paragraphs_embedding_hnsw_b_1", "table_name": "paragraphs",
+                 "method": "hnsw", "indexdef": HNSW_DEF,
+                 "predicate": "((book_id)::text = 'doc-1'::text)", "est_rows": 1000}]
+
+    async def fetch_one(self, sql, pid):
+        return {"phase": "building index", "blocks_total": 0, "blocks_done": 0,
+                "tuples_total": 1000, "tuples_done": 500}
+
+
+def test_rebuild_job_swaps_index_records_params_and_vacuums(monkeypatch):
+    log = []
+
+    async def get_pool():
+        return _FakePool(log)
+
+    monkeypatch.setattr(pg_pool, "get_pg_pool", get_pool)
+    monkeypatch.setattr(im, "PROGRESS_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(im, "register_partition_index", lambda *a: log.append(("register", a)))
+    service = im.IndexMaintenanceService()
+
+    async def run():
+        job = service.start_reindex(tables=["paragraphs"], mode="rebuild", m=24, ef_construction=128)
+        with pytest.raises(RuntimeError):
+            service.start_reindex()
+        return job, [e async for e in job.stream()]
+
+    job, events = asyncio.run(run())
+    names = [e["event"] for e in events]
+    assert names[0] == "started" and names[-1] == "complete"
+    assert "progress" in names
+    progress = json.loads(events[names.index("progress")]["data"])
+    assert progress["percent"] == 50.0
+    assert job.status == "completed"
+    assert job.results[0]["params"] == {"m": 24, "ef_construction": 128}
+
+    statements = [s for s in log if isinstance(s[1], bool)]
+    order = [s for s, _ in statements]
+    create = next(i for i, s in enumerate(order) if s.startswith("CREATE INDEX CONCURRENTLY"))
+    drop_old = next(i for i, s in enumerate(order) if s.startswith('DROP INDEX CONCURRENTLY IF EXISTS "idx_paragraphs_embedding_hnsw_b_1"'))
+    rename = next(i for i, s in enumerate(order) if s.startswith("ALTER INDEX"))
+    assert create < drop_old < rename
+    # 参数写回在事务内,VACUUM 在事务外
+    assert all(in_tx for s, in_tx in statements if s.startswith(("UPDATE vector_indexes", "INSERT INTO vector_indexes")))
+    assert ("VACUUM (ANALYZE) \"paragraphs\"", False) in statements
+    assert ("register", ("paragraphs", "book_id", "doc-1")) in log
+
+
+def test_start_reindex_rejects_unknown_tables():
+    with pytest.raises(ValueError):
+        im.IndexMaintenanceService().start_reindex(tables=["users; DROP TABLE x"])
+
+
+def test_failed_reindex_drops_invalid_ccnew_index(monkeypatch):
+    log = []
+
+    class _FailingConn(_FakeConn):
+        async def execute(self, sql, *args):
+            await super().execute(sql, *args)
+            if sql.startswith("REINDEX"):
+                raise RuntimeError("deadlock detected")
+
+        async def fetch(self, sql, *args):
+            log.append(("fetch", args))
+            return [{"relname": "idx_paragraphs_embedding_hnsw_b_1_ccnew"}]
+
+    class _Pool(_FakePool):
+        @asynccontextmanager
+        async def acquire(self):
+            yield _FailingConn(self.log)
+
+    async def get_pool():
+        return _Pool(log)
+
+    monkeypatch.setattr(pg_pool, "get_pg_pool", get_pool)
+    monkeypatch.setattr(im, "PROGRESS_POLL_INTERVAL", 0.01)
+    service = im.IndexMaintenanceService()
+
+    async def run():
+        job = service.start_reindex(tables=["paragraphs"], mode="reindex")
+        return job, [e async for e in job.stream()]
+
+    job, events = asyncio.run(run())
+    assert events[-1]["event"] == "error"
+    assert job.status == "failed"
+    assert ("fetch", ("paragraphs", 33, "idx_paragraphs_embedding_hnsw_b_1")) in log
+    assert ('DROP INDEX CONCURRENTLY IF EXISTS "idx_paragraphs_embedding_hnsw_b_1_ccnew"', False) in log
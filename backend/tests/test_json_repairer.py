@@ -0,0 +1,27 @@
+from services.json_repairer import get_json_decode_stats, repair_and_load, reset_json_decode_stats, safe_json_loads
+
+
+def test_valid_json_skips_repair():
+    reset_json_decode_stats()
+    assert safe_json_loads('{"name": "测试", "items": [1, 2.5, null]}') == {"name": "测试", "items": [1, 2.5, None]}
+    assert safe_json_loads("[1, 2]") == [1, 2]
+
+    stats = get_json_decode_stats()
+    assert stats["strict"] == 2
+    assert stats["repaired"] == 0
+    assert stats["repair_rate"] == 0.0
+
+
+def test_broken_json_is_repaired_and_counted():
+    reset_json_decode_stats()
+    assert repair_and_load('{"a": 1, "b": [1, 2,],}') == {"a": 1, "b": [1, 2]}
+
+    stats = get_json_decode_stats()
+    assert stats["strict"] == 0
+    assert stats["repaired"] == 1
+    assert stats["repair_rate"] == 1.0
+
+
+def test_empty_input_returns_default():
+    assert safe_json_loads("", []) == []
+    assert safe_json_loads(None) == {}
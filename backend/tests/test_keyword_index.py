@@ -0,0 +1,99 @@
+from services.keyword_index import KeywordIndex
+
+
+def _build_index():
+    index = KeywordIndex("book-1")
+    index.add_many([
+        (1, ["山巅", "云海"]),
+        (2, ["山巅"]),
+        (3, ["云海", "日出", "山巅"]),
+        (4, ["日出"]),
+    ])
+    return index
+
+
+def test_activate_prefers_intersection_then_hit_count():
+    index = _build_index()
+    # 同时命中"山巅"与"云海"的段落排在前面,其余按命中数补足
+    assert index.activate(["山巅", "云海"], top_k=2) == [1, 3]
+    assert index.activate(["山巅", "云海", "日出"], top_k=3) == [3, 1, 2]
+    assert index.activate(["不存在"], top_k=5) == []
+
+
+def test_incremental_add_keeps_postings_sorted_and_unique():
+    index = _build_index()
+    index.compact()
+    index.add(2, ["云海"])
+    index.add(10, ["云海"])
+    assert index.postings("云海").tolist() == [1, 2, 3, 10]
+    assert index.max_id == 10
+    assert index.dirty
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    index = _build_index()
+    index.add(7, ["日出"])
+    index.save(tmp_path / "idx")
+    assert not index.dirty
+
+    loaded = KeywordIndex.load(tmp_path / "idx")
+    assert loaded is not None
+    assert loaded.book_id == "book-1"
+    assert loaded.max_id == 7
+    assert len(loaded) == len(index)
+    assert loaded.postings("日出").tolist() == [3, 4, 7]
+    # mmap 加载后仍可继续增量写入
+    loaded.add(8, ["山巅"])
+    assert loaded.postings("山巅").tolist() == [1, 2, 3, 8]
+
+
+def test_load_missing_returns_none(tmp_path):
+    assert KeywordIndex.load(tmp_path / "nope") is None
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    index = _build_index()
+    index.save(tmp_path / "idx")
+    index.add(9, ["云海"])
+    index.save(tmp_path / "idx")
+    assert sorted(p.name for p in (tmp_path / "idx").iterdir()) == [
+        "meta.json", "offsets.npy", "postings.npy", "terms.json"
+    ]
+    assert KeywordIndex.load(tmp_path / "idx").postings("云海").tolist() == [1, 3, 9]
+
+
+def test_registry_refreshes_from_db_after_ttl(tmp_path, monkeypatch):
+    import asyncio
+
+    from services import keyword_index, pg_pool
+
+    db_rows = [{"id": 1, "keywords": ["山巅"]}]
+    watermarks = []
+
+    class _FakePool:
+        async def fetch_all(self, sql, book_id, after_id):
+            watermarks.append(after_id)
+            return [r for r in db_rows if r["id"] > after_id]
+
+    async def get_pool():
+        return _FakePool()
+
+    monkeypatch.setattr(pg_pool, "get_pg_pool", get_pool)
+    registry = keyword_index.KeywordIndexRegistry(tmp_path)
+
+    async def run():
+        index = await registry.get("book-1")
+        # 本进程写入的段落不推进水位
+        registry.add_paragraphs("book-1", [(5, ["云海"])])
+        # 其他 worker 写入了更小的 ID
+        db_rows.extend([{"id": 3, "keywords": ["云海"]}, {"id": 5, "keywords": ["云海"]}])
+        assert (await registry.get("book-1")).postings("云海").tolist() == [5]
+
+        monkeypatch.setattr(keyword_index, "KEYWORD_INDEX_REFRESH_TTL", 0)
+        assert await registry.get("book-1") is index
+        return index
+
+    index = asyncio.run(run())
+    assert watermarks == [0, 1]
+    assert index.postings("云海").tolist() == [3, 5]
+    assert index.synced_id == 5
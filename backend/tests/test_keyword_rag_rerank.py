@@ -0,0 +1,55 @@
+import numpy as np
+
+from services.keyword_rag import batch_rerank_scores
+
+
+def _naive_rank(query, cands, weights):
+    scores = []
+    for i, vec in enumerate(cands):
+        sim = np.dot(query, vec) / (np.linalg.norm(query) * np.linalg.norm(vec) + 1e-10)
+        scores.append((sim * 0.7 + (weights[i] / 2.0) * 0.3, i))
+    scores.sort(key=lambda x: -x[0])
+    return [i for _, i in scores]
+
+
+def test_batch_rerank_matches_per_candidate_loop():
+    rng = np.random.default_rng(0)
+    cands = rng.standard_normal((300, 64)).astype(np.float32)
+    weights = rng.uniform(0.5, 1.5, 300).astype(np.float32)
+    queries = rng.standard_normal((4, 64)).astype(np.float32)
+
+    top_idx, sims, combined = batch_rerank_scores(queries, cands, weights, top_n=10)
+
+    assert top_idx.shape == (4, 10)
+    for qi in range(4):
+        assert top_idx[qi].tolist() == _naive_rank(queries[qi], cands, weights)[:10]
+        # 综合得分降序
+        assert np.all(np.diff(combined[qi]) <= 1e-6)
+        assert np.all(np.abs(sims[qi]) <= 1.0 + 1e-5)
+
+
+def test_batch_rerank_respects_candidate_mask():
+    rng = np.random.default_rng(1)
+    cands = rng.standard_normal((20, 8)).astype(np.float32)
+    weights = np.ones(20, dtype=np.float32)
+    queries = rng.standard_normal((2, 8)).astype(np.float32)
+    mask = np.zeros((2, 20), dtype=bool)
+    mask[0, :5] = True
+    mask[1, 10:] = True
+
+    top_idx, _, combined = batch_rerank_scores(queries, cands, weights, top_n=8, candidate_mask=mask)
+
+    # 查询0只有5个候选,其余位置得分为 -inf
+    assert set(top_idx[0, :5].tolist()) == set(range(5))
+    assert np.all(np.isneginf(combined[0, 5:]))
+    assert all(10 <= i < 20 for i in top_idx[1].tolist())
+
+
+def test_batch_rerank_top_n_larger_than_candidates():
+    cands = np.eye(3, dtype=np.float32)
+    top_idx, sims, _ = batch_rerank_scores(
+        np.array([[0.0, 1.0, 0.0]], dtype=np.float32), cands, np.ones(3), top_n=10
+    )
+    assert top_idx.shape == (1, 3)
+    assert top_idx[0, 0] == 1
+    assert abs(sims[0, 0] - 1.0) < 1e-5
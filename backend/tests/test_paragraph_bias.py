@@ -0,0 +1,72 @@
+import numpy as np
+
+from services.paragraph_enhancer import (
+    BIAS_FEATURE_DIM,
+    bias_norm_sq,
+    bias_projection,
+    compute_bias_features,
+    compute_enhanced_embedding,
+    enhanced_cosine,
+    expand_bias_features,
+    initialize_paragraph_bias,
+)
+
+
+def test_expanded_features_reproduce_full_bias_layout():
+    features = compute_bias_features(0.3, emotion_intensity=0.9, keywords=["山", "江湖", "剑"])
+    assert len(features) == BIAS_FEATURE_DIM
+    bias = initialize_paragraph_bias("", 0.3, emotion_intensity=0.9, keywords=["山", "江湖", "剑"])
+
+    assert bias.shape == (1536,)
+    assert np.allclose(bias[:512], (0.9 - 0.5) * 0.3)
+    assert np.allclose(bias[512:1024:2], np.sin(0.3 * np.pi) * 0.2)
+    assert np.allclose(bias[513:1024:2], np.cos(0.3 * np.pi) * 0.2)
+    assert np.isclose(bias[1025], np.sin(sum(ord(c) for c in "江湖")) * 0.1)
+    assert np.all(bias[1027:] == 0)
+    # 迁移 008 的回填取第 1 / 513 / 514 / 1025-1034 维(1 起始)
+    assert np.allclose(np.concatenate([bias[[0, 512, 513]], bias[1024:1034]]), features)
+
+
+def test_projection_identities():
+    rng = np.random.default_rng(0)
+    features = np.array(compute_bias_features(0.7, 0.2, ["a", "bc"]), dtype=np.float32)
+    bias = expand_bias_features(features)
+    v = rng.standard_normal(1536).astype(np.float32)
+
+    assert np.isclose(v @ bias, bias_projection(v) @ features, rtol=1e-4)
+    assert np.isclose(bias @ bias, bias_norm_sq(features), rtol=1e-4)
+
+
+def test_enhanced_cosine_matches_materialized_vectors():
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((6, 1536)).astype(np.float32)
+    weights = rng.uniform(0.5, 1.5, 6).astype(np.float32)
+    features = np.stack([
+        compute_bias_features(rng.uniform(), rng.uniform(), ["词%d" % i]) for i in range(5)
+    ] + [[0.0] * BIAS_FEATURE_DIM])
+    queries = rng.standard_normal((3, 1536)).astype(np.float32)
+
+    enhanced = np.array([
+        compute_enhanced_embedding(e, w, expand_bias_features(f))
+        for e, w, f in zip(embeddings, weights, features)
+    ])
+    expected = (queries @ enhanced.T) / (
+        np.linalg.norm(queries, axis=1, keepdims=True) * np.linalg.norm(enhanced, axis=1)
+    )
+
+    assert np.allclose(enhanced_cosine(queries, embeddings, weights, features), expected, atol=1e-4)
+
+
+def test_formula_bias_fingerprint_matches_for_compact_and_full_rows():
+    from services.formula_generator import FormulaGenerator
+
+    features = compute_bias_features(0.3, emotion_intensity=0.8, keywords=["山巅", "云海"])
+    new_row = {"id": 1, "bias_features": features}
+    old_row = {"id": 2, "paragraph_bias": expand_bias_features(features).tolist()}
+
+    sequence = FormulaGenerator()._extract_paragraph_sequence([new_row, old_row], "book-1")["sequence"]
+
+    assert sequence[0]["bias"] == sequence[1]["bias"]
+    assert len(sequence[0]["bias"]) == 10
+    assert sequence[0]["bias_features"] == features
+    assert sequence[1]["bias_features"] is None
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import time
+
+import services.parse_cache as pc
+from services.parse_cache import ParseCache
+
+
+def _parsed(text):
+    return {"text": text, "meta": {"title": "t", "encoding": "utf-8"}}
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = ParseCache(cache_dir=tmp_path, max_bytes=10 * 1024 * 1024, ttl=60)
+    key = cache.key_for("abc", "text", None)
+    assert key != cache.key_for("abc", "markdown", None)
+    assert key != cache.key_for("abc", "text", "gbk")
+
+    cache.put(key, _parsed("正文" * 1000))
+    got = cache.get(key)
+    assert got["text"] == "正文" * 1000
+    assert got["meta"]["encoding"] == "utf-8"
+    # 压缩存储
+    assert os.path.getsize(cache._path(key)) < len(("正文" * 1000).encode("utf-8"))
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = ParseCache(cache_dir=tmp_path, max_bytes=1024 * 1024, ttl=60)
+    key = cache.key_for("abc")
+    cache.put(key, _parsed("正文"))
+    now = time.time()
+    monkeypatch.setattr(pc.time, "time", lambda: now + 120)
+    assert cache.get(key) is None
+    assert not cache._path(key).exists()
+
+
+def test_size_based_eviction_drops_least_recently_used(tmp_path):
+    cache = ParseCache(cache_dir=tmp_path, max_bytes=1024 * 1024, ttl=0)
+    keys = [cache.key_for(str(i)) for i in range(4)]
+    for i, key in enumerate(keys):
+        # 随机文本几乎不可压缩,各条目大小相近
+        cache.put(key, _parsed(os.urandom(600).hex()))
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    entry_size = os.path.getsize(cache._path(keys[0]))
+    # 上限约 4.5 条: 再写一条即超限,淘汰到 90% 以下需要删掉最旧的一条
+    cache.max_bytes = int(entry_size * 4.5)
+    cache.get(keys[0])  # 刷新 mtime,不应被淘汰
+    cache.put(cache.key_for("new"), _parsed(os.urandom(600).hex()))
+
+    assert cache.evictions == 1
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache._size <= cache.max_bytes
+
+
+def test_get_or_parse_parses_once(tmp_path, monkeypatch):
+    src = tmp_path / "book.txt"
+    src.write_text("第一章\n\n正文", encoding="utf-8")
+    calls = []
+
+    async def fake_run_cpu(fn, path, format, encoding_override):
+        calls.append(path)
+        await asyncio.sleep(0.01)
+        return _parsed("第一章\n\n正文")
+
+    monkeypatch.setattr(pc, "run_cpu", fake_run_cpu)
+    cache = ParseCache(cache_dir=tmp_path / "cache", max_bytes=1024 * 1024, ttl=60)
+
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_parse(str(src)) for _ in range(3)))
+        again = await cache.get_or_parse(str(src))
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r["text"] == "第一章\n\n正文" for r in first)
+    assert again["text"] == "第一章\n\n正文"
+    assert cache.hits == 1 and cache.misses == 1
+
+    # 同一内容换个路径上传也命中
+    copy = tmp_path / "copy.txt"
+    copy.write_bytes(src.read_bytes())
+    hit = asyncio.run(cache.get_or_parse(str(copy)))
+    assert hit["meta"]["source_path"] == str(copy)
+    assert len(calls) == 1
@@ -0,0 +1,55 @@
+import asyncio
+
+from services import pg_pool
+
+
+class _FakeAsyncpg:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    async def create_pool(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise OSError("connection refused")
+        return object()
+
+
+def test_concurrent_initialize_creates_one_pool(monkeypatch):
+    fake = _FakeAsyncpg()
+    monkeypatch.setattr(pg_pool, "asyncpg", fake)
+    monkeypatch.setattr(pg_pool, "ASYNCPG_AVAILABLE", True)
+
+    async def run():
+        pool = pg_pool.PgPool()
+        results = await asyncio.gather(*(pool.initialize() for _ in range(5)))
+        return pool, results
+
+    pool, results = asyncio.run(run())
+    assert results == [True] * 5
+    assert fake.calls == 1
+    assert pool.available
+
+
+def test_failed_initialize_backs_off(monkeypatch):
+    fake = _FakeAsyncpg(fail=True)
+    monkeypatch.setattr(pg_pool, "asyncpg", fake)
+    monkeypatch.setattr(pg_pool, "ASYNCPG_AVAILABLE", True)
+
+    async def run():
+        pool = pg_pool.PgPool()
+        first = await asyncio.gather(*(pool.initialize() for _ in range(3)))
+        # 退避期内不再尝试建池
+        assert await pool.initialize() is False
+        assert fake.calls == 1
+        # 退避到期后重试,成功后恢复
+        pool._retry_at = 0.0
+        fake.fail = False
+        assert await pool.initialize() is True
+        return pool, first
+
+    pool, first = asyncio.run(run())
+    assert first == [False] * 3
+    assert fake.calls == 2
+    assert pool._backoff == pg_pool.INIT_RETRY_BACKOFF_MIN
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+
+from services.rl_optimizer import ReinforcementLearningOptimizer
+
+
+def test_compute_ucb_scores_matches_formula():
+    rl = ReinforcementLearningOptimizer(db_pool=None)
+    q = np.array([0.2, 0.9, 0.5])
+    n = np.array([4, 1, 0])
+    total = int(n.sum())
+
+    scores = rl.compute_ucb_scores(q, n, total)
+
+    for i in range(2):
+        expected = q[i] + rl.ucb_constant * math.sqrt(math.log(total + 1) / n[i])
+        assert abs(scores[i] - expected) < 1e-9
+    # 未访问段落优先探索
+    assert math.isinf(scores[2])
+
+
+def test_compute_ucb_scores_empty():
+    rl = ReinforcementLearningOptimizer(db_pool=None)
+    assert rl.compute_ucb_scores(np.array([]), np.array([]), 0).shape == (0,)
+
+
+def test_assign_clusters_batch_uses_nearest_centroid(tmp_path):
+    rl = ReinforcementLearningOptimizer(db_pool=None, num_clusters=3, model_dir=tmp_path)
+    rl._set_centroids(np.eye(3, 4), version=1)
+
+    queries = np.array([
+        [0.0, 5.0, 0.1, 0.0],
+        [0.9, 0.1, 0.0, 0.0],
+        [0.0, 0.0, 2.0, 1.0],
+    ])
+    assert rl.assign_clusters(queries).tolist() == [1, 0, 2]
+    assert rl.get_query_cluster(queries[2]) == "query_cluster_2"
+
+
+def test_centroids_roundtrip_and_versioning(tmp_path):
+    rl = ReinforcementLearningOptimizer(db_pool=None, num_clusters=2, model_dir=tmp_path)
+    centers = np.array([[1.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+    assert rl.save_centroids(centers, sample_count=10) == 1
+    rl._set_centroids(centers, 1)
+    assert rl.save_centroids(centers, sample_count=10) == 2
+
+    loaded = ReinforcementLearningOptimizer(db_pool=None, num_clusters=2, model_dir=tmp_path)
+    assert loaded.load_centroids()
+    assert loaded.centroid_version == 2
+    np.testing.assert_allclose(np.linalg.norm(loaded.cluster_centers, axis=1), 1.0, atol=1e-6)
+
+    # 簇数不一致时不加载
+    other = ReinforcementLearningOptimizer(db_pool=None, num_clusters=3, model_dir=tmp_path)
+    assert not other.load_centroids()
+
+
+def test_refit_alignment_keeps_cluster_ids(tmp_path):
+    rl = ReinforcementLearningOptimizer(db_pool=None, num_clusters=2, model_dir=tmp_path)
+    rl._set_centroids(np.array([[1.0, 0.0], [0.0, 1.0]]), version=1)
+    swapped = np.array([[0.0, 1.1], [0.9, 0.0]], dtype=np.float32)
+    aligned = rl._align_to_previous(swapped)
+    assert aligned[0, 0] > 0.5 and aligned[1, 1] > 0.5
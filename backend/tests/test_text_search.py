@@ -0,0 +1,62 @@
+import pytest
+
+import services.text_search as ts
+from services.text_search import (
+    HybridQuery,
+    decode_tsvector_binary,
+    encode_tsvector_binary,
+    tsvector_literal,
+)
+
+
+def test_tsvector_binary_roundtrip_and_literal():
+    lexemes = [("江湖", [1, 7]), ("o'neil", [2]), ("剑", [])]
+    assert decode_tsvector_binary(encode_tsvector_binary(lexemes)) == lexemes
+    assert tsvector_literal(lexemes) == "'江湖':1,7 'o''neil':2 '剑'"
+    # 无词位时写入空 tsvector,NULL 仅表示待回填
+    assert tsvector_literal([]) == ""
+
+
+def test_build_lexemes_keeps_word_order_positions():
+    pytest.importorskip("jieba")
+    lexemes = dict(ts.build_lexemes("江湖，江湖的剑。"))
+    assert lexemes["江湖"] == [1, 2]
+    assert "的" not in lexemes and "，" not in lexemes
+    assert ts.query_param("江湖的剑") == "'江湖' | '剑'"
+
+
+def test_hybrid_query_runs_text_and_ann_legs_separately(monkeypatch):
+    monkeypatch.setattr(ts, "query_param", lambda text: "'江湖'")
+    query = HybridQuery("paragraphs", ["id", "content"]).where("is_active = true")
+    query.partition("book_id", "doc-1")
+    sql, params = query.build("江湖", [0.1], limit=10)
+
+    ann, rest = sql.split("ann_ranked AS", 1)
+    text_leg = rest.split("text_hits AS", 1)[1].split("fused AS", 1)[0]
+    # ANN 路: 纯 ORDER BY 距离 LIMIT,没有文本条件也没有阈值
+    assert "ORDER BY embedding <=> $1::vector" in ann and "@@" not in ann
+    assert "candidates.distance >=" not in ann
+    # 文本路: 走 search_tsv 且同样按 book_id 过滤
+    assert "t.search_tsv @@ q.query" in text_leg and "<=>" not in text_leg
+    assert "book_id = $" in text_leg and "$6::tsquery" in text_leg
+    assert "FULL OUTER JOIN ann_ranked" in sql
+    assert "coalesce($8::float8 / ($10::int + f.text_rank), 0)" in sql
+    assert params == [[0.1], "doc-1", 40, 40, "doc-1", "'江湖'", 40, 0.3, 0.7, 60, 10]
+
+
+def test_weighted_fusion_and_validation():
+    sql, _ = HybridQuery("documents", ["id"]).build("", [0.1], limit=5, fusion="weighted")
+    assert "max(f.text_score) OVER ()" in sql
+    with pytest.raises(ValueError):
+        HybridQuery("documents", ["id"]).build("", [0.1], limit=5, fusion="sum")
+    with pytest.raises(ValueError):
+        HybridQuery("memory_high", ["id"])
+
+
+def test_config_mode_uses_trigger_and_per_term_or_query(monkeypatch):
+    monkeypatch.setattr(ts, "text_search_config", lambda: "chinese")
+    ddl = " ".join(ts.ddl_statements("documents"))
+    assert "to_tsvector('chinese'::regconfig, left(coalesce(NEW.title, '') || ' ' || coalesce(NEW.content, '')" in ddl
+    assert "BEFORE INSERT OR UPDATE OF title, content ON documents" in ddl
+    expr = ts.tsquery_expression("$3")
+    assert "plainto_tsquery('chinese'::regconfig, term)" in expr and "unnest($3::text[])" in expr
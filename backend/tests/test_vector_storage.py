@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from services.pg_pool import _decode_halfvec_binary, _encode_halfvec_binary
+from services.vector_storage import StorageMode, binary_index_name, migration_statements
+
+
+def test_parse_storage_modes():
+    assert StorageMode.parse("vector") == StorageMode("vector", False)
+    assert StorageMode.parse("HalfVec+bit") == StorageMode("halfvec", True)
+    assert StorageMode.parse("halfvec").opclass == "halfvec_cosine_ops"
+    assert StorageMode.parse("halfvec").column_type(1536) == "halfvec(1536)"
+    assert str(StorageMode("vector", True)) == "vector+bit"
+    with pytest.raises(ValueError):
+        StorageMode.parse("float8")
+    with pytest.raises(ValueError):
+        StorageMode.parse("halfvec+pq")
+
+
+def test_halfvec_binary_codec_roundtrip():
+    data = _encode_halfvec_binary([0.5, -1.25, 3.0])
+    assert len(data) == 4 + 3 * 2
+    assert np.allclose(_decode_halfvec_binary(data), [0.5, -1.25, 3.0])
+
+
+def test_migration_rebuilds_indexes_with_new_opclass():
+    indexes = [
+        {"index_name": "memory_high_embedding_idx", "column": "embedding",
+         "indexdef": "CREATE INDEX memory_high_embedding_idx ON public.memory_high USING hnsw (embedding vector_cosine_ops)"},
+        {"index_name": "memory_high_centroid_id_idx", "column": "centroid_id",
+         "indexdef": "CREATE INDEX memory_high_centroid_id_idx ON public.memory_high USING btree (centroid_id)"},
+    ]
+    stmts = migration_statements(
+        "memory_high", StorageMode("halfvec", True),
+        {"embedding": "vector", "centroid_embedding": "vector"}, indexes, 1536,
+    )
+    assert stmts == [
+        "DROP INDEX IF EXISTS memory_high_embedding_idx",
+        "ALTER TABLE memory_high ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536)",
+        "CREATE INDEX memory_high_embedding_idx ON public.memory_high USING hnsw (embedding halfvec_cosine_ops)",
+        "ALTER TABLE memory_high ALTER COLUMN centroid_embedding TYPE halfvec(1536) USING centroid_embedding::halfvec(1536)",
+        f"CREATE INDEX IF NOT EXISTS {binary_index_name('memory_high')} ON memory_high "
+        "USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)",
+    ]
+
+
+def test_migration_is_idempotent_and_drops_prefilter_when_disabled():
+    bq = {"index_name": binary_index_name("paragraphs"), "column": None,
+          "indexdef": "CREATE INDEX ... USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)"}
+    types = {"embedding": "halfvec", "paragraph_bias": "halfvec", "enhanced_embedding": "halfvec"}
+    assert migration_statements("paragraphs", StorageMode("halfvec", True), types, [bq], 1536) == []
+    assert migration_statements("paragraphs", StorageMode("halfvec"), types, [bq], 1536) == [
+        f"DROP INDEX IF EXISTS {binary_index_name('paragraphs')}"
+    ]
@@ -114,3 +114,61 @@ def ensure_mojibake_fixtures(base_dir: Path) -> dict:
     write_minimal_pdf(files["pdf_scan"]) 
     write_bom_html(files["html_bom"]) 
     return files
+
+
+_SIMPLIFIED_LINES = [
+    "山风从谷口灌进来,吹得檐下的铜铃叮当作响。",
+    "他把剑横在膝上,望着远处渐渐暗下去的天色,一言不发。",
+    "“你当真要走?”她低声问道,手里的茶早已凉透。",
+    "夜色深沉,客栈里只剩掌柜的算盘声还在断断续续地响着。",
+]
+_TRADITIONAL_LINES = [
+    "山風從谷口灌進來,吹得簷下的銅鈴叮噹作響。",
+    "他把劍橫在膝上,望著遠處漸漸暗下去的天色,一言不發。",
+    "「你當真要走?」她低聲問道,手裡的茶早已涼透。",
+    "夜色深沉,客棧裡只剩掌櫃的算盤聲還在斷斷續續地響著。",
+]
+
+
+def _novel_text(lines, size_bytes: int, bytes_per_char: int) -> str:
+    parts = []
+    total = 0
+    i = 0
+    while total < size_bytes:
+        para = "".join(lines[(i + k) % len(lines)] for k in range(3)) + "\r\n\r\n"
+        if i % 40 == 0:
+            para = f"第{i // 40 + 1}章 Chapter {i // 40 + 1}\r\n\r\n" + para
+        parts.append(para)
+        total += len(para) * bytes_per_char
+        i += 1
+    return "".join(parts)
+
+
+def write_encoding_bench_fixtures(target: Path, size_mb: float = 5.0) -> dict:
+    """
+    编码识别基准样本: UTF-8 / GBK / Big5 / UTF-8 BOM / 混合编码(UTF-8 正文中夹一段 GBK)
+    混合样本的 GBK 片段位于 1/4 处,落在头/中/尾采样窗口之外,用于覆盖全量回退路径.
+    """
+    ensure_dir(target)
+    size = int(size_mb * 1024 * 1024)
+    # UTF-8 中文 3 字节/字,GBK/Big5 2 字节/字
+    simplified_utf8 = _novel_text(_SIMPLIFIED_LINES, size, 3)
+    simplified = _novel_text(_SIMPLIFIED_LINES, size, 2)
+    traditional = _novel_text(_TRADITIONAL_LINES, size, 2)
+
+    files = {
+        "utf8": target / "utf8.txt",
+        "gbk": target / "gbk.txt",
+        "big5": target / "big5.txt",
+        "utf8_bom": target / "utf8_bom.txt",
+        "mixed": target / "mixed.txt",
+    }
+    files["utf8"].write_bytes(simplified_utf8.encode("utf-8"))
+    files["gbk"].write_bytes(simplified.encode("gbk"))
+    files["big5"].write_bytes(traditional.encode("big5"))
+    files["utf8_bom"].write_bytes(simplified_utf8.encode("utf-8-sig"))
+
+    body = simplified_utf8.encode("utf-8")
+    cut = body.find(b"\n", len(body) // 4) + 1
+    files["mixed"].write_bytes(body[:cut] + "这一段是GBK编码的旧稿。\r\n".encode("gbk") + body[cut:])
+    return files
@@ -1321,6 +1321,13 @@ ${text}
                                           logs: [...(prev.logs || []), `Batch ${bi} error: ${msg}`],
                                           failedBatches: [...(prev.failedBatches || []), bi]
                                         }));
+                                      } else if (evtType === 'classified') {
+                                        const count = Number(data?.count || 0);
+                                        const rate = Number(data?.cacheHitRate || 0);
+                                        setIngestStatus(prev => ({
+                                          ...prev,
+                                          logs: [...(prev.logs || []), `Classified ${count} paragraphs (cache hit rate ${(rate * 100).toFixed(1)}%)`]
+                                        }));
                                       } else if (evtType === 'complete') {
                                         const docId = data?.docId;
                                         setIngestStatus(prev => ({